@@ -22,6 +22,8 @@ class Settings(BaseSettings):
     app_name: str = "NYC Subway Monitor"
     app_version: str = "1.0.0"
     debug: bool = Field(default=False, description="Enable debug mode")
+    warmup_max_attempts: int = Field(default=10, ge=1, description="Warm-up attempts before liveness fails so the pod is restarted")
+    warmup_max_backoff: int = Field(default=60, ge=1, description="Longest wait in seconds between warm-up attempts")
     
     # API
     api_v1_prefix: str = "/api/v1"
@@ -36,6 +38,7 @@ class Settings(BaseSettings):
     
     # Computed database URL
     database_url: Optional[PostgresDsn] = None
+    database_read_url: Optional[PostgresDsn] = Field(default=None, description="Read replica for API reads; primary when unset")
     
     @field_validator("database_url", mode="before")
     def assemble_db_connection(cls, v: Optional[str], info) -> str:
@@ -50,20 +53,68 @@ class Settings(BaseSettings):
             path=info.data.get("postgres_db"),
         )
     
+    # Connection pools per workload (app.db.database)
+    db_write_pool_size: int = Field(default=5, ge=1, description="Ingestion and API writes")
+    db_write_max_overflow: int = Field(default=5, ge=0)
+    db_read_pool_size: int = Field(default=15, ge=1, description="API reads")
+    db_read_max_overflow: int = Field(default=10, ge=0)
+    db_analytics_pool_size: int = Field(default=2, ge=1, description="Training reads and model publishing")
+    db_analytics_max_overflow: int = Field(default=2, ge=0)
+    db_pool_timeout: int = Field(default=30, ge=1, description="Seconds to wait for a pooled connection")
+    
     # Redis
     redis_url: str = "redis://localhost:6379/0"
     redis_password: Optional[str] = None
     
+    # Response cache
+    cache_backend: str = Field(default="memory", pattern="^(memory|redis|none)$")
+    cache_ttl_seconds: int = Field(default=15, ge=1, description="TTL of cached anomaly stats")
+    cache_list_ttl_seconds: int = Field(default=5, ge=1, description="TTL of cached anomaly listings")
+    
+    # Rollups (plain-table mode; continuous aggregates use Timescale policies)
+    rollup_refresh_interval: int = Field(default=60, ge=10, description="Seconds between rollup refreshes")
+    rollup_lookback_minutes: int = Field(default=15, ge=5, description="Re-aggregated window for late rows")
+    rollup_backfill_hours: int = Field(default=168, ge=1, description="History aggregated on first refresh")
+    
+    # Storage lifecycle (retention 0 = keep forever). Retention is opt-in so
+    # upgrading never deletes existing history.
+    storage_lifecycle_enabled: bool = Field(default=True, description="Apply hypertables/retention at startup")
+    storage_compress_after_days: int = Field(default=0, ge=0, description="Compress Timescale chunks older than this (0 = off)")
+    train_positions_retention_days: int = Field(default=0, ge=0)
+    feed_updates_retention_days: int = Field(default=0, ge=0)
+    anomalies_retention_days: int = Field(default=0, ge=0)
+    storage_maintenance_interval: int = Field(default=3600, ge=60, description="Seconds between retention runs")
+    storage_delete_batch_size: int = Field(default=10000, ge=100, description="Rows per retention DELETE")
+    native_partitioning: bool = Field(default=False, description="Create new time-series tables partitioned by day without TimescaleDB")
+    partition_premake_days: int = Field(default=3, ge=1, description="Daily partitions created ahead of time")
+    
     # ML Configuration
     model_retrain_hour: int = Field(default=3, ge=0, le=23)
     anomaly_contamination: float = Field(default=0.05, ge=0.01, le=0.2)
     lstm_sequence_length: int = Field(default=24, ge=1)
     lstm_hidden_size: int = Field(default=128, ge=16)
+    models_dir: str = "/app/models/artifacts"
+    training_mode: str = Field(
+        default="subprocess",
+        pattern="^(subprocess|external|disabled)$",
+        description="subprocess: server spawns the training worker; external: worker runs separately",
+    )
+    model_reload_interval: int = Field(default=300, ge=10, description="Seconds between active model checks")
+    training_window_days: int = Field(default=7, ge=1)
+    training_chunk_size: int = Field(default=10000, ge=100, description="Rows per streamed training chunk")
+    training_max_rows: int = Field(default=2_000_000, ge=1000, description="Rows kept in memory per training run")
+    feature_store_enabled: bool = Field(default=False, description="Train from materialized Parquet features")
+    feature_store_dir: str = "/app/data/features"
+    warm_start_enabled: bool = Field(default=False, description="Continue from the active model on new data")
+    warm_start_tree_fraction: float = Field(default=0.25, gt=0, le=1, description="Isolation Forest trees replaced per warm start")
+    warm_start_epochs: int = Field(default=5, ge=1, description="LSTM fine-tuning epochs per warm start")
+    warm_start_max_generations: int = Field(default=6, ge=1, description="Consecutive warm starts before a full refit")
     
     # Feed Configuration
     feed_update_interval: int = Field(default=30, ge=10, description="Seconds between feed updates")
     feed_timeout: int = Field(default=30, ge=5)
     max_retries: int = Field(default=3, ge=1)
+    current_position_ttl_seconds: int = Field(default=300, ge=30, description="Trips not seen for this long leave current_train_positions")
     
     # Feature Engineering
     headway_window_minutes: int = Field(default=30, ge=10)
@@ -72,6 +123,22 @@ class Settings(BaseSettings):
     # WebSocket
     ws_heartbeat_interval: int = Field(default=30, ge=10)
     ws_max_connections: int = Field(default=1000, ge=10)
+    
+    # Runtime resources per process role (0 = use all available cores)
+    runtime_role: str = Field(default="api", pattern="^(api|ingestion|training)$")
+    api_torch_threads: int = Field(default=1, ge=0)
+    api_torch_interop_threads: int = Field(default=1, ge=0)
+    api_blas_threads: int = Field(default=1, ge=0)
+    api_joblib_workers: int = Field(default=1, ge=0)
+    ingestion_processes: int = Field(default=1, ge=0, description="Feed parsing processes under the ingestion budget (0 = parse in the event loop)")
+    ingestion_torch_threads: int = Field(default=1, ge=0)
+    ingestion_torch_interop_threads: int = Field(default=1, ge=0)
+    ingestion_blas_threads: int = Field(default=1, ge=0)
+    ingestion_joblib_workers: int = Field(default=1, ge=0)
+    training_torch_threads: int = Field(default=0, ge=0)
+    training_torch_interop_threads: int = Field(default=2, ge=0)
+    training_blas_threads: int = Field(default=0, ge=0)
+    training_joblib_workers: int = Field(default=0, ge=0)
 
 
 @lru_cache
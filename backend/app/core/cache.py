@@ -0,0 +1,242 @@
+"""
+Response cache for read-heavy dashboard endpoints.
+
+Entries are JSON strings with a short TTL, tagged by the data they were
+computed from. Writes that change that data mark the session with the tags
+to invalidate; the entries are dropped once the transaction commits, so a
+rolled-back write never evicts anything.
+
+Concurrent misses for the same key are coalesced: one coroutine computes
+the value and the others await its result (single-flight, per process).
+Each tag carries a per-process generation, bumped on invalidation; a value
+whose tags were invalidated while it was loading is returned but not stored.
+
+Backends: in-process memory (default), Redis (shared between API workers,
+uses Settings.redis_url) or none.
+"""
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Set, Tuple
+
+import structlog
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.config import get_settings
+from app.utils.json import json_dumps, json_loads
+
+logger = structlog.get_logger()
+settings = get_settings()
+
+# Tag for every cached view over the anomalies table
+ANOMALIES = "anomalies"
+
+_SESSION_KEY = "cache_invalidations"
+
+# Invalidations scheduled after commit, referenced until they finish
+_pending_invalidations: Set[asyncio.Task] = set()
+
+
+class MemoryBackend:
+    """Process-local TTL cache with tag sets."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: Dict[str, Tuple[float, str]] = {}
+        self._tags: Dict[str, Set[str]] = {}
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            self._entries.pop(key, None)
+            return None
+        return value
+
+    async def set(self, key: str, value: str, ttl: int, tags: Iterable[str] = ()) -> None:
+        if len(self._entries) >= self.max_entries:
+            self._evict()
+        self._entries[key] = (time.monotonic() + ttl, value)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+
+    async def invalidate(self, tag: str) -> None:
+        for key in self._tags.pop(tag, ()):
+            self._entries.pop(key, None)
+
+    def _evict(self) -> None:
+        """Drop expired entries, then the oldest if still full."""
+        now = time.monotonic()
+        for key in [k for k, (expires_at, _) in self._entries.items() if expires_at <= now]:
+            del self._entries[key]
+        while len(self._entries) >= self.max_entries:
+            del self._entries[next(iter(self._entries))]
+
+
+class RedisBackend:
+    """Redis cache; tag sets hold the keys to delete on invalidation."""
+
+    def __init__(self, client: Any, prefix: str = "cache:"):
+        self.client = client
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[str]:
+        value = await self.client.get(self.prefix + key)
+        return value.decode() if isinstance(value, bytes) else value
+
+    async def set(self, key: str, value: str, ttl: int, tags: Iterable[str] = ()) -> None:
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.set(self.prefix + key, value, ex=ttl)
+            for tag in tags:
+                tag_key = f"{self.prefix}tag:{tag}"
+                pipe.sadd(tag_key, self.prefix + key)
+                pipe.expire(tag_key, ttl)
+            await pipe.execute()
+
+    async def invalidate(self, tag: str) -> None:
+        tag_key = f"{self.prefix}tag:{tag}"
+        keys = await self.client.smembers(tag_key)
+        await self.client.delete(tag_key, *keys)
+
+
+class Cache:
+    """JSON cache with single-flight loading on top of a backend."""
+
+    def __init__(self, backend: Optional[Any]):
+        self.backend = backend
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._generations: Dict[str, int] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    async def get_or_set(
+        self,
+        key: str,
+        factory: Callable[[], Awaitable[Any]],
+        ttl: int,
+        tags: Iterable[str] = (),
+    ) -> Any:
+        """Cached value for key, computing it at most once per process on a miss."""
+        if not self.enabled:
+            return await factory()
+
+        cached = await self._get(key)
+        if cached is not None:
+            return cached
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return await asyncio.shield(inflight)
+
+        tags = tuple(tags)
+        generations = self._tag_generations(tags)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await factory()
+            if self._tag_generations(tags) == generations:
+                await self._set(key, value, ttl, tags)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            # Waiters re-raise it; mark it retrieved for the no-waiter case
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def invalidate(self, *tags: str) -> None:
+        """Drop every entry carrying one of the tags."""
+        if not self.enabled:
+            return
+        for tag in tags:
+            self._generations[tag] = self._generations.get(tag, 0) + 1
+        for tag in tags:
+            try:
+                await self.backend.invalidate(tag)
+            except Exception as e:
+                logger.warning(f"Cache invalidation failed for {tag}: {e}")
+
+    def _tag_generations(self, tags: Tuple[str, ...]) -> Tuple[int, ...]:
+        return tuple(self._generations.get(tag, 0) for tag in tags)
+
+    async def _get(self, key: str) -> Any:
+        try:
+            value = await self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Cache read failed for {key}: {e}")
+            return None
+        return None if value is None else json_loads(value)
+
+    async def _set(self, key: str, value: Any, ttl: int, tags: Iterable[str]) -> None:
+        try:
+            await self.backend.set(key, json_dumps(value), ttl, tags)
+        except Exception as e:
+            logger.warning(f"Cache write failed for {key}: {e}")
+
+
+def cache_key(namespace: str, **params: Any) -> str:
+    """Stable key from a namespace and request parameters."""
+    parts = [f"{name}={params[name]}" for name in sorted(params) if params[name] is not None]
+    return ":".join([namespace, *parts])
+
+
+def _create_backend() -> Optional[Any]:
+    if settings.cache_backend == "none":
+        return None
+    if settings.cache_backend == "redis":
+        import redis.asyncio as redis
+
+        return RedisBackend(
+            redis.from_url(settings.redis_url, password=settings.redis_password)
+        )
+    return MemoryBackend()
+
+
+_cache: Optional[Cache] = None
+
+
+def get_cache() -> Cache:
+    """Process-wide cache built from Settings.cache_backend."""
+    global _cache
+    if _cache is None:
+        _cache = Cache(_create_backend())
+    return _cache
+
+
+def set_cache(cache: Optional[Cache]) -> None:
+    """Replace the process-wide cache; None rebuilds it from Settings on next use."""
+    global _cache
+    _cache = cache
+
+
+def invalidate_on_commit(db: AsyncSession, *tags: str) -> None:
+    """Invalidate the tags once the session's current transaction commits."""
+    db.sync_session.info.setdefault(_SESSION_KEY, set()).update(tags)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session) -> None:
+    tags = session.info.pop(_SESSION_KEY, None)
+    if not tags:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    task = loop.create_task(get_cache().invalidate(*tags))
+    _pending_invalidations.add(task)
+    task.add_done_callback(_pending_invalidations.discard)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_rollback(session: Session) -> None:
+    session.info.pop(_SESSION_KEY, None)
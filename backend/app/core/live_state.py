@@ -0,0 +1,172 @@
+"""
+In-process snapshot of the live network, maintained by feed ingestion.
+
+After each committed feed update the ingester applies it here: the current
+position of every active trip per line, the last arrival per station and
+direction, and the freshness of each feed. Read endpoints serve the
+snapshot without touching Postgres, render each view at most once per
+version, and answer conditional requests with 304 while the version is
+unchanged.
+
+Every API process runs its own ingester and so holds its own snapshot; the
+ETag carries a per-process epoch so a client that lands on another worker
+(or a restarted one) never matches a stale version.
+"""
+
+import itertools
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from fastapi import Request, Response
+
+from app.config import get_settings
+from app.db.crud import current_positions_by_trip
+from app.utils.json import json_dumps
+
+settings = get_settings()
+
+# Feed updates kept for GET /feeds/status
+RECENT_UPDATES = 20
+
+
+class LiveNetworkState:
+    """Versioned snapshot of active trips, station arrivals and feed freshness."""
+
+    def __init__(self, ttl_seconds: int = 300):
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.epoch = uuid.uuid4().hex[:8]
+        self.version = 0
+        self._trips: Dict[str, Dict] = {}
+        self._trip_feeds: Dict[str, str] = {}
+        self._trip_ids: Dict[str, int] = {}
+        self._ids = itertools.count(1)
+        self._arrivals: Dict[Tuple[str, int], datetime] = {}
+        self._feeds: Dict[str, Dict] = {}
+        self._recent: Deque[Dict] = deque(maxlen=RECENT_UPDATES)
+        self._rendered: Dict[str, bytes] = {}
+
+    @property
+    def ready(self) -> bool:
+        """True once at least one feed update has been applied."""
+        return bool(self._feeds)
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.epoch}-{self.version}"'
+
+    def apply_feed_update(
+        self,
+        feed_id: str,
+        positions: List[Dict],
+        update: Dict,
+        now: Optional[datetime] = None,
+    ) -> int:
+        """Replace one feed's trips with a committed update; returns the new version."""
+        now = now or datetime.utcnow()
+        current = {pos["trip_id"]: pos for pos in current_positions_by_trip(positions)}
+
+        # Trips this feed no longer reports have finished
+        for trip_id in [t for t, feed in self._trip_feeds.items() if feed == feed_id]:
+            if trip_id not in current:
+                self._drop_trip(trip_id)
+
+        for trip_id, pos in current.items():
+            if trip_id not in self._trip_ids:
+                self._trip_ids[trip_id] = next(self._ids)
+            self._trips[trip_id] = {**pos, "id": self._trip_ids[trip_id]}
+            self._trip_feeds[trip_id] = feed_id
+
+        # Feeds that stopped updating must not keep their trips forever
+        cutoff = now - self.ttl
+        for trip_id in [t for t, pos in self._trips.items() if pos["timestamp"] < cutoff]:
+            self._drop_trip(trip_id)
+
+        for pos in positions:
+            arrival = pos.get("arrival_time")
+            station = pos.get("current_station")
+            if arrival is None or station is None or arrival > now:
+                continue
+            key = (station, pos.get("direction") or 0)
+            if key not in self._arrivals or self._arrivals[key] < arrival:
+                self._arrivals[key] = arrival
+
+        update = {"feed_id": feed_id, "status": "success", **update}
+        self._feeds[feed_id] = update
+        self._recent.appendleft(update)
+
+        self.version += 1
+        self._rendered.clear()
+        return self.version
+
+    def _drop_trip(self, trip_id: str) -> None:
+        self._trips.pop(trip_id, None)
+        self._trip_feeds.pop(trip_id, None)
+        self._trip_ids.pop(trip_id, None)
+
+    def line_positions(self, line: str) -> List[Dict]:
+        """Current position of every active trip on a line."""
+        positions = [pos for pos in self._trips.values() if pos["line"] == line]
+        positions.sort(key=lambda pos: (pos.get("direction") or 0, pos.get("arrival_time") or datetime.max))
+        return positions
+
+    def station_arrivals(self, station_id: Optional[str] = None) -> List[Dict]:
+        """Last arrival per station and direction."""
+        return [
+            {"station_id": station, "direction": direction, "arrival_time": arrival}
+            for (station, direction), arrival in sorted(self._arrivals.items())
+            if station_id is None or station == station_id
+        ]
+
+    def feeds(self) -> Dict[str, Dict]:
+        """Latest update per feed."""
+        return dict(self._feeds)
+
+    def recent_updates(self) -> List[Dict]:
+        """Most recent feed updates, newest first."""
+        return list(self._recent)
+
+    def render(self, view: str, build: Callable[[], Any]) -> bytes:
+        """JSON body of a view, built at most once per version."""
+        body = self._rendered.get(view)
+        if body is None:
+            body = json_dumps(build()).encode()
+            self._rendered[view] = body
+        return body
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header covers the ETag."""
+    if not if_none_match:
+        return False
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+def snapshot_response(
+    request: Request,
+    state: LiveNetworkState,
+    view: str,
+    build: Callable[[], Any],
+) -> Response:
+    """Serve a snapshot view, or 304 when the client already has this version."""
+    headers = {"ETag": state.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), state.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(
+        content=state.render(view, build),
+        media_type="application/json",
+        headers=headers,
+    )
+
+
+_live_state: Optional[LiveNetworkState] = None
+
+
+def get_live_state() -> LiveNetworkState:
+    """Process-wide snapshot fed by this process's ingester."""
+    global _live_state
+    if _live_state is None:
+        _live_state = LiveNetworkState(settings.current_position_ttl_seconds)
+    return _live_state
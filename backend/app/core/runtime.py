@@ -0,0 +1,166 @@
+"""
+Runtime resource management for torch, BLAS and joblib thread pools.
+
+The API process shares its cores between the asyncio event loop, torch
+inference and sklearn; each process role gets its own thread budget from
+Settings so these pools do not oversubscribe the machine. Feed parsing runs
+in worker processes of the API under the ingestion budget
+(create_role_executor).
+"""
+
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional
+
+import structlog
+
+from app.config import get_settings
+
+logger = structlog.get_logger()
+settings = get_settings()
+
+ROLES = ("api", "ingestion", "training")
+
+BLAS_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+)
+
+
+@dataclass(frozen=True)
+class RuntimeProfile:
+    """Thread budget for one process role."""
+
+    role: str
+    torch_threads: int
+    torch_interop_threads: int
+    blas_threads: int
+    joblib_workers: int
+
+
+_active_profile: Optional[RuntimeProfile] = None
+_torch_interop_set = False
+
+
+def get_profile(role: Optional[str] = None) -> RuntimeProfile:
+    """Build the thread budget for a role from Settings."""
+    role = role or settings.runtime_role
+    if role not in ROLES:
+        raise ValueError(f"Unknown runtime role: {role}")
+
+    cpu_count = os.cpu_count() or 1
+
+    def resolve(field: str) -> int:
+        value = getattr(settings, f"{role}_{field}")
+        return value if value > 0 else cpu_count
+
+    return RuntimeProfile(
+        role=role,
+        torch_threads=resolve("torch_threads"),
+        torch_interop_threads=resolve("torch_interop_threads"),
+        blas_threads=resolve("blas_threads"),
+        joblib_workers=resolve("joblib_workers"),
+    )
+
+
+def get_active_profile() -> RuntimeProfile:
+    """Profile applied to this process (defaults to the configured role)."""
+    return _active_profile or get_profile()
+
+
+def configure_runtime(role: Optional[str] = None) -> RuntimeProfile:
+    """Apply the thread budget for a role to the current process."""
+    global _active_profile
+
+    profile = get_profile(role)
+    _active_profile = profile
+
+    # Picked up by BLAS libraries loaded later and by child processes
+    for var in BLAS_ENV_VARS:
+        os.environ[var] = str(profile.blas_threads)
+
+    # Resize pools of BLAS/OpenMP libraries that are already loaded
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(limits=profile.blas_threads, user_api="blas")
+    except ImportError:
+        pass
+
+    if "torch" in sys.modules:
+        configure_torch(sys.modules["torch"])
+
+    logger.info("Configured runtime resources", **asdict(profile))
+
+    return profile
+
+
+def create_role_executor(role: str, max_workers: int) -> ProcessPoolExecutor:
+    """Process pool whose workers run under a role's thread budget.
+
+    Workers are spawned, not forked, so they never inherit the event loop
+    or thread pools of the parent.
+    """
+    get_profile(role)  # Fail fast on an unknown role
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=configure_runtime,
+        initargs=(role,),
+    )
+
+
+def configure_torch(torch: Any) -> None:
+    """Apply the active profile to torch's intra/inter-op thread pools."""
+    global _torch_interop_set
+
+    profile = get_active_profile()
+    torch.set_num_threads(profile.torch_threads)
+
+    # Inter-op threads can only be set once, before any parallel work runs
+    if not _torch_interop_set:
+        try:
+            torch.set_num_interop_threads(profile.torch_interop_threads)
+        except RuntimeError as e:
+            logger.warning(f"Could not set torch inter-op threads: {e}")
+        _torch_interop_set = True
+
+
+def get_joblib_workers() -> int:
+    """Number of joblib workers (sklearn n_jobs) for this process."""
+    return get_active_profile().joblib_workers
+
+
+def get_runtime_info() -> Dict[str, Any]:
+    """Report the effective thread configuration of this process."""
+    profile = get_active_profile()
+    info: Dict[str, Any] = {
+        **asdict(profile),
+        "cpu_count": os.cpu_count(),
+        "configured": _active_profile is not None,
+    }
+
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        info["torch_effective_threads"] = torch.get_num_threads()
+        info["torch_effective_interop_threads"] = torch.get_num_interop_threads()
+
+    try:
+        from threadpoolctl import threadpool_info
+        info["thread_pools"] = [
+            {
+                "api": pool["internal_api"],
+                "library": pool["prefix"],
+                "num_threads": pool["num_threads"],
+            }
+            for pool in threadpool_info()
+        ]
+    except ImportError:
+        pass
+
+    return info
@@ -4,15 +4,27 @@ Database CRUD operations with fixed JSONB handling.
 """
 
 import json
-from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
 
-from sqlalchemy import and_, func, select, text, update
+from sqlalchemy import and_, delete, func, select, text, tuple_, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.models import Anomaly, FeedUpdate, ModelArtifact, Station, TrainPosition
+from app.config import get_settings
+from app.core.cache import ANOMALIES, invalidate_on_commit
+from app.db.models import (
+    Anomaly,
+    CurrentTrainPosition,
+    FeedUpdate,
+    ModelArtifact,
+    Station,
+    TrainPosition,
+)
+from app.db.rollups import rollup_table
 from app.utils.json import json_dumps, sanitize_for_jsonb
 
+settings = get_settings()
+
 
 # Feed operations
 async def create_feed_update(
@@ -96,17 +108,98 @@ async def bulk_create_train_positions(
     return []
 
 
-async def get_train_positions_by_line(
+def current_positions_by_trip(positions: List[Dict]) -> List[Dict]:
+    """One row per trip: its first stop update, with the following stop as next_station.
+    
+    Stop updates of a trip arrive in stop sequence order, so the first one is
+    the stop the train is at or approaching.
+    """
+    current: Dict[str, Dict] = {}
+    for pos in positions:
+        trip_id = pos["trip_id"]
+        if trip_id not in current:
+            current[trip_id] = {**pos, "next_station": pos.get("next_station")}
+        elif current[trip_id]["next_station"] is None:
+            current[trip_id]["next_station"] = pos.get("current_station")
+    return list(current.values())
+
+
+async def upsert_current_train_positions(
     db: AsyncSession,
-    line: str,
-    limit: int = 50
-) -> List[TrainPosition]:
-    """Get recent train positions for a line."""
+    positions: List[Dict]
+) -> int:
+    """Upsert the current row of every trip in a feed update and prune stale trips."""
+    values = []
+    for pos in current_positions_by_trip(positions):
+        values.append({
+            "timestamp": pos.get("timestamp", datetime.utcnow()),
+            "trip_id": pos["trip_id"],
+            "route_id": pos["route_id"],
+            "line": pos["line"],
+            "direction": pos.get("direction", 0),
+            "current_station": pos.get("current_station"),
+            "next_station": pos.get("next_station"),
+            "arrival_time": pos.get("arrival_time"),
+            "departure_time": pos.get("departure_time"),
+            "delay_seconds": pos.get("delay_seconds", 0),
+            "headway_seconds": pos.get("headway_seconds"),
+            "dwell_time_seconds": pos.get("dwell_time_seconds"),
+            "schedule_adherence": pos.get("schedule_adherence"),
+        })
+    
+    if values:
+        # Older snapshots (e.g. a slow manual refresh) never overwrite newer ones
+        await db.execute(
+            text("""
+                INSERT INTO current_train_positions (
+                    timestamp, trip_id, route_id, line, direction,
+                    current_station, next_station, arrival_time, departure_time,
+                    delay_seconds, headway_seconds, dwell_time_seconds, schedule_adherence
+                ) VALUES (
+                    :timestamp, :trip_id, :route_id, :line, :direction,
+                    :current_station, :next_station, :arrival_time, :departure_time,
+                    :delay_seconds, :headway_seconds, :dwell_time_seconds, :schedule_adherence
+                )
+                ON CONFLICT (trip_id) DO UPDATE SET
+                    timestamp = EXCLUDED.timestamp,
+                    route_id = EXCLUDED.route_id,
+                    line = EXCLUDED.line,
+                    direction = EXCLUDED.direction,
+                    current_station = EXCLUDED.current_station,
+                    next_station = EXCLUDED.next_station,
+                    arrival_time = EXCLUDED.arrival_time,
+                    departure_time = EXCLUDED.departure_time,
+                    delay_seconds = EXCLUDED.delay_seconds,
+                    headway_seconds = EXCLUDED.headway_seconds,
+                    dwell_time_seconds = EXCLUDED.dwell_time_seconds,
+                    schedule_adherence = EXCLUDED.schedule_adherence
+                WHERE current_train_positions.timestamp <= EXCLUDED.timestamp
+            """),
+            values
+        )
+    
+    # Trips that dropped out of every feed have finished or left service
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.current_position_ttl_seconds)
+    await db.execute(
+        delete(CurrentTrainPosition).where(CurrentTrainPosition.timestamp < cutoff)
+    )
+    
+    return len(values)
+
+
+async def get_current_train_positions(
+    db: AsyncSession,
+    line: str
+) -> List[CurrentTrainPosition]:
+    """Current position of every active trip on a line."""
+    cutoff = datetime.utcnow() - timedelta(seconds=settings.current_position_ttl_seconds)
     query = (
-        select(TrainPosition)
-        .where(TrainPosition.line == line)
-        .order_by(TrainPosition.timestamp.desc())
-        .limit(limit)
+        select(CurrentTrainPosition)
+        .where(
+            CurrentTrainPosition.line == line,
+            CurrentTrainPosition.timestamp >= cutoff,
+        )
+        .order_by(CurrentTrainPosition.direction, CurrentTrainPosition.arrival_time)
     )
     result = await db.execute(query)
     return result.scalars().all()
@@ -128,6 +221,15 @@ async def get_train_positions_since(
     return result.scalars().all()
 
 
+def _training_positions_filter(start_time: datetime, end_time: datetime):
+    """Row filter shared by training count and streaming queries."""
+    return and_(
+        TrainPosition.timestamp >= start_time,
+        TrainPosition.timestamp <= end_time,
+        TrainPosition.headway_seconds.isnot(None),
+    )
+
+
 async def get_train_positions_for_training(
     db: AsyncSession,
     start_time: datetime,
@@ -136,19 +238,46 @@ async def get_train_positions_for_training(
     """Get train positions for model training."""
     query = (
         select(TrainPosition)
-        .where(
-            and_(
-                TrainPosition.timestamp >= start_time,
-                TrainPosition.timestamp <= end_time,
-                TrainPosition.headway_seconds.isnot(None),
-            )
-        )
+        .where(_training_positions_filter(start_time, end_time))
         .order_by(TrainPosition.timestamp)
     )
     result = await db.execute(query)
     return result.scalars().all()
 
 
+async def count_train_positions_for_training(
+    db: AsyncSession,
+    start_time: datetime,
+    end_time: datetime
+) -> int:
+    """Count positions available for model training."""
+    count = await db.scalar(
+        select(func.count())
+        .select_from(TrainPosition)
+        .where(_training_positions_filter(start_time, end_time))
+    )
+    return count or 0
+
+
+async def stream_train_positions_for_training(
+    db: AsyncSession,
+    start_time: datetime,
+    end_time: datetime,
+    columns: Sequence[str],
+    chunk_size: int = 10000,
+) -> AsyncIterator[Sequence[Tuple]]:
+    """Stream projected training rows in chunks over a server-side cursor."""
+    query = (
+        select(*[getattr(TrainPosition, col) for col in columns])
+        .where(_training_positions_filter(start_time, end_time))
+        .order_by(TrainPosition.timestamp)
+        .execution_options(yield_per=chunk_size)
+    )
+    result = await db.stream(query)
+    async for partition in result.partitions(chunk_size):
+        yield partition
+
+
 # Anomaly operations
 async def create_anomaly(db: AsyncSession, anomaly_data: Dict) -> Anomaly:
     """Create new anomaly record with sanitized JSONB fields."""
@@ -161,25 +290,21 @@ async def create_anomaly(db: AsyncSession, anomaly_data: Dict) -> Anomaly:
     anomaly = Anomaly(**anomaly_data)
     db.add(anomaly)
     await db.flush()
+    invalidate_on_commit(db, ANOMALIES)
     return anomaly
 
 
-async def get_anomalies(
-    db: AsyncSession,
-    page: int = 1,
-    page_size: int = 50,
+COUNT_MODES = ("exact", "estimated", "none")
+
+
+def _anomaly_conditions(
     line: Optional[str] = None,
     station_id: Optional[str] = None,
     resolved: Optional[bool] = None,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-) -> Tuple[List[Anomaly], int]:
-    """Get paginated anomalies with filters."""
-    
-    # Base query
-    query = select(Anomaly)
-    
-    # Apply filters
+) -> List:
+    """Filter conditions shared by anomaly listing and counting."""
     conditions = []
     if line:
         conditions.append(Anomaly.line == line)
@@ -191,22 +316,78 @@ async def get_anomalies(
         conditions.append(Anomaly.detected_at >= start_date)
     if end_date:
         conditions.append(Anomaly.detected_at <= end_date)
-    
+    return conditions
+
+
+async def count_anomalies(
+    db: AsyncSession,
+    conditions: Sequence,
+    mode: str = "exact",
+) -> Optional[int]:
+    """Count filtered anomalies: exact count(*), planner estimate, or None."""
+    if mode == "none":
+        return None
+    
+    query = select(Anomaly.id)
     if conditions:
         query = query.where(and_(*conditions))
     
-    # Get total count
-    count_query = select(func.count()).select_from(query.subquery())
-    total = await db.scalar(count_query)
+    if mode == "exact":
+        total = await db.scalar(select(func.count()).select_from(query.subquery()))
+        return total or 0
+    
+    if mode == "estimated":
+        # Row estimate from the plan; no rows are read
+        compiled = query.compile(
+            dialect=db.bind.dialect, compile_kwargs={"literal_binds": True}
+        )
+        conn = await db.connection()
+        result = await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}")
+        plan = result.scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+    
+    raise ValueError(f"Unknown count mode: {mode}")
+
+
+async def get_anomalies(
+    db: AsyncSession,
+    page: int = 1,
+    page_size: int = 50,
+    line: Optional[str] = None,
+    station_id: Optional[str] = None,
+    resolved: Optional[bool] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    cursor: Optional[Tuple[datetime, int]] = None,
+    count_mode: str = "exact",
+) -> Tuple[List[Anomaly], Optional[int]]:
+    """Get a page of anomalies, newest first.
+    
+    With ``cursor`` (the (detected_at, id) of the last row already seen)
+    the page starts right after it via an index range instead of OFFSET,
+    and ``page`` is ignored.
+    """
+    
+    conditions = _anomaly_conditions(line, station_id, resolved, start_date, end_date)
+    total = await count_anomalies(db, conditions, count_mode)
     
-    # Apply pagination
-    offset = (page - 1) * page_size
-    query = query.order_by(Anomaly.detected_at.desc()).offset(offset).limit(page_size)
+    query = select(Anomaly)
+    if cursor is not None:
+        conditions.append(tuple_(Anomaly.detected_at, Anomaly.id) < tuple_(*cursor))
+    if conditions:
+        query = query.where(and_(*conditions))
+    
+    # id breaks ties so cursors are unambiguous
+    query = query.order_by(Anomaly.detected_at.desc(), Anomaly.id.desc()).limit(page_size)
+    if cursor is None:
+        query = query.offset((page - 1) * page_size)
     
     result = await db.execute(query)
     anomalies = result.scalars().all()
     
-    return anomalies, total or 0
+    return anomalies, total
 
 
 async def get_anomaly_by_id(db: AsyncSession, anomaly_id: int) -> Optional[Anomaly]:
@@ -223,82 +404,85 @@ async def resolve_anomaly(db: AsyncSession, anomaly_id: int) -> Optional[Anomaly
         anomaly.resolved = True
         anomaly.resolved_at = datetime.utcnow()
         await db.flush()
+        invalidate_on_commit(db, ANOMALIES)
     return anomaly
 
 
+# Severity histogram edges: low < 0.33 <= medium < 0.67 <= high
+SEVERITY_BUCKETS = ("low", "medium", "high")
+
+# GROUPING(anomaly_type, line, severity_bucket) bitmask per grouping set
+_GROUP_TOTALS = 0b111
+_GROUP_TYPE = 0b011
+_GROUP_LINE = 0b101
+_GROUP_SEVERITY = 0b110
+
+
 async def get_anomaly_stats(
     db: AsyncSession,
     start_time: datetime,
     end_time: datetime
 ) -> Dict:
-    """Get anomaly statistics."""
+    """Get anomaly statistics in a single aggregate query.
     
-    # Total today
-    today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
-    today_count = await db.scalar(
-        select(func.count()).select_from(Anomaly).where(
-            Anomaly.detected_at >= today_start
-        )
-    )
-    
-    # Active anomalies
-    active_count = await db.scalar(
-        select(func.count()).select_from(Anomaly).where(
-            Anomaly.resolved == False
-        )
-    )
+    One grouping-sets pass returns the totals row plus one row per type,
+    line and severity bucket, so the result size is independent of the
+    number of anomalies.
+    """
     
-    # By type
-    type_query = (
-        select(Anomaly.anomaly_type, func.count())
-        .where(
-            and_(
-                Anomaly.detected_at >= start_time,
-                Anomaly.detected_at <= end_time
-            )
-        )
-        .group_by(Anomaly.anomaly_type)
-    )
-    type_result = await db.execute(type_query)
-    by_type = dict(type_result.all())
+    today_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
     
-    # By line
-    line_query = (
-        select(Anomaly.line, func.count())
-        .where(
-            and_(
-                Anomaly.detected_at >= start_time,
-                Anomaly.detected_at <= end_time,
-                Anomaly.line.isnot(None)
-            )
-        )
-        .group_by(Anomaly.line)
-    )
-    line_result = await db.execute(line_query)
-    by_line = dict(line_result.all())
-    
-    # Severity distribution
-    severity_dist = {
-        "low": 0,
-        "medium": 0,
-        "high": 0,
-    }
+    query = text("""
+        SELECT
+            GROUPING(anomaly_type, line, severity_bucket) AS grouping_id,
+            anomaly_type,
+            line,
+            severity_bucket,
+            COUNT(*) FILTER (WHERE in_window) AS window_count,
+            COUNT(*) FILTER (WHERE detected_at >= :today_start) AS today_count,
+            COUNT(*) FILTER (WHERE resolved = false) AS active_count
+        FROM (
+            SELECT
+                anomaly_type,
+                line,
+                resolved,
+                detected_at,
+                detected_at >= :start_time AND detected_at <= :end_time AS in_window,
+                width_bucket(severity, ARRAY[0.33, 0.67]::double precision[]) AS severity_bucket
+            FROM anomalies
+            WHERE detected_at >= :scan_start OR resolved = false
+        ) AS scoped
+        GROUP BY GROUPING SETS ((), (anomaly_type), (line), (severity_bucket))
+    """)
     
-    severity_query = select(Anomaly.severity).where(
-        and_(
-            Anomaly.detected_at >= start_time,
-            Anomaly.detected_at <= end_time
-        )
+    result = await db.execute(
+        query,
+        {
+            "start_time": start_time,
+            "end_time": end_time,
+            "today_start": today_start,
+            "scan_start": min(start_time, today_start),
+        },
     )
-    severity_result = await db.execute(severity_query)
     
-    for (severity,) in severity_result:
-        if severity < 0.33:
-            severity_dist["low"] += 1
-        elif severity < 0.67:
-            severity_dist["medium"] += 1
-        else:
-            severity_dist["high"] += 1
+    today_count = 0
+    active_count = 0
+    by_type: Dict[str, int] = {}
+    by_line: Dict[str, int] = {}
+    severity_dist = {bucket: 0 for bucket in SEVERITY_BUCKETS}
+    
+    for grouping_id, anomaly_type, line, bucket, window_count, today, active in result:
+        if grouping_id == _GROUP_TOTALS:
+            today_count, active_count = today, active
+        elif not window_count:
+            # Group only has rows outside the window (today/active scan)
+            continue
+        elif grouping_id == _GROUP_TYPE and anomaly_type is not None:
+            by_type[anomaly_type] = window_count
+        elif grouping_id == _GROUP_LINE and line is not None:
+            by_line[line] = window_count
+        elif grouping_id == _GROUP_SEVERITY and bucket is not None:
+            severity_dist[SEVERITY_BUCKETS[bucket]] = window_count
     
     return {
         "total_today": today_count or 0,
@@ -314,28 +498,31 @@ async def get_anomaly_trend(
     start_time: datetime,
     end_time: datetime
 ) -> List[Dict]:
-    """Get hourly anomaly trend."""
+    """Get hourly anomaly trend from the hourly rollup."""
     
-    query = text("""
+    query = text(f"""
         SELECT 
-            date_trunc('hour', detected_at) as hour,
-            COUNT(*) as count,
-            AVG(severity) as avg_severity
-        FROM anomalies
-        WHERE detected_at >= :start_time AND detected_at <= :end_time
-        GROUP BY hour
-        ORDER BY hour
+            bucket as hour,
+            SUM(anomaly_count) as count,
+            SUM(severity_sum) / NULLIF(SUM(anomaly_count), 0) as avg_severity
+        FROM {rollup_table("anomaly", "1h")}
+        WHERE bucket >= :start_time AND bucket <= :end_time
+        GROUP BY bucket
+        ORDER BY bucket
     """)
     
     result = await db.execute(
         query,
-        {"start_time": start_time, "end_time": end_time}
+        {
+            "start_time": start_time.replace(minute=0, second=0, microsecond=0),
+            "end_time": end_time,
+        }
     )
     
     trend = [
         {
             "hour": row[0].isoformat() if row[0] else None,
-            "count": row[1],
+            "count": int(row[1]),
             "avg_severity": float(row[2]) if row[2] else 0,
         }
         for row in result
@@ -344,6 +531,76 @@ async def get_anomaly_trend(
     return trend
 
 
+async def get_line_health(
+    db: AsyncSession,
+    start_time: datetime,
+    end_time: datetime,
+    resolution: str = "1h",
+    line: Optional[str] = None,
+) -> List[Dict]:
+    """Per-line service and anomaly summary from the rollups."""
+    
+    line_filter = "AND line = :line" if line else ""
+    query = text(f"""
+        WITH service AS (
+            SELECT
+                line,
+                SUM(sample_count) AS samples,
+                COUNT(DISTINCT station_id) AS stations,
+                SUM(headway_sum) / NULLIF(SUM(headway_count), 0) AS avg_headway,
+                MAX(headway_max) AS max_headway,
+                SUM(delay_sum) / NULLIF(SUM(delay_count), 0) AS avg_delay,
+                MAX(delay_max) AS max_delay,
+                SUM(dwell_sum) / NULLIF(SUM(dwell_count), 0) AS avg_dwell
+            FROM {rollup_table("position", resolution)}
+            WHERE bucket >= :start_time AND bucket < :end_time {line_filter}
+            GROUP BY line
+        ),
+        incidents AS (
+            SELECT
+                line,
+                SUM(anomaly_count) AS anomalies,
+                MAX(severity_max) AS max_severity
+            FROM {rollup_table("anomaly", resolution)}
+            WHERE bucket >= :start_time AND bucket < :end_time {line_filter}
+            GROUP BY line
+        )
+        SELECT
+            COALESCE(s.line, i.line) AS line,
+            s.samples, s.stations, s.avg_headway, s.max_headway,
+            s.avg_delay, s.max_delay, s.avg_dwell,
+            i.anomalies, i.max_severity
+        FROM service s
+        FULL OUTER JOIN incidents i ON i.line = s.line
+        WHERE COALESCE(s.line, i.line) IS NOT NULL
+        ORDER BY 1
+    """)
+    
+    params = {"start_time": start_time, "end_time": end_time}
+    if line:
+        params["line"] = line
+    result = await db.execute(query, params)
+    
+    def as_float(value) -> Optional[float]:
+        return float(value) if value is not None else None
+    
+    return [
+        {
+            "line": row.line,
+            "samples": int(row.samples or 0),
+            "stations": int(row.stations or 0),
+            "avg_headway_seconds": as_float(row.avg_headway),
+            "max_headway_seconds": as_float(row.max_headway),
+            "avg_delay_seconds": as_float(row.avg_delay),
+            "max_delay_seconds": as_float(row.max_delay),
+            "avg_dwell_seconds": as_float(row.avg_dwell),
+            "anomalies": int(row.anomalies or 0),
+            "max_severity": as_float(row.max_severity),
+        }
+        for row in result
+    ]
+
+
 # Model operations
 async def create_model_artifact(
     db: AsyncSession,
@@ -353,6 +610,9 @@ async def create_model_artifact(
     metrics: Dict,
     artifact_path: str,
     training_samples: int,
+    parent_version: Optional[str] = None,
+    data_start: Optional[datetime] = None,
+    data_end: Optional[datetime] = None,
 ) -> ModelArtifact:
     """Create model artifact with sanitized metrics."""
     artifact = ModelArtifact(
@@ -363,6 +623,9 @@ async def create_model_artifact(
         artifact_path=artifact_path,
         training_samples=training_samples,
         hyperparameters={},
+        parent_version=parent_version,
+        data_start=data_start,
+        data_end=data_end,
     )
     db.add(artifact)
     await db.flush()
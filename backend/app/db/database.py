@@ -1,12 +1,26 @@
 """
 Database configuration with proper JSONB codec setup.
+
+Three engines with separately sized pools keep workloads from starving
+each other:
+
+- write: ingestion, anomaly writes, schema and storage maintenance
+  (``engine``, ``AsyncSessionLocal``, ``get_db``)
+- read: API reads (``read_engine``, ``ReadSessionLocal``, ``get_read_db``),
+  routed to DATABASE_READ_URL when a replica is configured. Replica reads
+  can lag the primary by the replication delay.
+- analytics: training reads and model publishing (``analytics_engine``,
+  ``AnalyticsSessionLocal``), always on the primary since it also writes
+
+Pool usage is exported to Prometheus on every scrape (PoolCollector).
 """
 
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Dict, Iterator
 
 import structlog
+from prometheus_client.core import REGISTRY, GaugeMetricFamily
 from sqlalchemy import text
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
 from sqlalchemy.pool import NullPool
 
@@ -15,48 +29,73 @@ from app.config import get_settings
 logger = structlog.get_logger()
 settings = get_settings()
 
-# Create async engine with proper settings
-if settings.debug:
-    # Use NullPool for debugging (no pooling)
-    engine = create_async_engine(
-        str(settings.database_url),
-        echo=settings.debug,
-        poolclass=NullPool,
-        connect_args={
-            "server_settings": {
-                "jit": "off",
-                "application_name": "nyc_subway_monitor"
-            },
-            "command_timeout": 60,
-        }
-    )
-else:
+
+def _create_engine(url: str, role: str, pool_size: int, max_overflow: int) -> AsyncEngine:
+    """Async engine for one workload; the role shows up in pg_stat_activity."""
+    connect_args = {
+        "server_settings": {
+            "jit": "off",
+            "application_name": f"nyc_subway_monitor:{role}"
+        },
+        "command_timeout": 60,
+    }
+    
+    if settings.debug:
+        # Use NullPool for debugging (no pooling)
+        return create_async_engine(
+            url,
+            echo=settings.debug,
+            poolclass=NullPool,
+            connect_args=connect_args,
+        )
+    
     # Use connection pooling for production
-    engine = create_async_engine(
-        str(settings.database_url),
+    return create_async_engine(
+        url,
         echo=False,
         pool_pre_ping=True,
-        pool_size=20,
-        max_overflow=10,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
         pool_recycle=3600,
-        pool_timeout=30,
-        connect_args={
-            "server_settings": {
-                "jit": "off",
-                "application_name": "nyc_subway_monitor"
-            },
-            "command_timeout": 60,
-        }
+        pool_timeout=settings.db_pool_timeout,
+        connect_args=connect_args,
     )
 
-# Session factory
-AsyncSessionLocal = sessionmaker(
-    engine,
-    class_=AsyncSession,
-    expire_on_commit=False,
-    autoflush=False,
-    autocommit=False,
+
+engine = _create_engine(
+    str(settings.database_url), "write",
+    settings.db_write_pool_size, settings.db_write_max_overflow,
+)
+read_engine = _create_engine(
+    str(settings.database_read_url or settings.database_url), "read",
+    settings.db_read_pool_size, settings.db_read_max_overflow,
 )
+analytics_engine = _create_engine(
+    str(settings.database_url), "analytics",
+    settings.db_analytics_pool_size, settings.db_analytics_max_overflow,
+)
+
+ENGINES: Dict[str, AsyncEngine] = {
+    "write": engine,
+    "read": read_engine,
+    "analytics": analytics_engine,
+}
+
+
+def _session_factory(bind: AsyncEngine) -> sessionmaker:
+    return sessionmaker(
+        bind,
+        class_=AsyncSession,
+        expire_on_commit=False,
+        autoflush=False,
+        autocommit=False,
+    )
+
+
+# Session factories
+AsyncSessionLocal = _session_factory(engine)
+ReadSessionLocal = _session_factory(read_engine)
+AnalyticsSessionLocal = _session_factory(analytics_engine)
 
 Base = declarative_base()
 
@@ -73,75 +112,127 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
             await session.close()
 
 
+async def get_read_db() -> AsyncGenerator[AsyncSession, None]:
+    """Session on the read pool (replica when configured) for endpoints that only read."""
+    async with ReadSessionLocal() as session:
+        try:
+            yield session
+        except Exception:
+            await session.rollback()
+            raise
+        finally:
+            await session.close()
+
+
+async def dispose_engines() -> None:
+    """Close every pooled connection."""
+    for db_engine in ENGINES.values():
+        await db_engine.dispose()
+
+
+class PoolCollector:
+    """Prometheus collector reading pool usage of each engine at scrape time."""
+    
+    def __init__(self, engines: Dict[str, AsyncEngine]):
+        self.engines = engines
+    
+    def collect(self) -> Iterator[GaugeMetricFamily]:
+        connections = GaugeMetricFamily(
+            "subway_db_pool_connections",
+            "Connections per engine pool by state",
+            labels=["pool", "state"],
+        )
+        capacity = GaugeMetricFamily(
+            "subway_db_pool_capacity",
+            "Maximum connections of an engine pool (pool size plus overflow)",
+            labels=["pool"],
+        )
+        saturation = GaugeMetricFamily(
+            "subway_db_pool_saturation",
+            "Fraction of an engine pool's capacity checked out",
+            labels=["pool"],
+        )
+        
+        for name, db_engine in self.engines.items():
+            pool = db_engine.sync_engine.pool
+            if not hasattr(pool, "checkedout"):
+                continue  # NullPool keeps no connections
+            
+            checked_out = pool.checkedout()
+            limit = pool.size() + max(pool._max_overflow, 0)
+            connections.add_metric([name, "checked_out"], checked_out)
+            connections.add_metric([name, "idle"], pool.checkedin())
+            connections.add_metric([name, "overflow"], max(pool.overflow(), 0))
+            capacity.add_metric([name], limit)
+            saturation.add_metric([name], checked_out / limit if limit else 0.0)
+        
+        yield connections
+        yield capacity
+        yield saturation
+
+
+REGISTRY.register(PoolCollector(ENGINES))
+
+
 async def init_db() -> None:
     """Initialize database with extensions and tables."""
     try:
+        from app.db.storage import TIME_SERIES_TABLES, ensure_partitions, prepare_native_partitioning
+        
         async with engine.begin() as conn:
-            # Skip TimescaleDB extension for local development
-            # await conn.execute(text("CREATE EXTENSION IF NOT EXISTS timescaledb CASCADE"))
+            # New time-series tables become partitioned when configured
+            partitioned = await prepare_native_partitioning(conn, Base.metadata)
             
-            # Create tables
+            # Create tables; hypertables, partitions and retention are
+            # applied by app.db.storage once the schema exists
             await conn.run_sync(Base.metadata.create_all)
         
-        # Skip hypertables for local development
-        # await create_hypertables()
+        # Fresh partitioned tables need somewhere to put rows right away
+        for policy in TIME_SERIES_TABLES:
+            if policy.table in partitioned:
+                await ensure_partitions(policy)
+        
+        # Columns added after tables were first created
+        await upgrade_schema()
         
         # Create indexes
         await create_indexes()
         
-        logger.info("Database initialized successfully (without TimescaleDB)")
+        logger.info("Database initialized successfully")
         
     except Exception as e:
         logger.error(f"Database initialization failed: {e}")
         raise
 
 
-async def create_hypertables() -> None:
-    """Create TimescaleDB hypertables with error handling."""
-    hypertables = [
-        ("feed_updates", "timestamp"),
-        ("anomalies", "detected_at"),
-        ("train_positions", "timestamp"),
+async def upgrade_schema() -> None:
+    """Add columns that create_all does not add to existing tables."""
+    statements = [
+        "ALTER TABLE model_artifacts ADD COLUMN IF NOT EXISTS parent_version VARCHAR(100)",
+        "ALTER TABLE model_artifacts ADD COLUMN IF NOT EXISTS data_start TIMESTAMPTZ",
+        "ALTER TABLE model_artifacts ADD COLUMN IF NOT EXISTS data_end TIMESTAMPTZ",
     ]
     
     async with engine.begin() as conn:
-        for table_name, time_column in hypertables:
+        for statement in statements:
             try:
-                # Check if already hypertable
-                result = await conn.execute(
-                    text("""
-                        SELECT COUNT(*)
-                        FROM timescaledb_information.hypertables
-                        WHERE hypertable_name = :table_name
-                    """),
-                    {"table_name": table_name}
-                )
-                
-                if result.scalar() == 0:
-                    await conn.execute(
-                        text(f"""
-                            SELECT create_hypertable(
-                                '{table_name}',
-                                '{time_column}',
-                                chunk_time_interval => INTERVAL '1 day',
-                                if_not_exists => TRUE
-                            )
-                        """)
-                    )
-                    logger.info(f"Created hypertable: {table_name}")
-                    
+                await conn.execute(text(statement))
             except Exception as e:
-                logger.warning(f"Hypertable creation failed for {table_name}: {e}")
+                logger.warning(f"Schema upgrade failed: {e}")
 
 
 async def create_indexes() -> None:
-    """Create performance indexes."""
+    """Apply the secondary index plan (app.db.indexes) and model constraints."""
+    from app.db.indexes import apply_index_plan
+    
+    async with engine.begin() as conn:
+        await apply_index_plan(conn)
+    
     indexes = [
-        "CREATE INDEX IF NOT EXISTS idx_train_positions_current_station ON train_positions(current_station)",
-        "CREATE INDEX IF NOT EXISTS idx_train_positions_next_station ON train_positions(next_station)",
-        "CREATE INDEX IF NOT EXISTS idx_anomalies_station_time ON anomalies(station_id, detected_at DESC)",
-        "CREATE INDEX IF NOT EXISTS idx_train_positions_line_time ON train_positions(line, timestamp DESC)",
-        "CREATE INDEX IF NOT EXISTS idx_feed_updates_feed_time ON feed_updates(feed_id, timestamp DESC)",
+        # Older schemas made (model_type, is_active) unique, which allowed a
+        # single inactive version per type and broke repeated retraining
+        "ALTER TABLE model_artifacts DROP CONSTRAINT IF EXISTS uq_one_active_per_type",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_one_active_per_type ON model_artifacts(model_type) WHERE is_active",
     ]
     
     async with engine.begin() as conn:
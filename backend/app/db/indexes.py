@@ -0,0 +1,135 @@
+"""
+Secondary index plan for the application tables.
+
+Each index is tied to the queries it serves (see crud). The insert-heavy
+train_positions table carries as few indexes as possible:
+
+- BRIN on the time column of the append-only tables. Rows arrive in time
+  order, so a few pages of block ranges answer the time-window scans of
+  training, rollup refresh and detection at a fraction of a B-tree's size
+  and write cost.
+- One B-tree on (line, timestamp) for line-scoped detection windows; the
+  positions endpoint reads the small current_train_positions table instead.
+- A partial index over unresolved anomalies, a small and hot subset.
+
+Indexes created by earlier schemas that duplicate or are unused by these
+queries are listed in OBSOLETE_INDEXES and dropped by apply_index_plan.
+"""
+
+from dataclasses import dataclass
+from typing import List, Sequence
+
+import structlog
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+logger = structlog.get_logger()
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    """One secondary index and the query it exists for."""
+
+    name: str
+    table: str
+    definition: str  # Everything after "ON <table>"
+    serves: str
+
+    @property
+    def create_sql(self) -> str:
+        return f"CREATE INDEX IF NOT EXISTS {self.name} ON {self.table} {self.definition}"
+
+
+INDEX_PLAN = (
+    IndexSpec(
+        "brin_train_positions_time",
+        "train_positions",
+        "USING brin (timestamp) WITH (pages_per_range = 32)",
+        "get_train_positions_since, training reads, position rollups",
+    ),
+    IndexSpec(
+        "idx_train_positions_line_time",
+        "train_positions",
+        "(line, timestamp DESC)",
+        "get_train_positions_since(line=...)",
+    ),
+    IndexSpec(
+        "idx_current_positions_line",
+        "current_train_positions",
+        "(line)",
+        "get_current_train_positions",
+    ),
+    IndexSpec(
+        "brin_feed_updates_time",
+        "feed_updates",
+        "USING brin (timestamp) WITH (pages_per_range = 32)",
+        "retention and time-window scans",
+    ),
+    IndexSpec(
+        "idx_feed_updates_time",
+        "feed_updates",
+        "(timestamp DESC)",
+        "get_recent_feed_updates (ORDER BY timestamp DESC LIMIT n)",
+    ),
+    IndexSpec(
+        "idx_anomalies_time_id",
+        "anomalies",
+        "(detected_at DESC, id DESC)",
+        "get_anomalies keyset and offset pages, anomaly rollups",
+    ),
+    IndexSpec(
+        "idx_anomalies_station_time",
+        "anomalies",
+        "(station_id, detected_at DESC)",
+        "get_anomalies(station_id=...)",
+    ),
+    IndexSpec(
+        "idx_anomalies_unresolved",
+        "anomalies",
+        "(detected_at DESC, id DESC) WHERE NOT resolved",
+        "get_anomalies(resolved=False), active count in get_anomaly_stats",
+    ),
+)
+
+# Duplicates of the plan or indexes no query uses
+OBSOLETE_INDEXES = (
+    "idx_train_line_time",  # Same keys as idx_train_positions_line_time
+    # Covering index for GET /positions/{line}, now served by current_train_positions
+    "idx_train_positions_line_latest",
+    "idx_train_station",  # No query filters positions by station
+    "idx_train_positions_current_station",
+    "idx_train_positions_next_station",
+    "idx_feed_timestamp",  # Same keys as idx_feed_updates_feed_time
+    "idx_feed_updates_feed_time",  # No query filters by feed_id
+    "idx_anomaly_station_time",  # Same keys as idx_anomalies_station_time
+    "idx_anomaly_active",  # Replaced by the partial idx_anomalies_unresolved
+    # B-trees create_hypertable adds on the time column by default
+    "train_positions_timestamp_idx",
+    "feed_updates_timestamp_idx",
+    "anomalies_detected_at_idx",
+)
+
+
+async def apply_index_plan(
+    conn: AsyncConnection,
+    plan: Sequence[IndexSpec] = INDEX_PLAN,
+    obsolete: Sequence[str] = OBSOLETE_INDEXES,
+) -> List[str]:
+    """Drop obsolete indexes and create the planned ones; returns failures.
+
+    Each statement runs in its own savepoint so one failure (e.g. a table
+    that does not exist yet) does not abort the rest.
+    """
+    failed = []
+    statements = [(name, f"DROP INDEX IF EXISTS {name}") for name in obsolete]
+    statements += [(spec.name, spec.create_sql) for spec in plan]
+
+    for name, statement in statements:
+        try:
+            async with conn.begin_nested():
+                await conn.execute(text(statement))
+        except Exception as e:
+            logger.warning(f"Index change failed for {name}: {e}")
+            failed.append(name)
+
+    return failed
@@ -0,0 +1,33 @@
+"""
+Postgres advisory lock keys used by the application.
+
+Advisory locks share one bigint key space per database with every other
+client (extensions, migration tools, other services), and two purposes
+that pick the same key silently serialize or skip each other's work. Keys
+are therefore derived from a namespaced purpose string instead of being
+chosen by hand, and all of them are defined here so a new lock cannot
+reuse an existing key unnoticed.
+"""
+
+import hashlib
+
+NAMESPACE = "nyc_subway_monitor"
+
+
+def advisory_lock_key(purpose: str) -> int:
+    """Stable signed 64-bit key for ``nyc_subway_monitor:<purpose>``."""
+    digest = hashlib.sha256(f"{NAMESPACE}:{purpose}".encode()).digest()
+    return int.from_bytes(digest[:8], "big", signed=True)
+
+
+# One training run at a time across API replicas and training workers
+TRAINING_LOCK_ID = advisory_lock_key("training")
+
+# Serializes identifier code assignment (app.ml.vocab)
+VOCABULARY_LOCK_ID = advisory_lock_key("identifier_vocabulary")
+
+# One rollup refresh at a time across API workers
+ROLLUP_REFRESH_LOCK_ID = advisory_lock_key("rollup_refresh")
+
+# One retention/partition maintenance run at a time across API workers
+STORAGE_MAINTENANCE_LOCK_ID = advisory_lock_key("storage_maintenance")
@@ -18,8 +18,8 @@ from sqlalchemy import (
     Integer,
     String,
     Text,
-    UniqueConstraint,
     PrimaryKeyConstraint,
+    text,
 )
 from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.orm import relationship
@@ -57,10 +57,9 @@ class FeedUpdate(Base):
     num_alerts = Column(Integer)
     processing_time_ms = Column(Float)
     
-    # Composite primary key for TimescaleDB
+    # Composite primary key for TimescaleDB; secondary indexes in app.db.indexes
     __table_args__ = (
         PrimaryKeyConstraint('id', 'timestamp'),
-        Index("idx_feed_timestamp", "feed_id", "timestamp"),
     )
 
 
@@ -86,13 +85,33 @@ class TrainPosition(Base):
     dwell_time_seconds = Column(Integer)  # Stop duration
     schedule_adherence = Column(Float)  # Z-score of delay
     
+    # Secondary indexes in app.db.indexes
     __table_args__ = (
         PrimaryKeyConstraint('id', 'timestamp'),
-        Index("idx_train_line_time", "line", "timestamp"),
-        Index("idx_train_station", "current_station", "timestamp"),
     )
 
 
+class CurrentTrainPosition(Base):
+    """Latest position of each active trip, upserted by ingestion."""
+    
+    __tablename__ = "current_train_positions"
+    
+    id = Column(Integer, primary_key=True)  # Stable per trip across upserts
+    trip_id = Column(String(100), nullable=False, unique=True)
+    timestamp = Column(DateTime(timezone=True), nullable=False)  # Last seen
+    route_id = Column(String(10), nullable=False)
+    line = Column(String(20), nullable=False)
+    direction = Column(Integer)
+    current_station = Column(String(10))  # First upcoming stop in the trip update
+    next_station = Column(String(10))  # The stop after it
+    arrival_time = Column(DateTime(timezone=True))
+    departure_time = Column(DateTime(timezone=True))
+    delay_seconds = Column(Integer, default=0)
+    headway_seconds = Column(Integer)
+    dwell_time_seconds = Column(Integer)
+    schedule_adherence = Column(Float)
+
+
 class Anomaly(Base):
     """Detected anomalies from ML models."""
     
@@ -116,10 +135,23 @@ class Anomaly(Base):
     # Relationships
     station = relationship("Station", back_populates="anomalies")
     
+    # Secondary indexes in app.db.indexes
     __table_args__ = (
         PrimaryKeyConstraint('id', 'detected_at'),
-        Index("idx_anomaly_active", "resolved", "detected_at"),
-        Index("idx_anomaly_station_time", "station_id", "detected_at"),
+    )
+
+
+class IdentifierVocabulary(Base):
+    """Append-only identifier codes shared by features and models (app.ml.vocab)."""
+    
+    __tablename__ = "identifier_vocabulary"
+    
+    vocabulary = Column(String(20), primary_key=True)  # "stations", "lines", "routes"
+    token = Column(String(100), primary_key=True)
+    code = Column(Integer, nullable=False)
+    
+    __table_args__ = (
+        Index("uq_vocabulary_code", "vocabulary", "code", unique=True),
     )
 
 
@@ -139,10 +171,21 @@ class ModelArtifact(Base):
     hyperparameters = Column(JSONB)
     training_samples = Column(Integer)
     
+    # Lineage: warm-started versions point at the model they continued from
+    parent_version = Column(String(100))
+    data_start = Column(DateTime(timezone=True))  # Window trained on in this run
+    data_end = Column(DateTime(timezone=True))
+    
     # Storage
     artifact_path = Column(String(500))  # S3 or local path
     is_active = Column(Boolean, default=False)  # Currently deployed model
     
     __table_args__ = (
-        UniqueConstraint("model_type", "is_active", name="uq_one_active_per_type"),
+        # Only one active model per type; any number of inactive versions
+        Index(
+            "uq_one_active_per_type",
+            "model_type",
+            unique=True,
+            postgresql_where=text("is_active"),
+        ),
     )
\ No newline at end of file
@@ -0,0 +1,304 @@
+"""
+Time-bucketed rollups of anomalies and train positions.
+
+Dashboards read pre-aggregated 5-minute and hourly buckets per line and
+station instead of grouping raw rows on every request:
+
+    anomaly_rollup_5m / anomaly_rollup_1h     counts and severity per type
+    position_rollup_5m / position_rollup_1h   headway, delay and dwell stats
+
+When TimescaleDB is installed and the source table is a hypertable, each
+rollup is a continuous aggregate refreshed by a Timescale policy (with
+real-time aggregation of the newest rows). Otherwise it is a plain table
+maintained by ``refresh_rollups``: every run re-aggregates the buckets from
+the last watermark minus ``rollup_lookback_minutes`` and upserts them, and
+hourly buckets are summed from the 5-minute table rather than raw rows.
+Rows arriving later than the lookback are not picked up.
+
+Measures are stored as counts, sums and maxima so any bucket range can be
+re-aggregated exactly; averages are computed at read time.
+"""
+
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+import structlog
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.config import get_settings
+from app.db.database import engine
+from app.db.locks import ROLLUP_REFRESH_LOCK_ID
+from app.db.storage import hypertables
+
+logger = structlog.get_logger()
+settings = get_settings()
+
+BUCKET_ORIGIN = "TIMESTAMPTZ '2000-01-01 00:00:00+00'"
+
+
+@dataclass(frozen=True)
+class RollupSpec:
+    """One rollup level over a source table."""
+
+    name: str
+    source: str
+    time_column: str
+    interval: str
+    dimensions: Tuple[Tuple[str, str], ...]  # (source expression, rollup column)
+    measures: Tuple[Tuple[str, str, str, str], ...]  # (column, SQL type, raw expression, re-aggregate)
+    parent: Optional[str] = None  # finer rollup the plain-table mode sums from
+
+    @property
+    def columns(self) -> Tuple[str, ...]:
+        return tuple(name for _, name in self.dimensions) + tuple(m[0] for m in self.measures)
+
+
+_ANOMALY_DIMENSIONS = (
+    ("line", "line"),
+    ("station_id", "station_id"),
+    ("anomaly_type", "anomaly_type"),
+)
+_ANOMALY_MEASURES = (
+    ("anomaly_count", "BIGINT", "COUNT(*)", "SUM"),
+    ("severity_sum", "DOUBLE PRECISION", "SUM(severity)", "SUM"),
+    ("severity_max", "DOUBLE PRECISION", "MAX(severity)", "MAX"),
+)
+
+_POSITION_DIMENSIONS = (
+    ("line", "line"),
+    ("current_station", "station_id"),
+)
+_POSITION_MEASURES = (
+    ("sample_count", "BIGINT", "COUNT(*)", "SUM"),
+    ("headway_count", "BIGINT", "COUNT(headway_seconds)", "SUM"),
+    ("headway_sum", "DOUBLE PRECISION", "SUM(headway_seconds)", "SUM"),
+    ("headway_max", "DOUBLE PRECISION", "MAX(headway_seconds)", "MAX"),
+    ("delay_count", "BIGINT", "COUNT(delay_seconds)", "SUM"),
+    ("delay_sum", "DOUBLE PRECISION", "SUM(delay_seconds)", "SUM"),
+    ("delay_max", "DOUBLE PRECISION", "MAX(delay_seconds)", "MAX"),
+    ("dwell_count", "BIGINT", "COUNT(dwell_time_seconds)", "SUM"),
+    ("dwell_sum", "DOUBLE PRECISION", "SUM(dwell_time_seconds)", "SUM"),
+    ("dwell_max", "DOUBLE PRECISION", "MAX(dwell_time_seconds)", "MAX"),
+)
+
+# Refresh order matters: hourly tables are summed from the 5-minute ones
+ROLLUPS: Tuple[RollupSpec, ...] = (
+    RollupSpec("anomaly_rollup_5m", "anomalies", "detected_at", "5 minutes",
+               _ANOMALY_DIMENSIONS, _ANOMALY_MEASURES),
+    RollupSpec("anomaly_rollup_1h", "anomalies", "detected_at", "1 hour",
+               _ANOMALY_DIMENSIONS, _ANOMALY_MEASURES, parent="anomaly_rollup_5m"),
+    RollupSpec("position_rollup_5m", "train_positions", "timestamp", "5 minutes",
+               _POSITION_DIMENSIONS, _POSITION_MEASURES),
+    RollupSpec("position_rollup_1h", "train_positions", "timestamp", "1 hour",
+               _POSITION_DIMENSIONS, _POSITION_MEASURES, parent="position_rollup_5m"),
+)
+
+RESOLUTIONS: Dict[str, str] = {"5m": "5 minutes", "1h": "1 hour"}
+
+INTERVAL_SECONDS: Dict[str, int] = {"5 minutes": 300, "1 hour": 3600}
+
+
+def rollup_table(kind: str, resolution: str) -> str:
+    """Rollup name for 'anomaly' or 'position' at '5m' or '1h'."""
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown rollup resolution: {resolution}")
+    return f"{kind}_rollup_{resolution}"
+
+
+def _floor_bucket(ts: datetime, interval: str) -> datetime:
+    """Naive UTC start of the bucket containing ts (same origin as date_bin)."""
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    seconds = INTERVAL_SECONDS[interval]
+    elapsed = int((ts - datetime(2000, 1, 1)).total_seconds())
+    return datetime(2000, 1, 1) + timedelta(seconds=elapsed - elapsed % seconds)
+
+
+def _raw_select(spec: RollupSpec, bucket_function: str, where: str = "") -> str:
+    """Aggregate the source table into the spec's buckets."""
+    if bucket_function == "time_bucket":
+        bucket = f"time_bucket(INTERVAL '{spec.interval}', {spec.time_column})"
+    else:
+        bucket = f"date_bin(INTERVAL '{spec.interval}', {spec.time_column}, {BUCKET_ORIGIN})"
+
+    select = [f"{bucket} AS bucket"]
+    select += [f"{expr} AS {name}" for expr, name in spec.dimensions]
+    select += [f"{expr} AS {name}" for name, _, expr, _ in spec.measures]
+    group_by = ", ".join(str(i) for i in range(1, len(spec.dimensions) + 2))
+
+    return f"""
+        SELECT {', '.join(select)}
+        FROM {spec.source}
+        {where}
+        GROUP BY {group_by}
+    """
+
+
+def _parent_select(spec: RollupSpec) -> str:
+    """Re-aggregate the finer rollup into the spec's buckets."""
+    dimensions = [name for _, name in spec.dimensions]
+
+    select = [f"date_bin(INTERVAL '{spec.interval}', bucket, {BUCKET_ORIGIN}) AS bucket"]
+    select += dimensions
+    select += [f"{agg}({name}) AS {name}" for name, _, _, agg in spec.measures]
+    group_by = ", ".join(str(i) for i in range(1, len(dimensions) + 2))
+
+    return f"""
+        SELECT {', '.join(select)}
+        FROM {spec.parent}
+        WHERE bucket >= :start_time AND bucket < :end_time
+        GROUP BY {group_by}
+    """
+
+
+async def _relation_kind(conn: AsyncConnection, name: str) -> Optional[str]:
+    """pg_class.relkind of an existing relation ('r' table, 'v' view), else None."""
+    return await conn.scalar(
+        text("SELECT relkind FROM pg_class WHERE relname = :name AND relkind IN ('r', 'v', 'm')"),
+        {"name": name},
+    )
+
+
+async def _create_continuous_aggregate(conn: AsyncConnection, spec: RollupSpec) -> None:
+    # Timescale needs a refresh window of at least two buckets
+    bucket_minutes = INTERVAL_SECONDS[spec.interval] // 60
+    lookback = bucket_minutes * 3 + settings.rollup_lookback_minutes
+    await conn.execute(text(f"""
+        CREATE MATERIALIZED VIEW IF NOT EXISTS {spec.name}
+        WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS
+        {_raw_select(spec, 'time_bucket')}
+        WITH NO DATA
+    """))
+    await conn.execute(text(f"""
+        SELECT add_continuous_aggregate_policy(
+            '{spec.name}',
+            start_offset => INTERVAL '{lookback} minutes',
+            end_offset => INTERVAL '{spec.interval}',
+            schedule_interval => INTERVAL '{settings.rollup_refresh_interval} seconds',
+            if_not_exists => TRUE
+        )
+    """))
+
+
+async def _create_table(conn: AsyncConnection, spec: RollupSpec) -> None:
+    columns = ["bucket TIMESTAMPTZ NOT NULL"]
+    columns += [f"{name} TEXT" for _, name in spec.dimensions]
+    columns += [f"{name} {sql_type}" for name, sql_type, _, _ in spec.measures]
+    key = ", ".join(["bucket"] + [name for _, name in spec.dimensions])
+
+    await conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {spec.name} ({', '.join(columns)})
+    """))
+    # NULL line/station values are one group, so they must conflict as equal
+    await conn.execute(text(f"""
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_{spec.name}
+        ON {spec.name} ({key}) NULLS NOT DISTINCT
+    """))
+
+
+async def ensure_rollups() -> None:
+    """Create missing rollups as continuous aggregates or plain tables."""
+    async with engine.begin() as conn:
+        await conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS rollup_state (
+                name TEXT PRIMARY KEY,
+                refreshed_until TIMESTAMPTZ NOT NULL
+            )
+        """))
+        managed = await hypertables(conn)
+
+    for spec in ROLLUPS:
+        async with engine.begin() as conn:
+            try:
+                exists = await _relation_kind(conn, spec.name)
+                if exists is None and spec.source in managed:
+                    await _create_continuous_aggregate(conn, spec)
+                    logger.info(f"Created continuous aggregate: {spec.name}")
+                elif exists is None:
+                    await _create_table(conn, spec)
+                    logger.info(f"Created rollup table: {spec.name}")
+            except Exception as e:
+                logger.warning(f"Rollup creation failed for {spec.name}: {e}")
+
+
+async def _refresh_table(conn: AsyncConnection, spec: RollupSpec, now: datetime) -> None:
+    """Re-aggregate recent buckets of one plain rollup table and advance its watermark."""
+    watermark = await conn.scalar(
+        text("SELECT refreshed_until FROM rollup_state WHERE name = :name"),
+        {"name": spec.name},
+    )
+    if watermark is None:
+        start_time = now - timedelta(hours=settings.rollup_backfill_hours)
+    else:
+        start_time = watermark - timedelta(minutes=settings.rollup_lookback_minutes)
+
+    # Always recompute whole buckets
+    start_time = _floor_bucket(start_time, spec.interval)
+
+    if spec.parent:
+        select = _parent_select(spec)
+    else:
+        select = _raw_select(
+            spec,
+            "date_bin",
+            f"WHERE {spec.time_column} >= :start_time AND {spec.time_column} < :end_time",
+        )
+
+    key = ", ".join(["bucket"] + [name for _, name in spec.dimensions])
+    updates = ", ".join(f"{name} = EXCLUDED.{name}" for name, _, _, _ in spec.measures)
+
+    await conn.execute(
+        text(f"""
+            INSERT INTO {spec.name} (bucket, {', '.join(spec.columns)})
+            {select}
+            ON CONFLICT ({key}) DO UPDATE SET {updates}
+        """),
+        {"start_time": start_time, "end_time": now},
+    )
+    await conn.execute(
+        text("""
+            INSERT INTO rollup_state (name, refreshed_until)
+            VALUES (:name, :now)
+            ON CONFLICT (name) DO UPDATE SET refreshed_until = EXCLUDED.refreshed_until
+        """),
+        {"name": spec.name, "now": now},
+    )
+
+
+async def refresh_rollups(now: Optional[datetime] = None) -> int:
+    """Refresh every plain-table rollup; returns how many were refreshed.
+
+    Continuous aggregates are skipped, Timescale refreshes them itself.
+    """
+    now = now or datetime.utcnow()
+    refreshed = 0
+
+    async with engine.begin() as conn:
+        locked = await conn.scalar(
+            text("SELECT pg_try_advisory_xact_lock(:lock_id)"),
+            {"lock_id": ROLLUP_REFRESH_LOCK_ID},
+        )
+        if not locked:
+            # Another worker is refreshing
+            return 0
+
+        for spec in ROLLUPS:
+            if await _relation_kind(conn, spec.name) != "r":
+                continue
+            await _refresh_table(conn, spec, now)
+            refreshed += 1
+
+    return refreshed
+
+
+async def run_rollup_refresher() -> None:
+    """Keep plain rollup tables current until cancelled."""
+    while True:
+        try:
+            await refresh_rollups()
+        except Exception as e:
+            logger.error(f"Rollup refresh failed: {e}")
+        await asyncio.sleep(settings.rollup_refresh_interval)
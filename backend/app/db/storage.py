@@ -0,0 +1,504 @@
+"""
+Storage lifecycle for the time-series tables.
+
+With TimescaleDB available, train_positions, feed_updates and anomalies are
+converted to daily hypertables, chunks older than STORAGE_COMPRESS_AFTER_DAYS
+are compressed natively (0 = off), and chunks past each table's retention are
+dropped by Timescale background jobs. Startup only converts empty tables and
+refreshes policies on existing hypertables; tables that already hold rows
+are rewritten (locking them for the duration) only by the apply command.
+
+Without Timescale and with NATIVE_PARTITIONING enabled, init_db creates
+the tables range-partitioned by day (plus a DEFAULT partition for stray
+rows). The maintenance loop creates partitions ahead of time and detaches
+and drops those past retention, an O(1) catalog operation; time-bounded
+queries prune to the partitions they touch. Existing unpartitioned tables
+keep batched DELETE retention, so no single statement holds locks for long.
+
+Table sizes are exported as Prometheus gauges. Admin commands:
+
+    python -m app.db.storage apply       # (re)apply policies, migrating existing tables
+    python -m app.db.storage retention   # partitions and expired rows now (non-Timescale)
+    python -m app.db.storage sizes       # print per-table sizes
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+import structlog
+from prometheus_client import Gauge
+from sqlalchemy import MetaData, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.config import get_settings
+from app.db.database import engine
+from app.db.locks import STORAGE_MAINTENANCE_LOCK_ID
+
+logger = structlog.get_logger()
+settings = get_settings()
+
+TABLE_SIZE_BYTES = Gauge(
+    "subway_table_size_bytes",
+    "On-disk size of a time-series table including indexes and TOAST",
+    ["table"],
+)
+TABLE_ROWS_ESTIMATE = Gauge(
+    "subway_table_rows_estimate",
+    "Planner row estimate of a time-series table",
+    ["table"],
+)
+
+
+@dataclass(frozen=True)
+class TablePolicy:
+    """Lifecycle settings for one time-series table."""
+
+    table: str
+    time_column: str
+    segment_by: str  # compressed together, keeps per-line/feed scans cheap
+
+    @property
+    def retention_days(self) -> int:
+        """Days of data kept; 0 keeps everything."""
+        return getattr(settings, f"{self.table}_retention_days")
+
+
+TIME_SERIES_TABLES = (
+    TablePolicy("train_positions", "timestamp", "line"),
+    TablePolicy("feed_updates", "timestamp", "feed_id"),
+    TablePolicy("anomalies", "detected_at", "line"),
+)
+
+
+async def timescale_available(conn: AsyncConnection) -> bool:
+    """Whether the timescaledb extension is installed in this database."""
+    installed = await conn.scalar(
+        text("SELECT COUNT(*) FROM pg_extension WHERE extname = 'timescaledb'")
+    )
+    return bool(installed)
+
+
+async def hypertables(conn: AsyncConnection) -> set:
+    """Names of the tables that are already hypertables."""
+    if not await timescale_available(conn):
+        return set()
+    result = await conn.execute(
+        text("SELECT hypertable_name FROM timescaledb_information.hypertables")
+    )
+    return {row[0] for row in result}
+
+
+async def partitioned_tables(conn: AsyncConnection) -> set:
+    """Names of the time-series tables that are natively partitioned."""
+    result = await conn.execute(
+        text("SELECT relname FROM pg_class WHERE relkind = 'p' AND relname = ANY(:names)"),
+        {"names": [policy.table for policy in TIME_SERIES_TABLES]},
+    )
+    return {row[0] for row in result}
+
+
+def partition_name(table: str, day: date) -> str:
+    """Name of the partition holding one UTC day."""
+    return f"{table}_p{day:%Y%m%d}"
+
+
+def _partition_day(table: str, name: str) -> Optional[date]:
+    """Day encoded in a partition name, None for the default or foreign names."""
+    prefix = f"{table}_p"
+    if not name.startswith(prefix):
+        return None
+    try:
+        return datetime.strptime(name[len(prefix):], "%Y%m%d").date()
+    except ValueError:
+        return None
+
+
+async def prepare_native_partitioning(conn: AsyncConnection, metadata: MetaData) -> List[str]:
+    """Declare missing time-series tables as partitioned before create_all.
+
+    Only used without TimescaleDB (hypertables cannot be built on
+    partitioned tables); tables that already exist are left as they are.
+    """
+    if not settings.native_partitioning:
+        return []
+
+    ships_timescale = await conn.scalar(
+        text("SELECT COUNT(*) FROM pg_available_extensions WHERE name = 'timescaledb'")
+    )
+    if ships_timescale:
+        return []
+
+    declared = []
+    for policy in TIME_SERIES_TABLES:
+        exists = await conn.scalar(
+            text("SELECT COUNT(*) FROM pg_class WHERE relname = :table AND relkind IN ('r', 'p')"),
+            {"table": policy.table},
+        )
+        if exists:
+            continue
+        metadata.tables[policy.table].dialect_kwargs["postgresql_partition_by"] = (
+            f"RANGE ({policy.time_column})"
+        )
+        declared.append(policy.table)
+
+    if declared:
+        logger.info(f"Creating range-partitioned tables: {', '.join(declared)}")
+
+    return declared
+
+
+async def ensure_partitions(policy: TablePolicy, today: Optional[date] = None) -> List[str]:
+    """Create the DEFAULT partition and daily partitions from yesterday ahead."""
+    today = today or datetime.utcnow().date()
+    table = policy.table
+    created = []
+
+    async with engine.begin() as conn:
+        await conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT"
+        ))
+
+    for offset in range(-1, settings.partition_premake_days + 1):
+        day = today + timedelta(days=offset)
+        name = partition_name(table, day)
+        try:
+            async with engine.begin() as conn:
+                if await conn.scalar(
+                    text("SELECT COUNT(*) FROM pg_class WHERE relname = :name"), {"name": name}
+                ):
+                    continue
+                await conn.execute(text(f"""
+                    CREATE TABLE {name} PARTITION OF {table}
+                    FOR VALUES FROM ('{day.isoformat()} 00:00:00+00')
+                    TO ('{(day + timedelta(days=1)).isoformat()} 00:00:00+00')
+                """))
+            created.append(name)
+        except Exception as e:
+            # Fails when the DEFAULT partition already holds rows for that day
+            logger.warning(f"Partition creation failed for {name}: {e}")
+
+    if created:
+        logger.info(f"Created partitions: {', '.join(created)}")
+
+    return created
+
+
+async def drop_expired_partitions(policy: TablePolicy, today: Optional[date] = None) -> List[str]:
+    """Detach and drop daily partitions that end before the retention cutoff."""
+    if policy.retention_days <= 0:
+        return []
+
+    cutoff = (today or datetime.utcnow().date()) - timedelta(days=policy.retention_days)
+    table = policy.table
+
+    async with engine.connect() as conn:
+        result = await conn.execute(
+            text("""
+                SELECT child.relname
+                FROM pg_inherits
+                JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+                JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+                WHERE parent.relname = :table
+            """),
+            {"table": table},
+        )
+        names = [row[0] for row in result]
+
+    dropped = []
+    for name in sorted(names):
+        day = _partition_day(table, name)
+        if day is None or day + timedelta(days=1) > cutoff:
+            continue
+        async with engine.begin() as conn:
+            await conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+            await conn.execute(text(f"DROP TABLE {name}"))
+        dropped.append(name)
+
+    if dropped:
+        logger.info(f"Dropped expired partitions: {', '.join(dropped)}")
+
+    return dropped
+
+
+async def _enable_timescale() -> bool:
+    """Create the extension if the server ships it."""
+    async with engine.begin() as conn:
+        available = await conn.scalar(
+            text("SELECT COUNT(*) FROM pg_available_extensions WHERE name = 'timescaledb'")
+        )
+        if not available:
+            return False
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS timescaledb CASCADE"))
+        return True
+
+
+async def _has_rows(table: str) -> bool:
+    async with engine.connect() as conn:
+        return bool(await conn.scalar(text(f"SELECT EXISTS (SELECT 1 FROM {table})")))
+
+
+async def _apply_timescale_policy(policy: TablePolicy, migrate_data: bool = False) -> None:
+    """Hypertable conversion, compression and retention for one table."""
+    table = policy.table
+    migrate = "TRUE" if migrate_data else "FALSE"
+
+    async with engine.begin() as conn:
+        await conn.execute(text(f"""
+            SELECT create_hypertable(
+                '{table}',
+                '{policy.time_column}',
+                chunk_time_interval => INTERVAL '1 day',
+                if_not_exists => TRUE,
+                migrate_data => {migrate},
+                create_default_indexes => FALSE
+            )
+        """))
+
+    async with engine.begin() as conn:
+        await conn.execute(
+            text(f"SELECT remove_compression_policy('{table}', if_exists => TRUE)")
+        )
+    if settings.storage_compress_after_days > 0:
+        await _apply_compression(policy)
+
+    # Policies are replaced so changed settings take effect
+    async with engine.begin() as conn:
+        await conn.execute(
+            text(f"SELECT remove_retention_policy('{table}', if_exists => TRUE)")
+        )
+        if policy.retention_days > 0:
+            await conn.execute(text(f"""
+                SELECT add_retention_policy(
+                    '{table}', INTERVAL '{policy.retention_days} days'
+                )
+            """))
+
+
+async def _apply_compression(policy: TablePolicy) -> None:
+    """Native compression of chunks older than STORAGE_COMPRESS_AFTER_DAYS."""
+    table = policy.table
+
+    # Compression settings cannot change while compressed chunks exist
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(text(f"""
+                ALTER TABLE {table} SET (
+                    timescaledb.compress,
+                    timescaledb.compress_segmentby = '{policy.segment_by}',
+                    timescaledb.compress_orderby = '{policy.time_column} DESC'
+                )
+            """))
+    except Exception as e:
+        logger.warning(f"Compression settings unchanged for {table}: {e}")
+
+    async with engine.begin() as conn:
+        await conn.execute(text(f"""
+            SELECT add_compression_policy(
+                '{table}', INTERVAL '{settings.storage_compress_after_days} days'
+            )
+        """))
+
+
+async def apply_storage_policies(migrate_existing: bool = False) -> str:
+    """Apply the lifecycle to every time-series table; returns the mode used.
+
+    Without migrate_existing, tables that hold rows but are not hypertables
+    yet are left alone, since converting them rewrites and locks the table.
+    """
+    try:
+        timescale = await _enable_timescale()
+    except Exception as e:
+        logger.warning(f"TimescaleDB unavailable: {e}")
+        timescale = False
+
+    async with engine.connect() as conn:
+        partitioned = await partitioned_tables(conn)
+        converted = await hypertables(conn)
+
+    if not timescale:
+        for policy in TIME_SERIES_TABLES:
+            if policy.table in partitioned:
+                await ensure_partitions(policy)
+        mode = "native" if partitioned else "plain"
+        logger.info(f"Storage lifecycle: {mode} tables without TimescaleDB")
+        return mode
+
+    for policy in TIME_SERIES_TABLES:
+        if policy.table in partitioned:
+            logger.warning(f"{policy.table} is natively partitioned, not converting to a hypertable")
+            continue
+        try:
+            if (
+                policy.table not in converted
+                and not migrate_existing
+                and await _has_rows(policy.table)
+            ):
+                logger.warning(
+                    f"{policy.table} holds rows and is not a hypertable; "
+                    f"convert it offline with: python -m app.db.storage apply"
+                )
+                continue
+            await _apply_timescale_policy(policy, migrate_data=migrate_existing)
+            logger.info(f"Storage lifecycle applied to {policy.table}")
+        except Exception as e:
+            logger.warning(f"Storage lifecycle failed for {policy.table}: {e}")
+
+    return "timescale"
+
+
+async def delete_expired_rows(
+    policy: TablePolicy,
+    now: Optional[datetime] = None,
+    batch_size: Optional[int] = None,
+) -> int:
+    """Delete rows past retention in short batches; returns rows deleted."""
+    if policy.retention_days <= 0:
+        return 0
+
+    cutoff = (now or datetime.utcnow()) - timedelta(days=policy.retention_days)
+    batch_size = batch_size or settings.storage_delete_batch_size
+    deleted = 0
+
+    while True:
+        # One transaction per batch keeps lock time and WAL bursts bounded
+        async with engine.begin() as conn:
+            result = await conn.execute(
+                text(f"""
+                    DELETE FROM {policy.table}
+                    WHERE ctid IN (
+                        SELECT ctid FROM {policy.table}
+                        WHERE {policy.time_column} < :cutoff
+                        LIMIT :batch_size
+                    )
+                """),
+                {"cutoff": cutoff, "batch_size": batch_size},
+            )
+        deleted += result.rowcount
+        if result.rowcount < batch_size:
+            break
+
+    if deleted:
+        logger.info(f"Retention deleted {deleted} rows from {policy.table}")
+
+    return deleted
+
+
+async def run_retention(now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Apply retention to tables Timescale does not manage; one runner at a time.
+
+    Returns rows deleted per heap table and partitions dropped per
+    partitioned table.
+    """
+    async with engine.connect() as conn:
+        managed = await hypertables(conn)
+        partitioned = await partitioned_tables(conn)
+        pending = [p for p in TIME_SERIES_TABLES if p.table not in managed]
+        if not pending:
+            return {}
+
+        locked = await conn.scalar(
+            text("SELECT pg_try_advisory_lock(:lock_id)"), {"lock_id": STORAGE_MAINTENANCE_LOCK_ID}
+        )
+        if not locked:
+            return {}
+        try:
+            today = (now or datetime.utcnow()).date()
+            removed: Dict[str, Any] = {}
+            for policy in pending:
+                if policy.table in partitioned:
+                    # Keep partitions ahead of the clock, then drop whole days
+                    await ensure_partitions(policy, today)
+                    removed[policy.table] = await drop_expired_partitions(policy, today)
+                else:
+                    removed[policy.table] = await delete_expired_rows(policy, now)
+            return removed
+        finally:
+            await conn.execute(
+                text("SELECT pg_advisory_unlock(:lock_id)"), {"lock_id": STORAGE_MAINTENANCE_LOCK_ID}
+            )
+
+
+async def table_sizes() -> Dict[str, Dict[str, int]]:
+    """Size and row estimate per table; also updates the Prometheus gauges."""
+    sizes = {}
+
+    async with engine.connect() as conn:
+        managed = await hypertables(conn)
+
+        for policy in TIME_SERIES_TABLES:
+            table = policy.table
+            if table in managed:
+                size = await conn.scalar(text(f"SELECT hypertable_size('{table}')"))
+                rows = await conn.scalar(text(f"SELECT approximate_row_count('{table}')"))
+            else:
+                # Sums over partitions; a plain table is its own single-node tree
+                size = await conn.scalar(
+                    text("""
+                        SELECT COALESCE(SUM(pg_total_relation_size(relid)), 0)
+                        FROM pg_partition_tree(CAST(:table AS regclass))
+                    """),
+                    {"table": table},
+                )
+                rows = await conn.scalar(
+                    text("""
+                        SELECT COALESCE(SUM(GREATEST(pg_class.reltuples, 0)), 0)
+                        FROM pg_partition_tree(CAST(:table AS regclass)) AS tree
+                        JOIN pg_class ON pg_class.oid = tree.relid
+                    """),
+                    {"table": table},
+                )
+
+            size, rows = int(size or 0), max(int(rows or 0), 0)
+            TABLE_SIZE_BYTES.labels(table=table).set(size)
+            TABLE_ROWS_ESTIMATE.labels(table=table).set(rows)
+            sizes[table] = {"size_bytes": size, "rows_estimate": rows}
+
+    return sizes
+
+
+async def run_storage_maintenance() -> None:
+    """Periodic partition upkeep and retention (non-Timescale) and size metrics until cancelled."""
+    while True:
+        try:
+            await run_retention()
+            await table_sizes()
+        except Exception as e:
+            logger.error(f"Storage maintenance failed: {e}")
+        await asyncio.sleep(settings.storage_maintenance_interval)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="NYC Subway Monitor storage lifecycle")
+    parser.add_argument("command", choices=["apply", "retention", "sizes"])
+    args = parser.parse_args(argv)
+
+    commands = {
+        "apply": lambda: apply_storage_policies(migrate_existing=True),
+        "retention": run_retention,
+        "sizes": table_sizes,
+    }
+
+    async def run() -> object:
+        try:
+            return await commands[args.command]()
+        finally:
+            await engine.dispose()
+
+    try:
+        result = asyncio.run(run())
+    except Exception as e:
+        logger.error(f"Storage command {args.command} failed: {e}")
+        return 1
+
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
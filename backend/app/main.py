@@ -15,63 +15,123 @@ from prometheus_client import make_asgi_app
 
 from app.config import get_settings
 from app.core.exceptions import SubwayMonitorException
-from app.db.database import init_db
-from app.ml.train import ModelTrainer
+from app.core.runtime import configure_runtime
+from app.db.database import AsyncSessionLocal, dispose_engines, init_db
+from app.db.rollups import ensure_rollups, run_rollup_refresher
+from app.db.storage import apply_storage_policies, run_storage_maintenance
+from app.ml.models import MODEL_TYPES
 from app.ml.predict import AnomalyDetector
+from app.ml.scheduler import TrainingScheduler
+from app.ml.vocab import refresh_station_index
 from app.routers import anomaly, feed, health, websocket
 
 logger = structlog.get_logger()
 settings = get_settings()
 
 
+async def prepare(app: FastAPI) -> None:
+    """Idempotent startup steps: schema, storage, rollups, vocabulary and models."""
+    await init_db()
+    
+    # Hypertables must exist before rollups can be continuous aggregates
+    if settings.storage_lifecycle_enabled:
+        await apply_storage_policies()
+    
+    # Pre-aggregated buckets for trend and line health endpoints
+    await ensure_rollups()
+    
+    # Identifier codes shared by features and models
+    async with AsyncSessionLocal() as db:
+        await refresh_station_index(db)
+    
+    # Load active model artifacts; training never runs in this process.
+    # Untrained model types are simply not registered with the detector.
+    await app.state.scheduler.reload_models()
+
+
+async def warm_up(app: FastAPI) -> None:
+    """Initialize the database and models without blocking request serving.
+    
+    Failed attempts are retried with capped exponential backoff. After
+    warmup_max_attempts failures the pod is marked failed and /health/live
+    returns 503, so the orchestrator restarts it instead of leaving it
+    unready forever.
+    """
+    for attempt in range(1, settings.warmup_max_attempts + 1):
+        try:
+            await prepare(app)
+            break
+        except Exception as e:
+            app.state.startup_error = str(e)
+            logger.error(f"Application warm-up attempt {attempt} failed: {e}")
+            if attempt == settings.warmup_max_attempts:
+                app.state.warmup_failed = True
+                logger.error("Application warm-up gave up; failing liveness")
+                return
+            await asyncio.sleep(min(2 ** attempt, settings.warmup_max_backoff))
+    
+    app.state.startup_error = None
+    
+    # Start background tasks
+    app.state.feed_task = asyncio.create_task(feed.start_feed_ingestion())
+    app.state.rollup_task = asyncio.create_task(run_rollup_refresher())
+    if settings.storage_lifecycle_enabled:
+        app.state.storage_task = asyncio.create_task(run_storage_maintenance())
+    
+    detector: AnomalyDetector = app.state.detector
+    scheduler: TrainingScheduler = app.state.scheduler
+    
+    missing = [
+        model_type for model_type in MODEL_TYPES
+        if model_type not in scheduler.loaded_versions
+    ]
+    
+    detector.mark_ready()
+    
+    scheduler.start()
+    if missing and settings.training_mode == "subprocess":
+        scheduler.request_training(missing)
+    
+    logger.info("Application warm-up complete")
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
-    """Application lifecycle manager with proper initialization."""
+    """Application lifecycle manager; serves traffic before models are warm."""
     logger.info("Starting NYC Subway Monitor", version=settings.app_version)
     
-    try:
-        # Initialize database with retries
-        for attempt in range(3):
-            try:
-                await init_db()
-                break
-            except Exception as e:
-                logger.error(f"Database init attempt {attempt + 1} failed: {e}")
-                if attempt == 2:
-                    raise
-                await asyncio.sleep(2)
-        
-        # Initialize ML components
-        trainer = ModelTrainer()
-        await trainer.load_or_train_models()
-        app.state.trainer = trainer
-        
-        # Initialize anomaly detector
-        detector = AnomalyDetector()
-        for model_type, model in trainer.active_models.items():
-            detector.register_model(model_type, model)
-        app.state.detector = detector
-        
-        # Start background tasks
-        app.state.feed_task = asyncio.create_task(feed.start_feed_ingestion())
-        
-        logger.info("Application startup complete")
-        
-    except Exception as e:
-        logger.error("Failed to start application", error=str(e))
-        if not settings.debug:
-            raise
+    # Bound torch/BLAS/joblib thread pools before any model work starts
+    configure_runtime()
+    
+    # ML stacks are imported lazily when the first model artifact is loaded
+    detector = AnomalyDetector()
+    app.state.detector = detector
+    app.state.scheduler = TrainingScheduler(detector)
+    app.state.startup_error = None
+    app.state.warmup_failed = False
+    
+    # Database and model initialization continue in the background;
+    # /health/ready reports when they are done
+    app.state.warmup_task = asyncio.create_task(warm_up(app))
+    
+    logger.info("Application startup complete")
     
     yield
     
     # Shutdown
     logger.info("Shutting down NYC Subway Monitor")
-    if hasattr(app.state, 'feed_task'):
-        app.state.feed_task.cancel()
+    for task_name in ('warmup_task', 'feed_task', 'rollup_task', 'storage_task'):
+        task = getattr(app.state, task_name, None)
+        if task is None:
+            continue
+        task.cancel()
         try:
-            await app.state.feed_task
+            await task
         except asyncio.CancelledError:
             pass
+    await app.state.scheduler.stop()
+    feed.shutdown_parse_pool()
+    await dispose_engines()
 
 
 app = FastAPI(
@@ -0,0 +1,219 @@
+"""
+Parquet feature store for historical training data.
+
+Engineered features (temporal plus rolling statistics) are materialized once
+per complete hour into hive-partitioned files:
+
+    <root>/date=YYYY-MM-DD/part-HH.parquet
+
+Each materialization only computes hours that are not in the store yet,
+reading every row (no down-sampling) plus the preceding ROLLING_CONTEXT from
+train_positions so rolling windows at the start of a run are complete.
+Hours without any positions get an empty part-HH.empty marker so they are
+not queried again, but only once they are EMPTY_MARKER_GRACE old, so late
+rows still land in their hour. Reads project columns and push the date and
+timestamp range down to the Parquet scan. pyarrow is imported lazily.
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional, Sequence, Set, Tuple
+
+import pandas as pd
+import structlog
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.ml.features import FeatureExtractor
+from app.ml.training.reader import TRAINING_COLUMNS, TrainingDataReader
+from app.ml.training.snapshot import prepare_training_frame
+from app.ml.vocab import get_station_index
+
+logger = structlog.get_logger()
+settings = get_settings()
+
+# Longest rolling window computed by FeatureExtractor.compute_rolling_features
+ROLLING_CONTEXT = timedelta(hours=24)
+
+# Empty hours younger than this (before the end of the run) stay unmarked
+EMPTY_MARKER_GRACE = timedelta(hours=6)
+
+# Upper bound on hours computed per database read
+MAX_HOURS_PER_READ = 24
+
+
+def _utc(ts: datetime) -> pd.Timestamp:
+    """Timezone-aware UTC timestamp; naive values are taken as UTC."""
+    ts = pd.Timestamp(ts)
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
+
+
+def floor_hour(ts: datetime) -> datetime:
+    """Naive UTC datetime truncated to the hour."""
+    return _utc(ts).floor("h").tz_localize(None).to_pydatetime()
+
+
+def _contiguous_runs(hours: Sequence[datetime]) -> List[Tuple[datetime, datetime]]:
+    """Group sorted hour starts into [start, end) runs of at most MAX_HOURS_PER_READ."""
+    runs: List[Tuple[datetime, datetime]] = []
+    step = timedelta(hours=1)
+
+    for hour in hours:
+        if (
+            runs
+            and runs[-1][1] == hour
+            and runs[-1][1] - runs[-1][0] < step * MAX_HOURS_PER_READ
+        ):
+            runs[-1] = (runs[-1][0], hour + step)
+        else:
+            runs.append((hour, hour + step))
+
+    return runs
+
+
+class FeatureStore:
+    """Hourly Parquet partitions of engineered training features."""
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = Path(root or settings.feature_store_dir)
+        self.feature_extractor = FeatureExtractor()
+
+    def _partition_path(self, hour: datetime) -> Path:
+        return self.root / f"date={hour:%Y-%m-%d}" / f"part-{hour:%H}.parquet"
+
+    def materialized_hours(self) -> Set[datetime]:
+        """Hour starts that already have a partition file or an empty marker."""
+        hours = set()
+        for pattern in ("date=*/part-*.parquet", "date=*/part-*.empty"):
+            for path in self.root.glob(pattern):
+                day = path.parent.name.split("=", 1)[1]
+                hours.add(datetime.strptime(f"{day} {path.stem[5:]}", "%Y-%m-%d %H"))
+        return hours
+
+    def build_features(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Rolling statistics on the raw values, then the model input features."""
+        features = self.feature_extractor.compute_rolling_features(df)
+        return prepare_training_frame(features)
+
+    async def materialize(
+        self,
+        db: AsyncSession,
+        start_time: datetime,
+        end_time: datetime,
+    ) -> int:
+        """Write partitions for complete hours in the range that are missing; returns rows written."""
+        first_hour = floor_hour(start_time)
+        last_hour = floor_hour(end_time)  # exclusive, the current hour is incomplete
+
+        done = self.materialized_hours()
+        missing = []
+        hour = first_hour
+        while hour < last_hour:
+            if hour not in done:
+                missing.append(hour)
+            hour += timedelta(hours=1)
+
+        mark_before = last_hour - EMPTY_MARKER_GRACE
+
+        written = 0
+        for run_start, run_end in _contiguous_runs(missing):
+            # Every row is kept: a partition is the hour's data for good
+            raw = await TrainingDataReader(
+                db, run_start - ROLLING_CONTEXT, run_end, max_rows=sys.maxsize
+            ).read_frame()
+
+            features = None
+            if not raw.empty:
+                features = self.build_features(raw)
+                features = features[features["timestamp"] >= _utc(run_start)]
+
+            hours = [hour for hour in missing if run_start <= hour < run_end]
+            written += self._write_hours(features, hours, mark_before)
+
+        if written:
+            logger.info(f"Materialized {written} feature rows", hours=len(missing))
+
+        return written
+
+    def _write_hours(
+        self,
+        features: Optional[pd.DataFrame],
+        hours: Sequence[datetime],
+        mark_before: datetime,
+    ) -> int:
+        """Write one partition file per hour; empty hours before mark_before get a marker."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        parts = {}
+        if features is not None:
+            # Plain strings keep partition schemas identical; reads re-encode categories
+            categorical = features.select_dtypes(include="category").columns
+            features = features.astype({col: object for col in categorical})
+            parts = {
+                hour.tz_localize(None).to_pydatetime(): part
+                for hour, part in features.groupby(features["timestamp"].dt.floor("h"))
+            }
+
+        written = 0
+        for hour in hours:
+            path = self._partition_path(hour)
+            part = parts.get(hour)
+            if part is None:
+                if hour < mark_before:
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    path.with_suffix(".empty").touch()
+                continue
+
+            path.parent.mkdir(parents=True, exist_ok=True)
+
+            # Write then rename so readers never see a partial file
+            tmp_path = path.with_suffix(".tmp")
+            pq.write_table(pa.Table.from_pandas(part, preserve_index=False), tmp_path)
+            os.replace(tmp_path, path)
+            written += len(part)
+
+        return written
+
+    def read(
+        self,
+        start_time: datetime,
+        end_time: datetime,
+        columns: Optional[Sequence[str]] = None,
+    ) -> pd.DataFrame:
+        """Read projected columns for [start_time, end_time) with predicate pushdown."""
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        start, end = _utc(start_time), _utc(end_time)
+
+        # Partition pruning: only files under the requested dates are opened
+        first_day, last_day = f"date={start:%Y-%m-%d}", f"date={end:%Y-%m-%d}"
+        paths = sorted(
+            str(path) for path in self.root.glob("date=*/part-*.parquet")
+            if first_day <= path.parent.name <= last_day
+        )
+        if not paths:
+            return pd.DataFrame(columns=list(columns or TRAINING_COLUMNS))
+
+        dataset = ds.dataset(
+            paths,
+            format="parquet",
+            partitioning=ds.partitioning(pa.schema([("date", pa.string())]), flavor="hive"),
+            partition_base_dir=str(self.root),
+        )
+
+        # Row-group statistics on timestamp skip data outside the range
+        timestamp_type = dataset.schema.field("timestamp").type
+        predicate = (
+            (ds.field("timestamp") >= pa.scalar(start.to_pydatetime(), type=timestamp_type))
+            & (ds.field("timestamp") < pa.scalar(end.to_pydatetime(), type=timestamp_type))
+        )
+
+        table = dataset.to_table(
+            columns=list(columns) if columns is not None else None,
+            filter=predicate,
+        )
+        return get_station_index().encode_frame(table.to_pandas(strings_to_categorical=True))
@@ -1,20 +1,25 @@
 """
 Feature extraction for subway time-series data.
 Updated with new Pandas frequency aliases (2.2.0+).
+
+Feed ingestion only needs the per-trip extraction, so numpy/pandas/scipy
+are imported inside the batch feature methods.
 """
 
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence
 import re
 
-import numpy as np
-import pandas as pd
-from scipy import stats
-
 from app.config import get_settings
+from app.ml.vocab import StationIndex, get_station_index
 
 settings = get_settings()
 
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+    from scipy import sparse
+
 
 class FeatureExtractor:
     """Extract ML features from raw GTFS-RT data."""
@@ -147,8 +152,9 @@ class FeatureExtractor:
             if t["timestamp"] > cutoff
         ]
     
-    def compute_rolling_features(self, positions_df: pd.DataFrame) -> pd.DataFrame:
+    def compute_rolling_features(self, positions_df: "pd.DataFrame") -> "pd.DataFrame":
         """Compute rolling statistical features with updated Pandas frequencies."""
+        import pandas as pd
         
         df = positions_df.copy()
         
@@ -157,7 +163,7 @@ class FeatureExtractor:
             df = df.set_index('timestamp').sort_index()
         
         # Group by station and direction
-        grouped = df.groupby(["current_station", "direction"])
+        grouped = df.groupby(["current_station", "direction"], observed=True)
         
         # Calculate rolling statistics with updated frequencies
         for col in ["headway_seconds", "dwell_time_seconds", "delay_seconds"]:
@@ -223,11 +229,42 @@ class FeatureExtractor:
         
         return is_weekday and (morning_rush or evening_rush)
     
-    def create_station_features(self, station_id: str, num_stations: int = 472) -> np.ndarray:
-        """Create one-hot encoded station features."""
-        station_idx = hash(station_id) % num_stations
+    def create_station_features(
+        self, station_id: str, station_index: Optional[StationIndex] = None
+    ) -> "np.ndarray":
+        """One-hot station vector from the shared StationIndex (all zeros if unknown)."""
+        import numpy as np
+        
+        stations = (station_index or get_station_index()).stations
+        
+        features = np.zeros(len(stations), dtype=np.float32)
+        code = stations.code(station_id)
+        if code >= 0:
+            features[code] = 1
+        
+        return features
+    
+    def create_station_matrix(
+        self,
+        station_ids: Sequence[str],
+        station_index: Optional[StationIndex] = None,
+        n_columns: Optional[int] = None,
+    ) -> "sparse.csr_matrix":
+        """Sparse one-hot station matrix, one row per identifier.
         
-        features = np.zeros(num_stations)
-        features[station_idx] = 1
+        Columns are the append-only StationIndex codes. Pass the
+        station_vocab_size recorded with a model as n_columns to keep its
+        width; stations coded after it, like unknown ones, get an empty row.
+        """
+        import numpy as np
+        from scipy import sparse
         
-        return features
\ No newline at end of file
+        stations = (station_index or get_station_index()).stations
+        width = len(stations) if n_columns is None else n_columns
+        codes = stations.encode(station_ids)
+        
+        rows = np.flatnonzero((codes >= 0) & (codes < width))
+        return sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, codes[rows])),
+            shape=(len(codes), width),
+        )
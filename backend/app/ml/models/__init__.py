@@ -1 +1,3 @@
-"""ML model implementations."""
\ No newline at end of file
+"""ML model implementations."""
+
+MODEL_TYPES = ("isolation_forest", "lstm_autoencoder")
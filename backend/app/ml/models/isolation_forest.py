@@ -16,6 +16,7 @@ from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import StandardScaler
 
 from app.config import get_settings
+from app.core.runtime import get_joblib_workers
 
 settings = get_settings()
 
@@ -23,8 +24,9 @@ settings = get_settings()
 class IsolationForestDetector:
     """Isolation Forest for subway anomaly detection."""
     
-    def __init__(self, contamination: float = None):
+    def __init__(self, contamination: float = None, model_params: Optional[Dict] = None):
         self.contamination = contamination or settings.anomaly_contamination
+        self.model_params = model_params or {}  # Extra IsolationForest arguments
         self.model = None
         self.scaler = StandardScaler()
         self.feature_columns = []
@@ -62,16 +64,24 @@ class IsolationForestDetector:
         # Prepare features
         X = self.prepare_features(train_data)
         
+        return self.train_matrix(X)
+    
+    def train_matrix(self, X: np.ndarray) -> Dict[str, float]:
+        """Train on a raw feature matrix whose columns follow feature_columns."""
+        
         # Fit scaler
         X_scaled = self.scaler.fit_transform(X)
         
         # Train model
         self.model = IsolationForest(
-            contamination=self.contamination,
-            random_state=42,
-            n_estimators=100,
-            max_samples="auto",
-            n_jobs=-1,
+            **{
+                "random_state": 42,
+                "n_estimators": 100,
+                "max_samples": "auto",
+                "n_jobs": get_joblib_workers(),
+                **self.model_params,
+                "contamination": self.contamination,
+            }
         )
         
         self.model.fit(X_scaled)
@@ -93,51 +103,124 @@ class IsolationForestDetector:
         
         return metrics
     
-    def predict(self, data: pd.DataFrame) -> List[Dict]:
-        """Detect anomalies in new data."""
+    def warm_start(self, new_data: pd.DataFrame, replace_fraction: float = 0.25) -> Dict[str, float]:
+        """Replace the oldest fraction of trees with trees grown on new data.
         
+        Trees are kept oldest-first, so repeated warm starts cycle the whole
+        forest onto recent data. The scaler stays frozen; the decision offset
+        is recomputed on the new data.
+        """
         if self.model is None:
             raise ValueError("Model not trained")
         
-        # Prepare features
-        X = self.prepare_features(data)
+        feature_columns = self.feature_columns
+        X = self.prepare_features(new_data)
+        if self.feature_columns != feature_columns:
+            self.feature_columns = feature_columns
+            raise ValueError("New data has different feature columns")
+        
+        forest = self.model
+        
+        # Path lengths are normalized by max_samples; new trees must match it
+        if len(X) < forest.max_samples_:
+            raise ValueError(
+                f"Not enough new data for warm start: {len(X)} < {forest.max_samples_}"
+            )
+        
         X_scaled = self.scaler.transform(X)
+        n_trees = len(forest.estimators_)
+        n_replace = max(1, round(n_trees * replace_fraction))
+        
+        # Drop the oldest trees from the public per-tree lists, then let
+        # sklearn's warm start grow replacements and rebuild its own state
+        del forest.estimators_[:n_replace]
+        del forest.estimators_features_[:n_replace]
+        forest.set_params(
+            warm_start=True,
+            n_estimators=n_trees,
+            max_samples=forest.max_samples_,
+            contamination=self.contamination,
+            n_jobs=get_joblib_workers(),
+        )
+        try:
+            forest.fit(X_scaled)
+        finally:
+            forest.set_params(warm_start=False)
         
-        # Get predictions and scores
-        predictions = self.model.predict(X_scaled)
+        anomaly_scores = forest.score_samples(X_scaled)
+        predictions = forest.predict(X_scaled)
+        
+        metrics = {
+            "train_samples": len(X),
+            "trees_replaced": n_replace,
+            "anomaly_rate": (predictions == -1).mean(),
+            "score_mean": float(anomaly_scores.mean()),
+            "score_std": float(anomaly_scores.std()),
+            "score_threshold": float(forest.offset_),
+        }
+        
+        self.version = f"if_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
+        
+        return metrics
+    
+    def score_samples(self, data: pd.DataFrame) -> np.ndarray:
+        """Per-row anomaly severity in [0, 1], aligned with the rows of ``data``."""
+        return self.score_and_label(data)[0]
+    
+    def predict_labels(self, data: pd.DataFrame) -> np.ndarray:
+        """Per-row anomaly labels (1 = anomaly), aligned with the rows of ``data``."""
+        return self.score_and_label(data)[1]
+    
+    def score_and_label(self, data: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        """Dense severities and labels from a single pass over the forest."""
+        if self.model is None:
+            raise ValueError("Model not trained")
+        
+        return self.score_matrix(self.prepare_features(data))
+    
+    def score_matrix(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Dense severities and labels for a raw feature matrix."""
+        X_scaled = self.scaler.transform(X)
+        
+        # Raw scores are <= 0, lower is more abnormal
         scores = self.model.score_samples(X_scaled)
+        labels = (scores < self.model.offset_).astype(np.int8)
         
-        # Normalize scores to 0-1 range
-        min_score = self.model.score_samples(X_scaled).min()
-        max_score = 0  # Maximum possible score
-        normalized_scores = (scores - min_score) / (max_score - min_score)
+        # Normalize against the most abnormal row of the batch (max score is 0)
+        min_score = scores.min()
+        severity = scores / min_score if min_score < 0 else np.zeros_like(scores)
+        
+        return severity, labels
+    
+    def predict(self, data: pd.DataFrame) -> List[Dict]:
+        """Detect anomalies in new data."""
+        severity, labels = self.score_and_label(data)
         
         # Collect anomalies
         anomalies = []
         
-        for idx, (pred, score) in enumerate(zip(predictions, normalized_scores)):
-            if pred == -1:  # Anomaly
-                row = data.iloc[idx]
-                
-                anomaly = {
-                    "station_id": row.get("current_station"),
-                    "line": row.get("line"),
-                    "anomaly_type": self._determine_anomaly_type(row),
-                    "severity": float(1 - score),  # Higher score = more anomalous
-                    "model_name": "isolation_forest",
-                    "model_version": self.version,
-                    "features": {
-                        col: float(row[col]) for col in self.feature_columns
-                        if not pd.isna(row[col])
-                    },
-                    "meta_data": {
-                        "trip_id": row.get("trip_id"),
-                        "route_id": row.get("route_id"),
-                        "timestamp": row.get("timestamp").isoformat() if pd.notna(row.get("timestamp")) else None,
-                    }
+        for idx in np.flatnonzero(labels):
+            row = data.iloc[idx]
+            
+            anomaly = {
+                "station_id": row.get("current_station"),
+                "line": row.get("line"),
+                "anomaly_type": self._determine_anomaly_type(row),
+                "severity": float(severity[idx]),  # Higher = more anomalous
+                "model_name": "isolation_forest",
+                "model_version": self.version,
+                "features": {
+                    col: float(row[col]) for col in self.feature_columns
+                    if not pd.isna(row[col])
+                },
+                "meta_data": {
+                    "trip_id": row.get("trip_id"),
+                    "route_id": row.get("route_id"),
+                    "timestamp": row.get("timestamp").isoformat() if pd.notna(row.get("timestamp")) else None,
                 }
-                
-                anomalies.append(anomaly)
+            }
+            
+            anomalies.append(anomaly)
         
         return anomalies
     
@@ -11,14 +11,20 @@ from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
+import structlog
 import torch
 import torch.nn as nn
 from torch.utils.data import DataLoader, Dataset
 
 from app.config import get_settings
+from app.core.runtime import configure_torch
 
+logger = structlog.get_logger()
 settings = get_settings()
 
+# Keep torch from claiming one thread per core inside the API process
+configure_torch(torch)
+
 
 class SubwaySequenceDataset(Dataset):
     """PyTorch dataset for subway time-series sequences."""
@@ -93,76 +99,240 @@ class LSTMAutoencoder(nn.Module):
 class LSTMDetector:
     """LSTM Autoencoder anomaly detector."""
     
+    FEATURE_COLUMNS = [
+        "headway_seconds",
+        "dwell_time_seconds",
+        "delay_seconds",
+        "hour",
+        "is_rush_hour",
+    ]
+    
     def __init__(
         self,
         sequence_length: int = None,
         hidden_size: int = None,
         threshold_percentile: float = 95,
+        num_layers: int = 2,
+        learning_rate: float = 0.001,
+        batch_size: int = 32,
     ):
         self.sequence_length = sequence_length or settings.lstm_sequence_length
         self.hidden_size = hidden_size or settings.lstm_hidden_size
         self.threshold_percentile = threshold_percentile
+        self.num_layers = num_layers
+        self.learning_rate = learning_rate
+        self.batch_size = batch_size
         
         self.model = None
+        self._optimizer = None
+        self.epochs_trained = 0
         self.feature_columns = []
         self.scaler_params = {}
+        self._scale: Optional[np.ndarray] = None
+        self._shift: Optional[np.ndarray] = None
         self.threshold = None
         self.version = None
         
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
         
-    def prepare_sequences(self, df: pd.DataFrame) -> Tuple[np.ndarray, pd.DataFrame]:
-        """Prepare sequential features for LSTM."""
-        
-        # Select features
-        feature_cols = [
-            "headway_seconds",
-            "dwell_time_seconds",
-            "delay_seconds",
-            "hour",
-            "is_rush_hour",
-        ]
-        
-        self.feature_columns = [col for col in feature_cols if col in df.columns]
-        
-        # Fill missing values
-        df_filled = df[self.feature_columns].fillna(0)
-        
-        # Normalize features
-        normalized_data = []
-        for col in self.feature_columns:
-            values = df_filled[col].values
-            mean = values.mean()
-            std = values.std() + 1e-7  # Avoid division by zero
-            
-            self.scaler_params[col] = {"mean": mean, "std": std}
-            normalized = (values - mean) / std
-            normalized_data.append(normalized)
-        
-        # Stack features
-        X = np.stack(normalized_data, axis=1)
+    def fit_scaler(self, df: pd.DataFrame) -> None:
+        """Fit normalization parameters on training data and freeze them."""
+        self.feature_columns = [col for col in self.FEATURE_COLUMNS if col in df.columns]
+        self._fit_scaler_matrix(self._feature_matrix(df))
+    
+    def _fit_scaler_matrix(self, values: np.ndarray) -> None:
+        """Fit normalization parameters on a raw feature matrix."""
+        mean = values.mean(axis=0)
+        std = values.std(axis=0) + 1e-7  # Avoid division by zero
+        
+        self.scaler_params = {
+            col: {"mean": float(mean[i]), "std": float(std[i])}
+            for i, col in enumerate(self.feature_columns)
+        }
+        self._set_affine_params()
+    
+    def transform(self, df: pd.DataFrame) -> np.ndarray:
+        """Normalize features with the frozen training parameters."""
+        if self._scale is None:
+            raise ValueError("Scaler not fitted")
         
-        return X.T, df  # Return transposed for (samples, features)
+        # Single affine pass: (x - mean) / std == x * scale + shift
+        return self._feature_matrix(df) * self._scale + self._shift
+    
+    def _feature_matrix(self, df: pd.DataFrame) -> np.ndarray:
+        """Extract the model's feature columns as a float32 matrix."""
+        # Columns missing at inference time are treated like missing values (0)
+        return (
+            df.reindex(columns=self.feature_columns, fill_value=0)
+            .fillna(0)
+            .to_numpy(dtype=np.float32)
+        )
+    
+    def _set_affine_params(self) -> None:
+        """Precompute vectorized scale/shift arrays from scaler_params."""
+        mean = np.array(
+            [self.scaler_params[col]["mean"] for col in self.feature_columns],
+            dtype=np.float32,
+        )
+        std = np.array(
+            [self.scaler_params[col]["std"] for col in self.feature_columns],
+            dtype=np.float32,
+        )
+        self._scale = 1.0 / std
+        self._shift = -mean * self._scale
+    
+    def prepare_sequences(
+        self, df: pd.DataFrame, fit: bool = False
+    ) -> Tuple[np.ndarray, pd.DataFrame]:
+        """Prepare sequential features for LSTM.
+        
+        Normalization parameters are only (re)computed when ``fit`` is True;
+        inference always reuses the parameters frozen at training time.
+        """
+        if fit:
+            self.fit_scaler(df)
+        
+        return self.transform(df), df  # (samples, features)
+    
+    def prepare_features(self, df: pd.DataFrame) -> np.ndarray:
+        """Select the model's feature columns as a raw (unnormalized) matrix."""
+        self.feature_columns = [col for col in self.FEATURE_COLUMNS if col in df.columns]
+        return self._feature_matrix(df)
     
     def train(self, train_data: pd.DataFrame, epochs: int = 50) -> Dict[str, float]:
         """Train LSTM autoencoder."""
+        return self.train_matrix(self.prepare_features(train_data), epochs)
+    
+    def train_matrix(self, values: np.ndarray, epochs: int = 50) -> Dict[str, float]:
+        """Train on a raw feature matrix whose columns follow feature_columns."""
         
         # Prepare data
-        X, _ = self.prepare_sequences(train_data)
+        self._fit_scaler_matrix(values)
+        X = values * self._scale + self._shift
         
         # Create dataset and loader
         dataset = SubwaySequenceDataset(X, self.sequence_length)
-        dataloader = DataLoader(dataset, batch_size=32, shuffle=True)
+        dataloader = DataLoader(dataset, batch_size=self.batch_size, shuffle=True)
         
         # Initialize model
         input_dim = len(self.feature_columns)
-        self.model = LSTMAutoencoder(input_dim, self.hidden_size).to(self.device)
+        self.model = LSTMAutoencoder(input_dim, self.hidden_size, self.num_layers).to(self.device)
+        self._optimizer = torch.optim.Adam(self.model.parameters(), lr=self.learning_rate)
+        self.epochs_trained = 0
+        
+        train_losses = self._fit_epochs(dataloader, epochs, self._optimizer)
         
-        # Training setup
+        # Calculate threshold on training data
+        self.threshold = self._compute_threshold(dataloader)
+        
+        # Set version
+        self.version = f"lstm_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
+        
+        metrics = {
+            "train_samples": len(X),
+            "sequence_length": self.sequence_length,
+            "final_loss": float(train_losses[-1]),
+            "threshold": float(self.threshold),
+            "input_dim": input_dim,
+        }
+        
+        return metrics
+    
+    def resume_training(self, train_data: pd.DataFrame, epochs: int) -> Dict[str, float]:
+        """Train for more epochs, keeping weights, scaler and optimizer state."""
+        if self.model is None:
+            raise ValueError("Model not trained")
+        
+        X = self.transform(train_data)
+        dataset = SubwaySequenceDataset(X, self.sequence_length)
+        dataloader = DataLoader(dataset, batch_size=self.batch_size, shuffle=True)
+        
+        if self._optimizer is None:
+            self._optimizer = torch.optim.Adam(self.model.parameters(), lr=self.learning_rate)
+        
+        train_losses = self._fit_epochs(dataloader, epochs, self._optimizer)
+        self.threshold = self._compute_threshold(dataloader)
+        
+        return {
+            "train_samples": len(X),
+            "sequence_length": self.sequence_length,
+            "epochs_trained": self.epochs_trained,
+            "final_loss": float(train_losses[-1]),
+            "threshold": float(self.threshold),
+            "input_dim": len(self.feature_columns),
+        }
+    
+    def reconstruction_loss(self, data: pd.DataFrame) -> float:
+        """Mean reconstruction error over all sequences of held-out data."""
+        if self.model is None:
+            raise ValueError("Model not trained")
+        
+        X = self.transform(data)
+        if len(X) < self.sequence_length:
+            return float("inf")
+        
+        dataset = SubwaySequenceDataset(X, self.sequence_length)
+        dataloader = DataLoader(dataset, batch_size=self.batch_size, shuffle=False)
+        
+        self.model.eval()
+        total, count = 0.0, 0
+        
+        with torch.no_grad():
+            for batch in dataloader:
+                batch = batch.to(self.device)
+                errors = torch.mean((batch - self.model(batch)) ** 2, dim=(1, 2))
+                total += float(errors.sum())
+                count += len(errors)
+        
+        return total / count
+    
+    def fine_tune(
+        self,
+        new_data: pd.DataFrame,
+        epochs: int = 5,
+        lr: float = 0.0001,
+    ) -> Dict[str, float]:
+        """Continue training from the current weights on new data only.
+        
+        Normalization stays frozen so the weights keep seeing inputs on the
+        scale they were trained on; the threshold is recomputed on new data.
+        """
+        if self.model is None:
+            raise ValueError("Model not trained")
+        
+        X = self.transform(new_data)
+        if len(X) < self.sequence_length:
+            raise ValueError(
+                f"Not enough new data for fine-tuning: {len(X)} < {self.sequence_length}"
+            )
+        
+        dataset = SubwaySequenceDataset(X, self.sequence_length)
+        dataloader = DataLoader(dataset, batch_size=self.batch_size, shuffle=True)
+        
+        optimizer = torch.optim.Adam(self.model.parameters(), lr=lr)
+        train_losses = self._fit_epochs(dataloader, epochs, optimizer)
+        self.threshold = self._compute_threshold(dataloader)
+        
+        self.version = f"lstm_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
+        
+        return {
+            "train_samples": len(X),
+            "sequence_length": self.sequence_length,
+            "fine_tune_epochs": epochs,
+            "final_loss": float(train_losses[-1]),
+            "threshold": float(self.threshold),
+            "input_dim": len(self.feature_columns),
+        }
+    
+    def _fit_epochs(
+        self,
+        dataloader: DataLoader,
+        epochs: int,
+        optimizer: torch.optim.Optimizer,
+    ) -> List[float]:
+        """Run the reconstruction training loop; returns mean loss per epoch."""
         criterion = nn.MSELoss()
-        optimizer = torch.optim.Adam(self.model.parameters(), lr=0.001)
         
-        # Training loop
         train_losses = []
         self.model.train()
         
@@ -185,11 +355,15 @@ class LSTMDetector:
             
             avg_loss = np.mean(epoch_losses)
             train_losses.append(avg_loss)
+            self.epochs_trained += 1
             
             if epoch % 10 == 0:
-                print(f"Epoch {epoch}/{epochs}, Loss: {avg_loss:.4f}")
+                logger.debug(f"Epoch {epoch}/{epochs}, Loss: {avg_loss:.4f}")
         
-        # Calculate threshold on training data
+        return train_losses
+    
+    def _compute_threshold(self, dataloader: DataLoader) -> float:
+        """Reconstruction error at threshold_percentile over the given data."""
         self.model.eval()
         reconstruction_errors = []
         
@@ -200,20 +374,76 @@ class LSTMDetector:
                 errors = torch.mean((batch - reconstructed) ** 2, dim=(1, 2))
                 reconstruction_errors.extend(errors.cpu().numpy())
         
-        self.threshold = np.percentile(reconstruction_errors, self.threshold_percentile)
+        return float(np.percentile(reconstruction_errors, self.threshold_percentile))
+    
+    def _window_errors(self, X: np.ndarray) -> np.ndarray:
+        """Reconstruction error per (window, position), shape (n_windows, sequence_length)."""
+        dataset = SubwaySequenceDataset(X, self.sequence_length)
+        dataloader = DataLoader(dataset, batch_size=self.batch_size, shuffle=False)
         
-        # Set version
-        self.version = f"lstm_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
+        self.model.eval()
+        reconstruction_errors = []
         
-        metrics = {
-            "train_samples": len(X),
-            "sequence_length": self.sequence_length,
-            "final_loss": float(train_losses[-1]),
-            "threshold": float(self.threshold),
-            "input_dim": input_dim,
-        }
+        with torch.no_grad():
+            for batch in dataloader:
+                batch = batch.to(self.device)
+                reconstructed = self.model(batch)
+                errors = torch.mean((batch - reconstructed) ** 2, dim=2)  # (batch, seq_len)
+                reconstruction_errors.append(errors.cpu().numpy())
         
-        return metrics
+        if not reconstruction_errors:
+            return np.empty((0, self.sequence_length), dtype=np.float32)
+        return np.concatenate(reconstruction_errors, axis=0)
+    
+    def row_errors(self, data: pd.DataFrame) -> np.ndarray:
+        """Per-row reconstruction error: the max over every window containing the row.
+        
+        Rows are zero when the data is shorter than one sequence.
+        """
+        if self.model is None:
+            raise ValueError("Model not trained")
+        
+        return self._row_errors_matrix(self.transform(data))
+    
+    def _row_errors_matrix(self, X: np.ndarray) -> np.ndarray:
+        """Per-row reconstruction error for an already normalized matrix."""
+        errors = np.zeros(len(X), dtype=np.float32)
+        if len(X) < self.sequence_length:
+            return errors
+        
+        window_errors = self._window_errors(X)
+        
+        # Position j of window i is row i + j
+        rows = np.arange(len(window_errors))[:, None] + np.arange(self.sequence_length)
+        np.maximum.at(errors, rows.ravel(), window_errors.ravel())
+        
+        return errors
+    
+    def score_samples(self, data: pd.DataFrame) -> np.ndarray:
+        """Per-row anomaly severity in [0, 1], aligned with the rows of ``data``."""
+        return self.score_and_label(data)[0]
+    
+    def predict_labels(self, data: pd.DataFrame) -> np.ndarray:
+        """Per-row anomaly labels (1 = anomaly), aligned with the rows of ``data``."""
+        return self.score_and_label(data)[1]
+    
+    def score_and_label(self, data: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+        """Dense severities and labels from a single reconstruction pass."""
+        return self._errors_to_scores(self.row_errors(data))
+    
+    def score_matrix(self, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Dense severities and labels for a raw feature matrix."""
+        if self.model is None:
+            raise ValueError("Model not trained")
+        
+        X = values * self._scale + self._shift
+        return self._errors_to_scores(self._row_errors_matrix(X))
+    
+    def _errors_to_scores(self, errors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Severity in [0, 1] and labels from per-row reconstruction errors."""
+        severity = np.minimum(1.0, errors / (self.threshold * 2))
+        labels = (errors > self.threshold).astype(np.int8)
+        return severity, labels
     
     def predict(self, data: pd.DataFrame) -> List[Dict]:
         """Detect anomalies using reconstruction error."""
@@ -228,26 +458,7 @@ class LSTMDetector:
         if len(X) < self.sequence_length:
             return []
         
-        # Create dataset
-        dataset = SubwaySequenceDataset(X, self.sequence_length)
-        dataloader = DataLoader(dataset, batch_size=32, shuffle=False)
-        
-        # Calculate reconstruction errors
-        self.model.eval()
-        reconstruction_errors = []
-        
-        with torch.no_grad():
-            for batch in dataloader:
-                batch = batch.to(self.device)
-                reconstructed = self.model(batch)
-                errors = torch.mean((batch - reconstructed) ** 2, dim=2)  # (batch, seq_len)
-                reconstruction_errors.append(errors.cpu().numpy())
-        
-        # Concatenate all errors
-        if reconstruction_errors:
-            all_errors = np.concatenate(reconstruction_errors, axis=0)
-        else:
-            return []
+        all_errors = self._window_errors(X)
         
         # Detect anomalies
         anomalies = []
@@ -298,6 +509,7 @@ class LSTMDetector:
             "version": self.version,
             "sequence_length": self.sequence_length,
             "hidden_size": self.hidden_size,
+            "num_layers": self.num_layers,
             "threshold": float(self.threshold) if self.threshold else None,
             "threshold_percentile": self.threshold_percentile,
             "feature_columns": self.feature_columns,
@@ -318,12 +530,15 @@ class LSTMDetector:
             self.version = metadata["version"]
             self.sequence_length = metadata["sequence_length"]
             self.hidden_size = metadata["hidden_size"]
+            self.num_layers = metadata.get("num_layers", 2)
             self.threshold = metadata["threshold"]
             self.feature_columns = metadata["feature_columns"]
             self.scaler_params = metadata["scaler_params"]
             input_dim = metadata["input_dim"]
         
+        self._set_affine_params()
+        
         # Initialize and load model
-        self.model = LSTMAutoencoder(input_dim, self.hidden_size).to(self.device)
+        self.model = LSTMAutoencoder(input_dim, self.hidden_size, self.num_layers).to(self.device)
         self.model.load_state_dict(torch.load(path / "model.pth", map_location=self.device))
         self.model.eval()
\ No newline at end of file
@@ -2,16 +2,20 @@
 """
 Real-time anomaly detection using trained models.
 Combines predictions from multiple models for ensemble detection.
+
+Imported by the API at startup: pandas is only loaded on first detection.
 """
 
+from collections import defaultdict
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
 
-import pandas as pd
 import structlog
 
-from app.ml.models.isolation_forest import IsolationForestDetector
-from app.ml.models.lstm_autoencoder import LSTMDetector
+from app.ml.vocab import get_station_index
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 logger = structlog.get_logger()
 
@@ -22,12 +26,23 @@ class AnomalyDetector:
     def __init__(self):
         self.models: Dict[str, Any] = {}
         self.last_run_time: Optional[datetime] = None
+        self.ready = False
         
     def register_model(self, name: str, model: Any):
         """Register a model for ensemble detection."""
-        self.models[name] = model
+        # Copy-on-write so in-flight detections keep a consistent model set
+        self.models = {**self.models, name: model}
         logger.info(f"Registered model: {name}")
-        
+    
+    def swap_models(self, models: Dict[str, Any]):
+        """Atomically replace the model set without interrupting detection."""
+        self.models = dict(models)
+        logger.info(f"Swapped models: {list(models.keys())}")
+        
+    def mark_ready(self):
+        """Mark application warm-up as finished (models may still be untrained)."""
+        self.ready = True
+    
     def is_model_loaded(self, model_type: str) -> bool:
         """Check if a model type is loaded."""
         return model_type in self.models
@@ -38,11 +53,16 @@ class AnomalyDetector:
         if not positions:
             return []
         
+        # Snapshot the model set; a concurrent swap only affects later calls
+        models = self.models
+        
         # If no models are loaded, return empty list
-        if not self.models:
+        if not models:
             logger.warning("No models loaded for anomaly detection")
             return []
         
+        import pandas as pd
+        
         # Convert to DataFrame
         df = pd.DataFrame([
             {
@@ -60,6 +80,9 @@ class AnomalyDetector:
             for p in positions
         ])
         
+        # Identifier columns as categoricals with the shared codes
+        get_station_index().encode_frame(df)
+        
         # Add temporal features
         df["hour"] = df["timestamp"].dt.hour
         df["day_of_week"] = df["timestamp"].dt.dayofweek
@@ -68,23 +91,13 @@ class AnomalyDetector:
         all_anomalies = []
         
         # Run each model
-        for model_name, model in self.models.items():
+        for model_name, model in models.items():
             try:
-                if isinstance(model, IsolationForestDetector):
-                    # Check if model is trained
-                    if hasattr(model, 'model') and model.model is not None:
-                        anomalies = model.predict(df)
-                    else:
-                        logger.warning(f"Model {model_name} not trained yet")
-                        continue
-                elif isinstance(model, LSTMDetector):
-                    # Check if model is trained
-                    if hasattr(model, 'model') and model.model is not None:
-                        anomalies = model.predict(df)
-                    else:
-                        logger.warning(f"Model {model_name} not trained yet")
-                        continue
+                # Check if model is trained
+                if getattr(model, 'model', None) is not None:
+                    anomalies = model.predict(df)
                 else:
+                    logger.warning(f"Model {model_name} not trained yet")
                     continue
                 
                 # Add source position ID for tracking
@@ -105,7 +118,7 @@ class AnomalyDetector:
         
         return combined_anomalies
     
-    def _is_rush_hour(self, timestamp: pd.Timestamp) -> bool:
+    def _is_rush_hour(self, timestamp: "pd.Timestamp") -> bool:
         """Check if timestamp is during rush hour."""
         hour = timestamp.hour
         is_weekday = timestamp.weekday() < 5
@@ -117,9 +130,9 @@ class AnomalyDetector:
     
     def _combine_anomalies(self, anomalies: List[Dict]) -> List[Dict]:
         """Combine anomalies from multiple models."""
+        import pandas as pd
         
         # Group by station and time window
-        from collections import defaultdict
         grouped = defaultdict(list)
         
         for anomaly in anomalies:
@@ -180,6 +193,7 @@ class AnomalyDetector:
         return {
             "loaded_models": list(self.models.keys()),
             "model_count": len(self.models),
+            "ready": self.ready,
             "model_details": model_stats,
             "last_run": self.last_run_time.isoformat() if self.last_run_time else None,
         }
\ No newline at end of file
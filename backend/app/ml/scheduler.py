@@ -0,0 +1,230 @@
+"""
+Out-of-process training schedule and hot model swapping.
+
+Training runs in the `app.ml.worker` process so the API event loop is never
+blocked by model fitting. When a worker publishes new active artifacts, they
+are loaded off the event loop and swapped into the live AnomalyDetector.
+
+Every API replica runs this schedule; a Postgres advisory lock held while
+the worker runs lets only one of them train at a time. The others pick up
+the published versions through the watcher, which requires models_dir to
+be shared between replicas (or TRAINING_MODE=external with one worker).
+
+This module is imported by the API at startup, so the ML stacks (torch,
+sklearn, pandas) are only imported on first artifact load, in a worker thread.
+"""
+
+import asyncio
+import os
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import structlog
+from sqlalchemy import text
+
+from app.config import get_settings
+from app.db import crud
+from app.db.database import AsyncSessionLocal, engine
+from app.db.locks import TRAINING_LOCK_ID
+
+logger = structlog.get_logger()
+settings = get_settings()
+
+
+def seconds_until_hour(hour: int, now: Optional[datetime] = None) -> float:
+    """Seconds from now until the next occurrence of an hour (UTC)."""
+    now = now or datetime.utcnow()
+    next_run = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return (next_run - now).total_seconds()
+
+
+class TrainingScheduler:
+    """Runs the training worker on schedule and hot-swaps new models."""
+
+    def __init__(self, detector, trainer=None):
+        self.detector = detector
+        self.trainer = trainer
+        self.loaded_versions: Dict[str, str] = {}
+        self.last_training: Optional[Dict] = None
+
+        self._training_lock = asyncio.Lock()
+        self._reload_lock = asyncio.Lock()
+        self._process: Optional[asyncio.subprocess.Process] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def _get_trainer(self):
+        """Create the model trainer on first use (imports the ML stacks)."""
+        if self.trainer is None:
+            from app.ml.train import ModelTrainer
+            self.trainer = ModelTrainer()
+        return self.trainer
+
+    def _load_artifact(self, model_type: str, path: Path):
+        """Load a model artifact; blocking, run in a worker thread."""
+        return self._get_trainer().load_model_artifact(model_type, path)
+
+    def start(self):
+        """Start the retrain schedule and the active-model watcher."""
+        if settings.training_mode == "subprocess":
+            self._tasks.append(asyncio.create_task(self._schedule_loop()))
+        self._tasks.append(asyncio.create_task(self._watch_loop()))
+
+    async def stop(self):
+        """Cancel background loops and terminate a running worker."""
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks.clear()
+
+        if self._process and self._process.returncode is None:
+            self._process.terminate()
+            await self._process.wait()
+
+    def request_training(self, model_types: Optional[Sequence[str]] = None) -> asyncio.Task:
+        """Run the training worker in the background."""
+        task = asyncio.create_task(self.run_training(model_types))
+        self._tasks.append(task)
+        return task
+
+    async def run_training(self, model_types: Optional[Sequence[str]] = None) -> Optional[int]:
+        """Run the training worker subprocess, then reload active models.
+
+        Returns the worker's exit code, or None when another replica holds
+        the training lock and no worker was started.
+        """
+        cmd = [sys.executable, "-m", "app.ml.worker", "--once"]
+        for model_type in model_types or []:
+            cmd.extend(["--model-type", model_type])
+
+        async with self._training_lock:
+            # Session-level lock on an autocommit connection, held for the
+            # whole run without leaving a transaction open
+            conn = await engine.execution_options(isolation_level="AUTOCOMMIT").connect()
+            try:
+                locked = await conn.scalar(
+                    text("SELECT pg_try_advisory_lock(:lock_id)"),
+                    {"lock_id": TRAINING_LOCK_ID},
+                )
+                if not locked:
+                    logger.info("Training already running on another replica")
+                    return None
+
+                try:
+                    returncode = await self._spawn_worker(cmd, model_types)
+                finally:
+                    await conn.execute(
+                        text("SELECT pg_advisory_unlock(:lock_id)"),
+                        {"lock_id": TRAINING_LOCK_ID},
+                    )
+            finally:
+                await conn.close()
+
+        if returncode != 0:
+            logger.error(f"Training worker exited with code {returncode}")
+
+        # Pick up whatever the worker managed to activate, even on partial failure
+        await self.reload_models()
+
+        return returncode
+
+    async def _spawn_worker(self, cmd: List[str], model_types: Optional[Sequence[str]]) -> int:
+        """Run one training worker to completion."""
+        started_at = datetime.utcnow()
+        logger.info("Starting training worker", model_types=model_types)
+
+        self._process = await asyncio.create_subprocess_exec(
+            *cmd,
+            env={**os.environ, "RUNTIME_ROLE": "training"},
+            cwd=str(Path(__file__).resolve().parents[2]),
+        )
+        returncode = await self._process.wait()
+        self._process = None
+
+        self.last_training = {
+            "started_at": started_at.isoformat(),
+            "finished_at": datetime.utcnow().isoformat(),
+            "returncode": returncode,
+        }
+        return returncode
+
+    async def reload_models(self) -> List[str]:
+        """Swap newly activated model versions into the live detector."""
+        async with self._reload_lock:
+            async with AsyncSessionLocal() as db:
+                records = await crud.get_active_models(db)
+
+            changed = [
+                record for record in records
+                if record.artifact_path
+                and self.loaded_versions.get(record.model_type) != record.version
+            ]
+            if not changed:
+                return []
+
+            new_models = dict(self.detector.models)
+            swapped = []
+
+            for record in changed:
+                path = Path(record.artifact_path)
+                if not path.exists():
+                    logger.warning(f"Artifact missing for {record.version}: {path}")
+                    continue
+
+                try:
+                    # Deserializing artifacts is blocking; keep it off the event loop
+                    model = await asyncio.to_thread(
+                        self._load_artifact, record.model_type, path
+                    )
+                except Exception as e:
+                    logger.error(f"Failed to load {record.version}: {e}")
+                    continue
+
+                new_models[record.model_type] = model
+                self.loaded_versions[record.model_type] = record.version
+                swapped.append(record.version)
+
+            if swapped:
+                self.detector.swap_models(new_models)
+                logger.info("Hot-swapped models", versions=swapped)
+
+            return swapped
+
+    async def _schedule_loop(self):
+        """Trigger a full retrain daily at settings.model_retrain_hour (UTC)."""
+        while True:
+            await asyncio.sleep(seconds_until_hour(settings.model_retrain_hour))
+            try:
+                await self.run_training()
+            except Exception as e:
+                logger.error(f"Scheduled training failed: {e}")
+
+    async def _watch_loop(self):
+        """Pick up models published by external training workers."""
+        while True:
+            await asyncio.sleep(settings.model_reload_interval)
+            try:
+                await self.reload_models()
+            except Exception as e:
+                logger.error(f"Model reload check failed: {e}")
+
+    def get_status(self) -> Dict:
+        """Report schedule and loaded model versions."""
+        return {
+            "training_mode": settings.training_mode,
+            "training_running": self._process is not None,
+            "retrain_hour_utc": settings.model_retrain_hour,
+            "next_training_in_seconds": (
+                seconds_until_hour(settings.model_retrain_hour)
+                if settings.training_mode == "subprocess" else None
+            ),
+            "loaded_versions": dict(self.loaded_versions),
+            "last_training": self.last_training,
+        }
@@ -4,142 +4,221 @@ Fixed model training with proper error handling and initialization.
 
 import asyncio
 import subprocess
-from datetime import datetime, timedelta
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Sequence
 
-import pandas as pd
 import structlog
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import get_settings
 from app.db import crud
-from app.db.database import AsyncSessionLocal
+from app.db.database import AnalyticsSessionLocal
+from app.db.models import ModelArtifact
 from app.ml.features import FeatureExtractor
+from app.ml.models import MODEL_TYPES
 from app.ml.models.isolation_forest import IsolationForestDetector
 from app.ml.models.lstm_autoencoder import LSTMDetector
+from app.ml.training.snapshot import (
+    TrainingSnapshot,
+    load_training_snapshot,
+    training_window,
+)
+from app.ml.vocab import get_station_index
+from app.utils.memory import peak_rss_mb, reset_peak_rss
 
 logger = structlog.get_logger()
 settings = get_settings()
 
 
+def _naive_utc(ts: datetime) -> datetime:
+    """Naive UTC datetime, as used for training windows."""
+    if ts.tzinfo is None:
+        return ts
+    return ts.astimezone(timezone.utc).replace(tzinfo=None)
+
+
 class ModelTrainer:
     """Fixed ML model training orchestrator."""
     
+    MODEL_TYPES = MODEL_TYPES
+    
     def __init__(self):
-        self.models_dir = Path("/app/models/artifacts")
+        self.models_dir = Path(settings.models_dir)
         self.models_dir.mkdir(parents=True, exist_ok=True)
         
         self.feature_extractor = FeatureExtractor()
         self.active_models: Dict[str, any] = {}
+        self._snapshot: Optional[TrainingSnapshot] = None
+    
+    def create_model(self, model_type: str):
+        """Create an untrained (placeholder) model instance."""
+        if model_type == "isolation_forest":
+            return IsolationForestDetector()
+        elif model_type == "lstm_autoencoder":
+            return LSTMDetector()
+        raise ValueError(f"Unknown model type: {model_type}")
+    
+    def load_model_artifact(self, model_type: str, path: Path):
+        """Load a trained model from its artifact directory."""
+        model = self.create_model(model_type)
+        model.load(path)
+        return model
+    
+    async def load_active_models(self, db: AsyncSession) -> Dict[str, str]:
+        """Load artifacts of the active models; returns loaded versions by type."""
+        loaded_versions = {}
         
-    async def load_or_train_models(self):
-        """Load existing models or train new ones with proper error handling."""
-        async with AsyncSessionLocal() as db:
-            # Check for existing models
-            active_models = await crud.get_active_models(db)
+        for model_record in await crud.get_active_models(db):
+            if not model_record.artifact_path:
+                continue
             
-            models_loaded = {
-                "isolation_forest": False,
-                "lstm_autoencoder": False,
-            }
+            path = Path(model_record.artifact_path)
+            if not path.exists():
+                continue
             
-            # Try to load existing models
-            for model_record in active_models:
-                if model_record.artifact_path:
-                    path = Path(model_record.artifact_path)
-                    if path.exists():
-                        try:
-                            if model_record.model_type == "isolation_forest":
-                                model = IsolationForestDetector()
-                                model.load(path)
-                                self.active_models["isolation_forest"] = model
-                                models_loaded["isolation_forest"] = True
-                                logger.info(f"Loaded isolation_forest model: {model_record.version}")
-                                
-                            elif model_record.model_type == "lstm_autoencoder":
-                                model = LSTMDetector()
-                                model.load(path)
-                                self.active_models["lstm_autoencoder"] = model
-                                models_loaded["lstm_autoencoder"] = True
-                                logger.info(f"Loaded lstm_autoencoder model: {model_record.version}")
-                                
-                        except Exception as e:
-                            logger.error(f"Failed to load {model_record.model_type}: {e}")
+            try:
+                model = self.load_model_artifact(model_record.model_type, path)
+                self.active_models[model_record.model_type] = model
+                loaded_versions[model_record.model_type] = model_record.version
+                logger.info(f"Loaded {model_record.model_type} model: {model_record.version}")
+            except Exception as e:
+                logger.error(f"Failed to load {model_record.model_type}: {e}")
+        
+        return loaded_versions
+    
+    async def get_training_snapshot(
+        self,
+        db: AsyncSession,
+        start_time: Optional[datetime] = None,
+        end_time: Optional[datetime] = None,
+    ) -> TrainingSnapshot:
+        """Training data for a window, loaded once and reused while the range matches."""
+        if start_time is None or end_time is None:
+            start_time, end_time = training_window(end_time)
+        
+        if self._snapshot is None or not self._snapshot.covers(start_time, end_time):
+            # Drop the previous frame before reading the next one
+            self._snapshot = None
+            self._snapshot = await load_training_snapshot(db, start_time, end_time)
+        
+        return self._snapshot
+    
+    def clear_snapshot(self):
+        """Release the cached training data."""
+        self._snapshot = None
+    
+    async def get_warm_start_parents(
+        self,
+        db: AsyncSession,
+        model_types: Sequence[str],
+    ) -> Dict[str, ModelArtifact]:
+        """Active artifacts that the next run can continue from, by type."""
+        parents = {}
+        
+        for record in await crud.get_active_models(db):
+            if record.model_type not in model_types or record.data_end is None:
+                continue
+            if not record.artifact_path or not Path(record.artifact_path).exists():
+                continue
             
-            # Check if we have enough data for training
-            end_time = datetime.utcnow()
-            start_time = end_time - timedelta(days=7)
+            # Bound drift from repeated partial updates with a periodic full refit
+            generation = (record.metrics or {}).get("warm_start_generation", 0)
+            if generation >= settings.warm_start_max_generations:
+                logger.info(f"{record.version} reached {generation} warm starts, refitting")
+                continue
             
-            positions = await crud.get_train_positions_for_training(
-                db, start_time, end_time
-            )
+            parents[record.model_type] = record
+        
+        return parents
+    
+    async def train_models(
+        self,
+        model_types: Sequence[str],
+        db: AsyncSession,
+        snapshot: Optional[TrainingSnapshot] = None,
+        warm_start: Optional[bool] = None,
+    ) -> Dict[str, Optional[Dict]]:
+        """Train several model types on one shared snapshot; failures are logged and skipped."""
+        if warm_start is None:
+            warm_start = settings.warm_start_enabled
+        
+        parents = await self.get_warm_start_parents(db, model_types) if warm_start else {}
+        
+        # Peak RSS reported with each model covers this run only
+        reset_peak_rss()
+        
+        if snapshot is None:
+            start_time, end_time = training_window()
+            if parents and len(parents) == len(model_types):
+                # Every model continues from a parent, so only unseen data is read
+                since = min(_naive_utc(p.data_end) for p in parents.values())
+                start_time = max(start_time, since)
+            snapshot = await self.get_training_snapshot(db, start_time, end_time)
+        
+        results: Dict[str, Optional[Dict]] = {}
+        
+        try:
+            for model_type in model_types:
+                try:
+                    results[model_type] = await self.train_model(
+                        model_type, db, snapshot=snapshot, parent=parents.get(model_type)
+                    )
+                except Exception as e:
+                    logger.error(f"Failed to train {model_type}: {e}")
+                    await db.rollback()
+        finally:
+            self.clear_snapshot()
+        
+        return results
+    
+    async def load_or_train_models(self):
+        """Load existing models or train new ones with proper error handling."""
+        async with AnalyticsSessionLocal() as db:
+            # Try to load existing models
+            loaded_versions = await self.load_active_models(db)
+            missing = [t for t in self.MODEL_TYPES if t not in loaded_versions]
             
-            logger.info(f"Found {len(positions)} training samples")
+            if missing:
+                # Count first so an empty window never streams any rows
+                start_time, end_time = training_window()
+                n_samples = await crud.count_train_positions_for_training(
+                    db, start_time, end_time
+                )
+                
+                logger.info(f"Found {n_samples} training samples")
+                
+                if n_samples >= 100:
+                    logger.info(f"Training new models: {', '.join(missing)}")
+                    snapshot = await self.get_training_snapshot(db, start_time, end_time)
+                    await self.train_models(missing, db, snapshot=snapshot)
             
             # Always create at least placeholder models
-            for model_type, loaded in models_loaded.items():
-                if not loaded:
-                    if len(positions) >= 100:
-                        logger.info(f"Training new {model_type} model")
-                        try:
-                            await self.train_model(model_type, db)
-                        except Exception as e:
-                            logger.error(f"Failed to train {model_type}: {e}")
-                            # Create placeholder model
-                            if model_type == "isolation_forest":
-                                self.active_models["isolation_forest"] = IsolationForestDetector()
-                            elif model_type == "lstm_autoencoder":
-                                self.active_models["lstm_autoencoder"] = LSTMDetector()
-                    else:
-                        logger.warning(f"Not enough data to train {model_type}, creating placeholder")
-                        if model_type == "isolation_forest":
-                            self.active_models["isolation_forest"] = IsolationForestDetector()
-                        elif model_type == "lstm_autoencoder":
-                            self.active_models["lstm_autoencoder"] = LSTMDetector()
+            for model_type in missing:
+                if model_type not in self.active_models:
+                    logger.warning(f"No trained {model_type} model, creating placeholder")
+                    self.active_models[model_type] = self.create_model(model_type)
     
-    async def train_model(self, model_type: str, db: AsyncSession) -> Optional[Dict]:
-        """Train a specific model type with error handling."""
+    async def train_model(
+        self,
+        model_type: str,
+        db: AsyncSession,
+        snapshot: Optional[TrainingSnapshot] = None,
+        parent: Optional[ModelArtifact] = None,
+    ) -> Optional[Dict]:
+        """Train a specific model type, continuing from ``parent`` when given."""
         
-        # Get training data
-        end_time = datetime.utcnow()
-        start_time = end_time - timedelta(days=7)
+        # Models only read from the shared frame, so no per-model copy is made
+        snapshot = snapshot or await self.get_training_snapshot(db)
         
-        positions = await crud.get_train_positions_for_training(
-            db, start_time, end_time
-        )
+        if parent is not None:
+            return await self._warm_start_model(model_type, db, snapshot, parent)
         
-        if len(positions) < 100:
-            logger.warning(f"Insufficient data for {model_type}: {len(positions)} samples")
-            return None
+        df = snapshot.frame
         
-        # Convert to DataFrame
-        data = []
-        for p in positions:
-            data.append({
-                "timestamp": p.timestamp,
-                "trip_id": p.trip_id,
-                "route_id": p.route_id,
-                "line": p.line,
-                "current_station": p.current_station,
-                "headway_seconds": p.headway_seconds or 0,
-                "dwell_time_seconds": p.dwell_time_seconds or 0,
-                "delay_seconds": p.delay_seconds,
-                "direction": p.direction,
-            })
-        
-        df = pd.DataFrame(data)
-        
-        # Add temporal features
-        df['hour'] = df['timestamp'].dt.hour
-        df['day_of_week'] = df['timestamp'].dt.dayofweek
-        df['is_weekend'] = (df['day_of_week'] >= 5).astype(int)
-        df['is_rush_hour'] = df['timestamp'].apply(
-            lambda x: (7 <= x.hour <= 10 or 17 <= x.hour <= 20) and x.weekday() < 5
-        ).astype(int)
-        
-        # Get git SHA
-        git_sha = self._get_git_sha()
+        if len(df) < 100:
+            logger.warning(f"Insufficient data for {model_type}: {len(df)} samples")
+            return None
         
         # Train model
         try:
@@ -164,29 +243,17 @@ class ModelTrainer:
                 
             else:
                 raise ValueError(f"Unknown model type: {model_type}")
-                
-            # Save model
-            model_path = self.models_dir / model.version
-            model.save(model_path)
             
-            # Update database
-            await crud.create_model_artifact(
+            await self._publish_model(
                 db,
-                model_type=model_type,
-                version=model.version,
-                git_sha=git_sha,
-                metrics=metrics,
-                artifact_path=str(model_path),
+                model_type,
+                model,
+                metrics,
                 training_samples=len(df),
+                data_start=snapshot.start_time,
+                data_end=snapshot.data_end,
             )
             
-            # Set as active
-            await crud.set_active_model(db, model_type, model.version)
-            await db.commit()
-            
-            # Update in-memory reference
-            self.active_models[model_type] = model
-            
             logger.info(f"Trained {model_type} model", version=model.version, metrics=metrics)
             
             return metrics
@@ -195,6 +262,101 @@ class ModelTrainer:
             logger.error(f"Training failed for {model_type}: {e}")
             raise
     
+    async def _warm_start_model(
+        self,
+        model_type: str,
+        db: AsyncSession,
+        snapshot: TrainingSnapshot,
+        parent: ModelArtifact,
+    ) -> Optional[Dict]:
+        """Update the parent model with data newer than its data range."""
+        since = _naive_utc(parent.data_end)
+        df = snapshot.frame
+        delta = df[df["timestamp"] >= since.replace(tzinfo=timezone.utc)]
+        
+        if len(delta) < 100:
+            logger.warning(
+                f"Insufficient new data to update {parent.version}: {len(delta)} samples"
+            )
+            return None
+        
+        model = self.load_model_artifact(model_type, Path(parent.artifact_path))
+        
+        try:
+            if model_type == "isolation_forest":
+                metrics = model.warm_start(delta, settings.warm_start_tree_fraction)
+            elif model_type == "lstm_autoencoder":
+                metrics = model.fine_tune(delta, epochs=settings.warm_start_epochs)
+            else:
+                raise ValueError(f"Unknown model type: {model_type}")
+        except ValueError as e:
+            # Keep serving the parent rather than refitting on the delta alone
+            logger.warning(f"Warm start skipped for {parent.version}: {e}")
+            return None
+        
+        metrics["warm_start_generation"] = (
+            (parent.metrics or {}).get("warm_start_generation", 0) + 1
+        )
+        
+        await self._publish_model(
+            db,
+            model_type,
+            model,
+            metrics,
+            training_samples=len(delta),
+            data_start=since,
+            data_end=snapshot.data_end,
+            parent_version=parent.version,
+        )
+        
+        logger.info(
+            f"Warm-started {model_type} model",
+            version=model.version,
+            parent_version=parent.version,
+            metrics=metrics,
+        )
+        
+        return metrics
+    
+    async def _publish_model(
+        self,
+        db: AsyncSession,
+        model_type: str,
+        model,
+        metrics: Dict,
+        training_samples: int,
+        data_start: datetime,
+        data_end: datetime,
+        parent_version: Optional[str] = None,
+    ):
+        """Save the artifact, record its lineage and make it the active version."""
+        metrics["peak_rss_mb"] = round(peak_rss_mb(), 1)
+        # Station feature width the model was trained with
+        metrics["station_vocab_size"] = len(get_station_index().stations)
+        
+        model_path = self.models_dir / model.version
+        model.save(model_path)
+        
+        await crud.create_model_artifact(
+            db,
+            model_type=model_type,
+            version=model.version,
+            git_sha=self._get_git_sha(),
+            metrics=metrics,
+            artifact_path=str(model_path),
+            training_samples=training_samples,
+            parent_version=parent_version,
+            data_start=data_start,
+            data_end=data_end,
+        )
+        
+        # Set as active
+        await crud.set_active_model(db, model_type, model.version)
+        await db.commit()
+        
+        # Update in-memory reference
+        self.active_models[model_type] = model
+    
     def _get_git_sha(self) -> Optional[str]:
         """Get current git commit SHA."""
         try:
@@ -12,31 +12,69 @@ from sklearn.model_selection import train_test_split
 from torch.utils.data import Dataset
 
 from app.db.models import TrainPosition
+from app.ml.vocab import get_station_index
+
+
+# Identifier columns stored as categoricals instead of Python strings
+CATEGORICAL_COLUMNS = ('trip_id', 'route_id', 'line', 'current_station', 'next_station')
+
+# Measurements with heavy right tails, capped at the 99th percentile
+CLIPPED_COLUMNS = ('headway_seconds', 'dwell_time_seconds', 'delay_seconds')
+
+
+def downcast_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Shrink dtypes column by column: float32, smallest ints, categoricals (in place)."""
+    for col in df.columns:
+        dtype = df[col].dtype
+        
+        if pd.api.types.is_float_dtype(dtype) and dtype != np.float32:
+            df[col] = df[col].astype(np.float32)
+        elif pd.api.types.is_integer_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype):
+            df[col] = pd.to_numeric(df[col], downcast='integer')
+        elif pd.api.types.is_bool_dtype(dtype):
+            df[col] = df[col].astype(np.int8)
+        elif col in CATEGORICAL_COLUMNS and dtype == object:
+            df[col] = df[col].astype('category')
+    
+    # Identifier categoricals take the shared station/line/route codes
+    return get_station_index().encode_frame(df)
 
 
 class SubwayDataset:
-    """Base dataset class for subway anomaly detection."""
+    """Base dataset class for subway anomaly detection.
     
-    def __init__(self, data: pd.DataFrame, target_col: Optional[str] = None):
-        self.data = data
+    Preparation works on ``data`` in place (sorted, downcast, filled and
+    clipped column by column) so one frame can be shared by the splits,
+    label generation and cross-validation. Pass ``copy=True`` to keep the
+    caller's frame untouched.
+    """
+    
+    def __init__(self, data: pd.DataFrame, target_col: Optional[str] = None, copy: bool = False):
+        self.data = data.copy() if copy else data
         self.target_col = target_col
         self._prepare_data()
     
     def _prepare_data(self):
         """Prepare data for training."""
         # Sort by timestamp
-        self.data = self.data.sort_values('timestamp')
+        if 'timestamp' in self.data.columns and not self.data['timestamp'].is_monotonic_increasing:
+            self.data.sort_values('timestamp', inplace=True, ignore_index=True)
+        
+        downcast_frame(self.data)
         
-        # Handle missing values
-        numeric_cols = self.data.select_dtypes(include=[np.number]).columns
-        self.data[numeric_cols] = self.data[numeric_cols].fillna(0)
+        # Handle missing values, one column at a time
+        for col in self.data.select_dtypes(include=[np.number]).columns:
+            if self.data[col].hasnans:
+                self.data[col] = self.data[col].fillna(0)
         
         # Remove outliers (optional)
-        for col in ['headway_seconds', 'dwell_time_seconds', 'delay_seconds']:
+        for col in CLIPPED_COLUMNS:
             if col in self.data.columns:
                 # Cap at 99th percentile
-                cap_value = self.data[col].quantile(0.99)
-                self.data[col] = self.data[col].clip(upper=cap_value)
+                # Cast the cap so clipping keeps the downcast dtype
+                column = self.data[col]
+                cap_value = column.dtype.type(column.quantile(0.99))
+                self.data[col] = column.clip(upper=cap_value)
     
     def split(self, test_size: float = 0.2, random_state: int = 42) -> Tuple[pd.DataFrame, pd.DataFrame]:
         """Split data into train and test sets."""
@@ -110,13 +148,13 @@ def create_anomaly_labels(df: pd.DataFrame, method: str = 'isolation_forest') ->
             # Fallback to random labels
             return pd.Series(np.random.choice([0, 1], size=len(df), p=[0.95, 0.05]))
         
-        X = df[feature_cols].fillna(0).values
+        X = df[feature_cols].fillna(0).to_numpy(dtype=np.float32)
         
         clf = IsolationForest(contamination=0.05, random_state=42)
         labels = clf.fit_predict(X)
         
         # Convert to 0/1 (0=normal, 1=anomaly)
-        return pd.Series(labels).map({1: 0, -1: 1})
+        return pd.Series((labels == -1).astype(np.int8))
     
     else:
         raise ValueError(f"Unknown method: {method}")
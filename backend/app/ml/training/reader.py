@@ -0,0 +1,189 @@
+"""
+Streaming reader for model training data.
+
+Runs a column-projected query over a server-side cursor and copies each
+chunk into preallocated numpy arrays, so neither ORM objects nor per-row
+dicts are ever materialized. Windows larger than ``max_rows`` are
+down-sampled with a fixed stride while streaming, which bounds peak memory
+regardless of the training window length.
+"""
+
+import math
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import structlog
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.db import crud
+from app.ml.vocab import get_station_index
+
+logger = structlog.get_logger()
+settings = get_settings()
+
+# Column -> storage kind: "datetime" (UTC ns), numpy dtype, or "category"
+TRAINING_COLUMNS: Dict[str, str] = {
+    "timestamp": "datetime",
+    "trip_id": "category",
+    "route_id": "category",
+    "line": "category",
+    "current_station": "category",
+    "direction": "int8",
+    "headway_seconds": "float32",
+    "dwell_time_seconds": "float32",
+    "delay_seconds": "float32",
+}
+
+
+class TrainingDataReader:
+    """Read a training window into compact column arrays."""
+
+    def __init__(
+        self,
+        db: AsyncSession,
+        start_time: datetime,
+        end_time: datetime,
+        columns: Optional[Sequence[str]] = None,
+        chunk_size: Optional[int] = None,
+        max_rows: Optional[int] = None,
+    ):
+        self.db = db
+        self.start_time = start_time
+        self.end_time = end_time
+        self.columns = list(columns or TRAINING_COLUMNS)
+        self.chunk_size = chunk_size or settings.training_chunk_size
+        self.max_rows = max_rows or settings.training_max_rows
+
+        unknown = set(self.columns) - set(TRAINING_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unsupported training columns: {sorted(unknown)}")
+
+    async def count(self) -> int:
+        """Number of rows in the training window."""
+        return await crud.count_train_positions_for_training(
+            self.db, self.start_time, self.end_time
+        )
+
+    async def iter_chunks(self) -> AsyncIterator[Dict[str, np.ndarray]]:
+        """Yield the window as column arrays, one chunk at a time."""
+        async for rows in crud.stream_train_positions_for_training(
+            self.db, self.start_time, self.end_time, self.columns, self.chunk_size
+        ):
+            yield self._chunk_to_arrays(rows)
+
+    async def read_frame(self) -> pd.DataFrame:
+        """Read the window into a DataFrame built from preallocated arrays."""
+        total = await self.count()
+        stride = max(1, math.ceil(total / self.max_rows))
+        capacity = math.ceil(total / stride)
+
+        if stride > 1:
+            logger.info(
+                f"Down-sampling training window: {total} rows, keeping every {stride}th"
+            )
+
+        arrays = {col: self._allocate(col, capacity) for col in self.columns}
+        vocabularies: Dict[str, Dict[str, int]] = {
+            col: {} for col in self.columns if TRAINING_COLUMNS[col] == "category"
+        }
+
+        seen = 0
+        filled = 0
+        async for rows in crud.stream_train_positions_for_training(
+            self.db, self.start_time, self.end_time, self.columns, self.chunk_size
+        ):
+            # Global row positions of this chunk that survive the stride
+            keep = np.arange(seen, seen + len(rows))
+            keep = np.flatnonzero(keep % stride == 0)
+            seen += len(rows)
+
+            # Rows inserted after the count query are ignored
+            keep = keep[: capacity - filled]
+            if len(keep) == 0:
+                continue
+
+            chunk = self._chunk_to_arrays(rows, vocabularies)
+            for col, values in chunk.items():
+                arrays[col][filled:filled + len(keep)] = values[keep]
+            filled += len(keep)
+
+        return self._to_frame(arrays, vocabularies, filled)
+
+    def _allocate(self, col: str, capacity: int) -> np.ndarray:
+        """Preallocate the storage array for a column."""
+        kind = TRAINING_COLUMNS[col]
+        if kind == "datetime":
+            return np.empty(capacity, dtype="datetime64[ns]")
+        if kind == "category":
+            return np.empty(capacity, dtype=np.int32)
+        return np.empty(capacity, dtype=kind)
+
+    def _chunk_to_arrays(
+        self,
+        rows: Sequence[tuple],
+        vocabularies: Optional[Dict[str, Dict[str, int]]] = None,
+    ) -> Dict[str, np.ndarray]:
+        """Convert a chunk of projected rows into column arrays."""
+        arrays = {}
+
+        for col, values in zip(self.columns, zip(*rows)):
+            kind = TRAINING_COLUMNS[col]
+
+            if kind == "datetime":
+                arrays[col] = (
+                    pd.to_datetime(values, utc=True)
+                    .tz_localize(None)
+                    .to_numpy(dtype="datetime64[ns]")
+                )
+            elif kind == "category":
+                if vocabularies is None:
+                    arrays[col] = np.asarray(values, dtype=object)
+                else:
+                    vocab = vocabularies[col]
+                    arrays[col] = np.fromiter(
+                        (
+                            -1 if v is None else vocab.setdefault(v, len(vocab))
+                            for v in values
+                        ),
+                        dtype=np.int32,
+                        count=len(values),
+                    )
+            elif kind == "int8":
+                arrays[col] = np.fromiter(
+                    (0 if v is None else v for v in values),
+                    dtype=np.int8,
+                    count=len(values),
+                )
+            else:
+                arrays[col] = np.asarray(
+                    [np.nan if v is None else v for v in values], dtype=kind
+                )
+
+        return arrays
+
+    def _to_frame(
+        self,
+        arrays: Dict[str, np.ndarray],
+        vocabularies: Dict[str, Dict[str, int]],
+        n_rows: int,
+    ) -> pd.DataFrame:
+        """Wrap filled arrays in a DataFrame without copying numeric data."""
+        data = {}
+
+        for col in self.columns:
+            values = arrays[col][:n_rows]
+            kind = TRAINING_COLUMNS[col]
+
+            if kind == "datetime":
+                data[col] = pd.DatetimeIndex(values).tz_localize("UTC")
+            elif kind == "category":
+                categories: List[str] = list(vocabularies[col])
+                data[col] = pd.Categorical.from_codes(values, categories=categories)
+            else:
+                data[col] = values
+
+        # Station, line and route codes are shared with features and models
+        return get_station_index().encode_frame(pd.DataFrame(data, copy=False))
@@ -0,0 +1,119 @@
+"""
+Training-data snapshots shared across model types.
+
+A training run reads its window once and hands the same prepared frame to
+every model it fits. The snapshot remembers the time range it was read for,
+so a trainer only reloads when asked for a different window.
+
+With the feature store enabled, the window is served from materialized
+Parquet partitions instead of train_positions; only new hours are computed.
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+import pandas as pd
+import structlog
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import get_settings
+from app.ml.training.reader import TRAINING_COLUMNS, TrainingDataReader
+
+logger = structlog.get_logger()
+settings = get_settings()
+
+# Columns the models train on; the feature store also holds rolling statistics
+SNAPSHOT_COLUMNS = list(TRAINING_COLUMNS) + [
+    "hour",
+    "day_of_week",
+    "is_weekend",
+    "is_rush_hour",
+]
+
+
+def training_window(end_time: Optional[datetime] = None) -> Tuple[datetime, datetime]:
+    """Start and end of the configured training window, ending now by default."""
+    end_time = end_time or datetime.utcnow()
+    return end_time - timedelta(days=settings.training_window_days), end_time
+
+
+@dataclass(frozen=True)
+class TrainingSnapshot:
+    """Prepared training frame for a fixed time range."""
+
+    start_time: datetime
+    end_time: datetime
+    frame: pd.DataFrame = field(repr=False)
+    loaded_at: datetime
+    data_end: datetime  # Exclusive end of the data actually in the frame
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+    def covers(self, start_time: datetime, end_time: datetime) -> bool:
+        """Whether this snapshot was read for exactly the given range."""
+        return self.start_time == start_time and self.end_time == end_time
+
+
+def prepare_training_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Fill gaps and add the temporal features every model trains on (in place)."""
+    df['headway_seconds'] = df['headway_seconds'].fillna(0)
+    df['dwell_time_seconds'] = df['dwell_time_seconds'].fillna(0)
+
+    df['hour'] = df['timestamp'].dt.hour
+    df['day_of_week'] = df['timestamp'].dt.dayofweek
+    df['is_weekend'] = (df['day_of_week'] >= 5).astype(int)
+    df['is_rush_hour'] = (
+        (df['hour'].between(7, 10) | df['hour'].between(17, 20))
+        & (df['day_of_week'] < 5)
+    ).astype(int)
+
+    return df
+
+
+async def load_training_snapshot(
+    db: AsyncSession,
+    start_time: datetime,
+    end_time: datetime,
+) -> TrainingSnapshot:
+    """Read and prepare the training window in a single pass."""
+    if settings.feature_store_enabled:
+        df, data_end = await _read_from_feature_store(db, start_time, end_time)
+    else:
+        df = prepare_training_frame(
+            await TrainingDataReader(db, start_time, end_time).read_frame()
+        )
+        data_end = end_time
+
+    logger.info(
+        f"Loaded training snapshot: {len(df)} rows",
+        start_time=start_time.isoformat(),
+        end_time=end_time.isoformat(),
+    )
+
+    return TrainingSnapshot(
+        start_time=start_time,
+        end_time=end_time,
+        frame=df,
+        loaded_at=datetime.utcnow(),
+        data_end=data_end,
+    )
+
+
+async def _read_from_feature_store(
+    db: AsyncSession,
+    start_time: datetime,
+    end_time: datetime,
+) -> Tuple[pd.DataFrame, datetime]:
+    """Bring the store up to date, then read the window's model columns.
+
+    Only complete hours are materialized, so the frame ends at the last full
+    hour before end_time; that hour start is returned as the data end.
+    """
+    from app.ml.feature_store import FeatureStore, floor_hour
+
+    data_end = floor_hour(end_time)
+    store = FeatureStore()
+    await store.materialize(db, start_time, end_time)
+    return store.read(start_time, data_end, columns=SNAPSHOT_COLUMNS), data_end
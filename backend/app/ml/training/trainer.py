@@ -1,25 +1,42 @@
 """
 Model training orchestration and hyperparameter tuning.
+
+Hyperparameter trials run concurrently on a joblib process pool sized by
+ModelTrainerConfig.n_jobs (default: the runtime's joblib worker budget).
+Results are appended to the training history as trials complete, and LSTM
+trials are pruned by successive halving.
+
+Cross-validation computes the feature matrix once; rolling-origin folds are
+contiguous slices of it, and joblib memory-maps the shared arrays into the
+fold workers instead of pickling a copy per fold.
 """
 
 import json
+import math
 import os
+import time
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
+import structlog
+from joblib import Parallel, delayed, effective_n_jobs
 from sklearn.metrics import classification_report, precision_recall_fscore_support
-from sklearn.model_selection import GridSearchCV, TimeSeriesSplit
+from sklearn.model_selection import GridSearchCV, ParameterGrid, TimeSeriesSplit
 import torch
 from torch.utils.data import DataLoader
 
 from app.config import get_settings
+from app.core.runtime import get_joblib_workers
 from app.ml.models.isolation_forest import IsolationForestDetector
 from app.ml.models.lstm_autoencoder import LSTMDetector
 from app.ml.training.dataset import SubwayDataset, WindowedDataset, create_anomaly_labels
+from app.utils.memory import memory_metrics, reset_peak_rss
 
+logger = structlog.get_logger()
 settings = get_settings()
 
 
@@ -32,13 +49,17 @@ class ModelTrainerConfig:
         hyperparameters: Optional[Dict] = None,
         cv_folds: int = 5,
         scoring: str = 'f1',
-        n_jobs: int = -1,
+        n_jobs: Optional[int] = None,
+        max_epochs: int = 20,
+        halving_factor: int = 3,
     ):
         self.model_type = model_type
         self.hyperparameters = hyperparameters or self._get_default_hyperparameters()
         self.cv_folds = cv_folds
         self.scoring = scoring
-        self.n_jobs = n_jobs
+        self.n_jobs = n_jobs if n_jobs is not None else get_joblib_workers()
+        self.max_epochs = max_epochs  # Epochs reached by the last LSTM rung
+        self.halving_factor = halving_factor  # Keep 1/factor of LSTM trials per rung
     
     def _get_default_hyperparameters(self) -> Dict:
         """Get default hyperparameter search space."""
@@ -59,6 +80,140 @@ class ModelTrainerConfig:
             return {}
 
 
+def _trial_threads(n_workers: int) -> int:
+    """Threads per trial so concurrent trials do not oversubscribe the cores."""
+    return max(1, (os.cpu_count() or 1) // n_workers)
+
+
+@contextmanager
+def _torch_threads(threads: int):
+    """Temporarily limit torch's intra-op pool (restored for in-process runs)."""
+    previous_threads = torch.get_num_threads()
+    torch.set_num_threads(threads)
+    try:
+        yield
+    finally:
+        torch.set_num_threads(previous_threads)
+
+
+def _build_model(model_type: str, params: Dict):
+    """Create an untrained detector for one hyperparameter configuration."""
+    if model_type == 'isolation_forest':
+        return IsolationForestDetector(
+            contamination=params.get('contamination'),
+            model_params={
+                'n_estimators': params.get('n_estimators', 100),
+                'max_samples': params.get('max_samples', 'auto'),
+                'n_jobs': 1,  # Parallelism comes from running trials concurrently
+            },
+        )
+    elif model_type == 'lstm':
+        return LSTMDetector(
+            sequence_length=settings.lstm_sequence_length,
+            hidden_size=params.get('hidden_size'),
+            num_layers=params.get('num_layers', 2),
+            learning_rate=params.get('learning_rate', 0.001),
+            batch_size=params.get('batch_size', 32),
+        )
+    raise ValueError(f"Unknown model type: {model_type}")
+
+
+def _classification_metrics(labels: np.ndarray, predictions: np.ndarray) -> Dict[str, float]:
+    """Binary precision, recall and F1 of per-row predictions."""
+    precision, recall, f1, _ = precision_recall_fscore_support(
+        labels, predictions, average='binary', zero_division=0
+    )
+    return {'precision': precision, 'recall': recall, 'f1': f1}
+
+
+def _isolation_forest_trial(
+    params: Dict,
+    train_data: pd.DataFrame,
+    val_data: pd.DataFrame,
+    val_labels: pd.Series,
+) -> Tuple[Dict, IsolationForestDetector, Dict, float]:
+    """Fit and score one Isolation Forest configuration (runs in a pool worker)."""
+    started = time.perf_counter()
+    
+    model = _build_model('isolation_forest', params)
+    model.train(train_data)
+    
+    metrics = _classification_metrics(np.asarray(val_labels), model.predict_labels(val_data))
+    metrics['duration_seconds'] = time.perf_counter() - started
+    
+    return params, model, metrics, metrics['f1']
+
+
+def _lstm_trial(
+    params: Dict,
+    train_data: pd.DataFrame,
+    val_data: pd.DataFrame,
+    epochs: int,
+    threads: int,
+    model: Optional[LSTMDetector] = None,
+) -> Tuple[Dict, LSTMDetector, Dict, float]:
+    """Train one LSTM configuration up to ``epochs`` and score it on validation loss."""
+    started = time.perf_counter()
+    
+    with _torch_threads(threads):
+        if model is None:
+            model = _build_model('lstm', params)
+            metrics = model.train(train_data, epochs=epochs)
+        else:
+            metrics = model.resume_training(train_data, epochs - model.epochs_trained)
+        
+        val_loss = model.reconstruction_loss(val_data)
+    
+    metrics = {
+        'val_loss': val_loss,
+        'train_loss': metrics.get('final_loss'),
+        'threshold': metrics.get('threshold', 0),
+        'epochs': model.epochs_trained,
+        'duration_seconds': time.perf_counter() - started,
+    }
+    return params, model, metrics, val_loss
+
+
+def _cv_fold(
+    fold: int,
+    model_type: str,
+    params: Dict,
+    feature_columns: List[str],
+    X: np.ndarray,
+    labels: np.ndarray,
+    train_bounds: Tuple[int, int],
+    test_bounds: Tuple[int, int],
+    threads: int,
+    epochs: int,
+) -> Dict:
+    """Fit on one rolling-origin training slice and score the following test slice.
+    
+    X and labels are the shared (memory-mapped) arrays; slicing only creates views.
+    """
+    started = time.perf_counter()
+    X_train = X[train_bounds[0]:train_bounds[1]]
+    X_test = X[test_bounds[0]:test_bounds[1]]
+    
+    model = _build_model(model_type, params)
+    model.feature_columns = list(feature_columns)
+    
+    with _torch_threads(threads):
+        if model_type == 'lstm':
+            model.train_matrix(X_train, epochs=epochs)
+        else:
+            model.train_matrix(X_train)
+        _, predictions = model.score_matrix(X_test)
+    
+    return {
+        'fold': fold,
+        'train_size': len(X_train),
+        'test_size': len(X_test),
+        'anomaly_rate': float(predictions.mean()),
+        **_classification_metrics(labels[test_bounds[0]:test_bounds[1]], predictions),
+        'duration_seconds': time.perf_counter() - started,
+    }
+
+
 class ModelTrainerPipeline:
     """Complete training pipeline with evaluation and model selection."""
     
@@ -67,151 +222,123 @@ class ModelTrainerPipeline:
         self.best_model = None
         self.training_history = []
     
+    def _run_trials(self, tasks: List) -> Iterator[Tuple[Dict, any, Dict, float]]:
+        """Run delayed trials on the process pool, yielding results as they complete."""
+        n_workers = min(effective_n_jobs(self.config.n_jobs), len(tasks))
+        
+        yield from Parallel(n_jobs=n_workers, return_as="generator_unordered")(tasks)
+    
+    def _record_trial(self, params: Dict, metrics: Dict, **extra):
+        """Append a finished trial to the training history."""
+        self.training_history.append({
+            'params': params,
+            'metrics': metrics,
+            'completed_at': datetime.utcnow().isoformat(),
+            **extra,
+        })
+        logger.info("Hyperparameter trial finished", params=params, metrics=metrics)
+    
     def train_isolation_forest(
         self,
         train_data: pd.DataFrame,
-        val_data: pd.DataFrame
+        val_data: pd.DataFrame,
+        val_labels: Optional[pd.Series] = None,
     ) -> Tuple[IsolationForestDetector, Dict]:
-        """Train Isolation Forest with hyperparameter tuning."""
+        """Train Isolation Forest with parallel hyperparameter search."""
         
-        dataset = SubwayDataset(train_data)
-        X_train, _ = dataset.to_numpy()
+        # Create synthetic labels for validation unless shared ones are given
+        if val_labels is None:
+            val_labels = create_anomaly_labels(val_data, method='isolation_forest')
         
-        # Create synthetic labels for validation
-        val_labels = create_anomaly_labels(val_data, method='isolation_forest')
-        val_dataset = SubwayDataset(val_data)
-        X_val, _ = val_dataset.to_numpy()
+        grid = ParameterGrid({
+            'contamination': self.config.hyperparameters.get('contamination', [0.05]),
+            'n_estimators': self.config.hyperparameters.get('n_estimators', [100]),
+            'max_samples': self.config.hyperparameters.get('max_samples', ['auto']),
+        })
         
         best_score = -np.inf
         best_params = {}
+        best_metrics = {}
         
-        # Grid search
-        for contamination in self.config.hyperparameters.get('contamination', [0.05]):
-            for n_estimators in self.config.hyperparameters.get('n_estimators', [100]):
-                for max_samples in self.config.hyperparameters.get('max_samples', ['auto']):
-                    
-                    # Train model
-                    model = IsolationForestDetector(contamination=contamination)
-                    model.model_params = {
-                        'n_estimators': n_estimators,
-                        'max_samples': max_samples,
-                    }
-                    
-                    metrics = model.train(train_data)
-                    
-                    # Evaluate on validation set
-                    val_anomalies = model.predict(val_data)
-                    val_pred = np.zeros(len(val_data))
-                    
-                    # Mark predicted anomalies
-                    for anomaly in val_anomalies:
-                        # Find corresponding index in validation data
-                        # This is simplified - in practice would match by timestamp/id
-                        val_pred[0] = 1  # Placeholder
-                    
-                    # Calculate F1 score
-                    precision, recall, f1, _ = precision_recall_fscore_support(
-                        val_labels, val_pred, average='binary', zero_division=0
-                    )
-                    
-                    if f1 > best_score:
-                        best_score = f1
-                        best_params = {
-                            'contamination': contamination,
-                            'n_estimators': n_estimators,
-                            'max_samples': max_samples,
-                        }
-                        self.best_model = model
-                    
-                    self.training_history.append({
-                        'params': {
-                            'contamination': contamination,
-                            'n_estimators': n_estimators,
-                            'max_samples': max_samples,
-                        },
-                        'metrics': {
-                            'precision': precision,
-                            'recall': recall,
-                            'f1': f1,
-                        }
-                    })
+        # Each trial fits on the full training split, so the winner is used as is
+        tasks = [
+            delayed(_isolation_forest_trial)(params, train_data, val_data, val_labels)
+            for params in grid
+        ]
+        for params, model, metrics, f1 in self._run_trials(tasks):
+            self._record_trial(params, metrics)
+            
+            if f1 > best_score:
+                best_score = f1
+                best_params = params
+                best_metrics = metrics
+                self.best_model = model
         
-        # Retrain best model on full training data
-        best_model = IsolationForestDetector(contamination=best_params['contamination'])
-        best_model.model_params = {
-            'n_estimators': best_params['n_estimators'],
-            'max_samples': best_params['max_samples'],
-        }
-        final_metrics = best_model.train(train_data)
+        # Restore the process-wide worker budget for inference
+        self.best_model.model.set_params(n_jobs=get_joblib_workers())
         
-        return best_model, {
+        return self.best_model, {
             'best_params': best_params,
             'best_score': best_score,
-            'final_metrics': final_metrics,
+            'final_metrics': best_metrics,
             'training_history': self.training_history,
         }
     
     def train_lstm(
         self,
         train_data: pd.DataFrame,
-        val_data: pd.DataFrame
+        val_data: pd.DataFrame,
+        final_epochs: int = 50,
     ) -> Tuple[LSTMDetector, Dict]:
-        """Train LSTM autoencoder with hyperparameter tuning."""
+        """Train LSTM autoencoder with successive-halving hyperparameter search.
+        
+        All configurations start with a small epoch budget; after each rung
+        only the best 1/halving_factor (by validation reconstruction loss)
+        continue, with the budget multiplied by halving_factor, until the
+        last rung reaches config.max_epochs. The winner then resumes
+        training to ``final_epochs``.
+        """
+        candidates = [
+            (params, None) for params in ParameterGrid({
+                'hidden_size': self.config.hyperparameters.get('hidden_size', [128]),
+                'num_layers': self.config.hyperparameters.get('num_layers', [2]),
+                'learning_rate': self.config.hyperparameters.get('learning_rate', [0.001]),
+                'batch_size': self.config.hyperparameters.get('batch_size', [32]),
+            })
+        ]
+        
+        eta = self.config.halving_factor
+        n_rungs = int(math.log(len(candidates), eta) + 1e-9) + 1
         
         best_score = np.inf  # Lower reconstruction error is better
         best_params = {}
         
-        for hidden_size in self.config.hyperparameters.get('hidden_size', [128]):
-            for learning_rate in self.config.hyperparameters.get('learning_rate', [0.001]):
-                for batch_size in self.config.hyperparameters.get('batch_size', [32]):
-                    
-                    # Create model
-                    model = LSTMDetector(
-                        sequence_length=settings.lstm_sequence_length,
-                        hidden_size=hidden_size,
-                    )
-                    
-                    # Set learning rate
-                    model.learning_rate = learning_rate
-                    model.batch_size = batch_size
-                    
-                    # Train
-                    metrics = model.train(train_data, epochs=20)  # Fewer epochs for search
-                    
-                    # Evaluate on validation
-                    val_anomalies = model.predict(val_data)
-                    val_loss = metrics.get('final_loss', np.inf)
-                    
-                    if val_loss < best_score:
-                        best_score = val_loss
-                        best_params = {
-                            'hidden_size': hidden_size,
-                            'learning_rate': learning_rate,
-                            'batch_size': batch_size,
-                        }
-                        self.best_model = model
-                    
-                    self.training_history.append({
-                        'params': {
-                            'hidden_size': hidden_size,
-                            'learning_rate': learning_rate,
-                            'batch_size': batch_size,
-                        },
-                        'metrics': {
-                            'val_loss': val_loss,
-                            'threshold': metrics.get('threshold', 0),
-                        }
-                    })
-        
-        # Retrain best model with more epochs
-        best_model = LSTMDetector(
-            sequence_length=settings.lstm_sequence_length,
-            hidden_size=best_params['hidden_size'],
-        )
-        best_model.learning_rate = best_params['learning_rate']
-        best_model.batch_size = best_params['batch_size']
+        for rung in range(n_rungs):
+            epochs = max(1, self.config.max_epochs // eta ** (n_rungs - 1 - rung))
+            threads = _trial_threads(min(effective_n_jobs(self.config.n_jobs), len(candidates)))
+            
+            tasks = [
+                delayed(_lstm_trial)(params, train_data, val_data, epochs, threads, model)
+                for params, model in candidates
+            ]
+            
+            results = []
+            for params, model, metrics, val_loss in self._run_trials(tasks):
+                self._record_trial(params, metrics, rung=rung)
+                results.append((val_loss, params, model, metrics))
+            
+            # Promote the best configurations to the next, longer rung
+            results.sort(key=lambda r: r[0])
+            keep = max(1, len(results) // eta) if rung < n_rungs - 1 else 1
+            candidates = [(params, model) for _, params, model, _ in results[:keep]]
+            
+            best_score, best_params, self.best_model, final_metrics = results[0]
         
-        final_metrics = best_model.train(train_data, epochs=50)
+        # Continue the winner rather than retraining it from scratch
+        best_model = self.best_model
+        remaining_epochs = final_epochs - best_model.epochs_trained
+        if remaining_epochs > 0:
+            final_metrics = best_model.resume_training(train_data, remaining_epochs)
         
         return best_model, {
             'best_params': best_params,
@@ -220,6 +347,56 @@ class ModelTrainerPipeline:
             'training_history': self.training_history,
         }
     
+    def cross_validate(
+        self,
+        data: pd.DataFrame,
+        model_type: str,
+        params: Dict,
+        labels: Optional[pd.Series] = None,
+    ) -> Dict:
+        """Rolling-origin cross-validation of one configuration on time-ordered data.
+        
+        Uses config.cv_folds TimeSeriesSplit folds: each fold trains on all
+        data before its test window. Folds run in parallel.
+        """
+        # Expensive work happens once; folds only receive index bounds
+        template = _build_model(model_type, params)
+        X = np.ascontiguousarray(template.prepare_features(data))
+        if labels is None:
+            labels = create_anomaly_labels(data, method='isolation_forest')
+        labels = np.ascontiguousarray(labels, dtype=np.int8)
+        
+        splitter = TimeSeriesSplit(n_splits=self.config.cv_folds)
+        folds = [
+            ((int(train[0]), int(train[-1]) + 1), (int(test[0]), int(test[-1]) + 1))
+            for train, test in splitter.split(X)
+        ]
+        
+        n_workers = min(effective_n_jobs(self.config.n_jobs), len(folds))
+        threads = _trial_threads(n_workers)
+        
+        # Arrays above max_nbytes are dumped once and memory-mapped read-only
+        fold_metrics = Parallel(n_jobs=n_workers, max_nbytes='1M', mmap_mode='r')(
+            delayed(_cv_fold)(
+                fold, model_type, params, template.feature_columns, X, labels,
+                train_bounds, test_bounds, threads, self.config.max_epochs,
+            )
+            for fold, (train_bounds, test_bounds) in enumerate(folds)
+        )
+        
+        summary = {}
+        for metric in ('precision', 'recall', 'f1', 'anomaly_rate'):
+            values = np.array([m[metric] for m in fold_metrics])
+            summary[f'{metric}_mean'] = float(values.mean())
+            summary[f'{metric}_std'] = float(values.std())
+        
+        return {
+            'n_splits': len(folds),
+            'params': params,
+            'folds': fold_metrics,
+            'summary': summary,
+        }
+    
     def evaluate_model(
         self,
         model: any,
@@ -228,22 +405,18 @@ class ModelTrainerPipeline:
     ) -> Dict:
         """Evaluate model performance on test data."""
         
-        # Get predictions
-        anomalies = model.predict(test_data)
-        
-        # Create binary predictions
-        predictions = np.zeros(len(test_data))
-        for anomaly in anomalies:
-            # Simplified - would match by actual index/timestamp
-            predictions[0] = 1
+        # Dense per-row outputs, aligned with test_data
+        scores, predictions = model.score_and_label(test_data)
+        n_detected = int(predictions.sum())
         
         metrics = {
-            'n_anomalies_detected': len(anomalies),
-            'anomaly_rate': len(anomalies) / len(test_data),
+            'n_anomalies_detected': n_detected,
+            'anomaly_rate': n_detected / len(test_data),
         }
         
         if labels is not None:
             # Calculate classification metrics
+            labels = np.asarray(labels)
             precision, recall, f1, support = precision_recall_fscore_support(
                 labels, predictions, average='binary', zero_division=0
             )
@@ -259,17 +432,18 @@ class ModelTrainerPipeline:
             })
         
         # Calculate severity distribution
-        if anomalies:
-            severities = [a['severity'] for a in anomalies]
+        if n_detected:
+            severities = scores[predictions == 1]
+            q25, q50, q75 = np.percentile(severities, [25, 50, 75])
             metrics['severity_stats'] = {
-                'mean': np.mean(severities),
-                'std': np.std(severities),
-                'min': np.min(severities),
-                'max': np.max(severities),
+                'mean': float(severities.mean()),
+                'std': float(severities.std()),
+                'min': float(severities.min()),
+                'max': float(severities.max()),
                 'quantiles': {
-                    '25%': np.percentile(severities, 25),
-                    '50%': np.percentile(severities, 50),
-                    '75%': np.percentile(severities, 75),
+                    '25%': float(q25),
+                    '50%': float(q50),
+                    '75%': float(q75),
                 }
             }
         
@@ -312,31 +486,49 @@ def run_training_experiment(
     output_dir: Path,
     config: Optional[ModelTrainerConfig] = None
 ) -> Tuple[any, Dict]:
-    """Run complete training experiment with evaluation."""
+    """Run complete training experiment with evaluation.
+    
+    ``train_data`` is prepared in place and shared by the splits, the
+    synthetic labels and cross-validation; no per-stage copies are made.
+    """
     
     if config is None:
         config = ModelTrainerConfig(model_type)
     
-    # Split data
+    reset_peak_rss()
+    
+    # Prepare once, then split into row views of the same frame
     dataset = SubwayDataset(train_data)
     train_df, val_df = dataset.split(test_size=0.2)
     
+    # One labelling pass over the whole window serves validation and CV
+    labels = create_anomaly_labels(dataset.data, method='isolation_forest')
+    val_labels = labels.iloc[len(train_df):].reset_index(drop=True)
+    
     # Initialize trainer
     trainer = ModelTrainerPipeline(config)
     
     # Train model
     if model_type == 'isolation_forest':
-        model, results = trainer.train_isolation_forest(train_df, val_df)
+        model, results = trainer.train_isolation_forest(train_df, val_df, val_labels)
     elif model_type == 'lstm':
         model, results = trainer.train_lstm(train_df, val_df)
     else:
         raise ValueError(f"Unknown model type: {model_type}")
     
     # Evaluate on validation set
-    val_metrics = trainer.evaluate_model(model, val_df)
+    val_metrics = trainer.evaluate_model(model, val_df, val_labels)
     results['validation_metrics'] = val_metrics
     
+    # Rolling-origin CV of the selected configuration over the whole window
+    if config.cv_folds > 1:
+        results['cross_validation'] = trainer.cross_validate(
+            dataset.data, model_type, results['best_params'], labels
+        )
+    
+    results['resources'] = memory_metrics()
+    
     # Save results
     trainer.save_training_report(output_dir, model_type, results)
     
-    return model, results
\ No newline at end of file
+    return model, results
@@ -0,0 +1,282 @@
+"""
+Shared identifier vocabularies for stations, lines and routes.
+
+Every frame that carries station, line or route identifiers is encoded
+against the same StationIndex, so a given stop_id has the same integer code
+in training, feature materialization and live detection.
+
+Codes are persisted in the identifier_vocabulary table and are append-only:
+the first refresh seeds it with the sorted GTFS stops, then appends the
+sorted stations found only in the stations table; identifiers seen later
+get the next free code. An existing code never changes, so every process
+and every model artifact agrees on the codes it knows about; a model
+trained with N station codes only needs the first N. Before the first
+refresh a process falls back to the sorted GTFS stops, which equal the
+seeded prefix as long as stops.txt has not changed since the seed; every
+entry point that trains or detects refreshes first.
+
+Trip IDs are open-ended (new ones every service day) and keep frame-local
+categorical codes.
+"""
+
+import csv
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import structlog
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.locks import VOCABULARY_LOCK_ID
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+logger = structlog.get_logger()
+
+STOPS_SEARCH_PATHS = (
+    Path("/app/data/stops.txt"),
+    Path("data/stops.txt"),
+    Path("backend/data/stops.txt"),
+)
+
+# Route IDs published in the NYCT GTFS-RT feeds
+KNOWN_ROUTES = (
+    "1", "2", "3", "4", "5", "5X", "6", "6X", "7", "7X",
+    "A", "B", "C", "D", "E", "F", "FX", "FS", "G", "GS", "H",
+    "J", "L", "M", "N", "Q", "R", "S", "SI", "W", "Z",
+)
+
+# Line groupings produced by FeatureExtractor._get_line_from_route
+KNOWN_LINES = (
+    "1", "2", "3", "4", "5", "6", "7",
+    "A", "B", "C", "D", "E", "F", "G", "J", "L", "M",
+    "N", "Q", "R", "S", "SI", "W", "Z",
+)
+
+
+def load_stations_from_gtfs() -> Dict[str, Dict]:
+    """Load station data from GTFS stops.txt file."""
+    stations = {}
+
+    stops_file = next((path for path in STOPS_SEARCH_PATHS if path.exists()), None)
+    if not stops_file:
+        logger.warning("No stops.txt file found")
+        return stations
+
+    logger.info(f"Found stops file at: {stops_file}")
+
+    try:
+        with open(stops_file, 'r', encoding='utf-8-sig') as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                stop_id = row.get('stop_id', '')
+                if stop_id:
+                    stations[stop_id] = {
+                        "id": stop_id,
+                        "name": row.get('stop_name', f'Station {stop_id}'),
+                        "lat": float(row.get('stop_lat', 40.7484)),
+                        "lon": float(row.get('stop_lon', -73.9857)),
+                        "parent_station": row.get('parent_station', ''),
+                        "location_type": row.get('location_type', '0'),
+                    }
+
+        logger.info(f"Loaded {len(stations)} stations from GTFS")
+
+    except Exception as e:
+        logger.error(f"Failed to load stations: {e}")
+
+    return stations
+
+
+class Vocabulary:
+    """Immutable token -> integer code mapping.
+
+    Tokens are sorted unless ``sort=False``, in which case they are already
+    in code order (as loaded from identifier_vocabulary). Unknown tokens
+    encode to -1, the pandas convention for a missing categorical code.
+    """
+
+    def __init__(self, tokens: Iterable[str], sort: bool = True):
+        if sort:
+            self.tokens: Tuple[str, ...] = tuple(sorted({str(t) for t in tokens if t}))
+        else:
+            self.tokens = tuple(dict.fromkeys(str(t) for t in tokens if t))
+        self._codes: Dict[str, int] = {token: i for i, token in enumerate(self.tokens)}
+        self._dtype = None
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def __contains__(self, token: object) -> bool:
+        return token in self._codes
+
+    def code(self, token: Optional[str]) -> int:
+        """Integer code of a token, -1 if unknown."""
+        return self._codes.get(token, -1)
+
+    def token(self, code: int) -> Optional[str]:
+        """Token for a code, None for -1."""
+        return self.tokens[code] if code >= 0 else None
+
+    @property
+    def dtype(self) -> "pd.CategoricalDtype":
+        """Categorical dtype whose codes are this vocabulary's codes."""
+        if self._dtype is None:
+            import pandas as pd
+            self._dtype = pd.CategoricalDtype(categories=list(self.tokens))
+        return self._dtype
+
+    def encode(self, values: Sequence) -> "np.ndarray":
+        """Vectorized codes for a sequence of tokens (int32, -1 if unknown)."""
+        import numpy as np
+        import pandas as pd
+
+        if isinstance(values, pd.Series) and isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype(object)
+        return pd.Categorical(values, dtype=self.dtype).codes.astype(np.int32)
+
+
+class StationIndex:
+    """Vocabularies for the identifier columns shared by features and models."""
+
+    def __init__(
+        self,
+        stations: Union[Vocabulary, Iterable[str]],
+        lines: Union[Vocabulary, Iterable[str]] = KNOWN_LINES,
+        routes: Union[Vocabulary, Iterable[str]] = KNOWN_ROUTES,
+    ):
+        self.stations = stations if isinstance(stations, Vocabulary) else Vocabulary(stations)
+        self.lines = lines if isinstance(lines, Vocabulary) else Vocabulary(lines)
+        self.routes = routes if isinstance(routes, Vocabulary) else Vocabulary(routes)
+
+    @property
+    def columns(self) -> Dict[str, Vocabulary]:
+        """Frame column -> vocabulary used to encode it."""
+        return {
+            "current_station": self.stations,
+            "next_station": self.stations,
+            "station_id": self.stations,
+            "line": self.lines,
+            "route_id": self.routes,
+        }
+
+    def encode_frame(self, df: "pd.DataFrame") -> "pd.DataFrame":
+        """Re-encode identifier columns as categoricals with shared codes (in place).
+
+        Values missing from a vocabulary (e.g. a station seen before the next
+        refresh) are kept and appended after the shared codes, so known
+        identifiers always keep their code.
+        """
+        import pandas as pd
+
+        for col, vocab in self.columns.items():
+            if col not in df.columns or df[col].dtype == vocab.dtype:
+                continue
+
+            values = df[col]
+            if not isinstance(values.dtype, pd.CategoricalDtype):
+                values = values.astype("category")
+
+            extra = sorted(str(c) for c in values.cat.categories if c not in vocab)
+            df[col] = values.cat.set_categories(list(vocab.tokens) + extra)
+        return df
+
+    @classmethod
+    def from_gtfs(cls) -> "StationIndex":
+        """Index over the stops in GTFS stops.txt."""
+        return cls(load_stations_from_gtfs())
+
+    @classmethod
+    async def from_database(cls, db: AsyncSession) -> "StationIndex":
+        """Index over the persisted codes, extended with new GTFS stops, stations and routes.
+
+        New identifiers are appended under an advisory lock and committed.
+        """
+        result = await db.execute(text("SELECT id, lines FROM stations"))
+        rows = result.fetchall()
+
+        routes = set()
+        for station_id, lines in rows:
+            routes.update(str(route).upper() for route in (lines or []))
+
+        # Tiers are appended in order, so the GTFS-only fallback index
+        # (from_gtfs) is always a prefix of a freshly seeded vocabulary
+        candidates = {
+            "stations": [load_stations_from_gtfs(), [station_id for station_id, _ in rows]],
+            "lines": [KNOWN_LINES],
+            "routes": [KNOWN_ROUTES, routes],
+        }
+
+        codes = await _load_codes(db)
+        if any(
+            _new_tokens(tokens, codes.get(name, []))
+            for name, tiers in candidates.items()
+            for tokens in tiers
+        ):
+            await db.execute(
+                text("SELECT pg_advisory_xact_lock(:lock_id)"), {"lock_id": VOCABULARY_LOCK_ID}
+            )
+            # Another process may have appended while we waited
+            codes = await _load_codes(db)
+
+            appended = []
+            for name, tiers in candidates.items():
+                known = codes.setdefault(name, [])
+                for tokens in tiers:
+                    for token in _new_tokens(tokens, known):
+                        appended.append({"vocabulary": name, "token": token, "code": len(known)})
+                        known.append(token)
+
+            if appended:
+                await db.execute(
+                    text("""
+                        INSERT INTO identifier_vocabulary (vocabulary, token, code)
+                        VALUES (:vocabulary, :token, :code)
+                    """),
+                    appended,
+                )
+                logger.info(f"Appended {len(appended)} identifiers to the vocabulary")
+            await db.commit()
+
+        return cls(*(Vocabulary(codes[name], sort=False) for name in ("stations", "lines", "routes")))
+
+
+def _new_tokens(tokens: Iterable[str], known: Sequence[str]) -> List[str]:
+    """Tokens without a code yet, sorted so a batch is appended deterministically."""
+    return sorted({str(t) for t in tokens if t} - set(known))
+
+
+async def _load_codes(db: AsyncSession) -> Dict[str, List[str]]:
+    """Persisted tokens per vocabulary, in code order."""
+    result = await db.execute(
+        text("SELECT vocabulary, token FROM identifier_vocabulary ORDER BY vocabulary, code")
+    )
+    codes: Dict[str, List[str]] = {}
+    for name, token in result:
+        codes.setdefault(name, []).append(token)
+    return codes
+
+
+_station_index: Optional[StationIndex] = None
+
+
+def get_station_index() -> StationIndex:
+    """Process-wide StationIndex, built from GTFS on first use."""
+    global _station_index
+    if _station_index is None:
+        logger.warning("Station index not refreshed from the database, using GTFS stop codes")
+        _station_index = StationIndex.from_gtfs()
+    return _station_index
+
+
+async def refresh_station_index(db: AsyncSession) -> StationIndex:
+    """Rebuild the process-wide index from GTFS and the stations table."""
+    global _station_index
+    _station_index = await StationIndex.from_database(db)
+    logger.info(
+        f"Station index: {len(_station_index.stations)} stations, "
+        f"{len(_station_index.routes)} routes"
+    )
+    return _station_index
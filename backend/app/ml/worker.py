@@ -0,0 +1,97 @@
+"""
+Model training worker, run outside the API process.
+
+    python -m app.ml.worker --once            # train all models and exit
+    python -m app.ml.worker --once --full     # full refit even with WARM_START_ENABLED
+    python -m app.ml.worker                   # retrain daily at MODEL_RETRAIN_HOUR
+
+New artifacts are published through the model_artifacts table; API servers
+pick them up and hot-swap them (see app.ml.scheduler).
+"""
+
+import argparse
+import asyncio
+import sys
+from typing import Dict, List, Optional, Sequence
+
+import structlog
+
+from app.config import get_settings
+from app.core.runtime import configure_runtime
+from app.db.database import AnalyticsSessionLocal
+from app.ml.models import MODEL_TYPES
+from app.ml.scheduler import seconds_until_hour
+from app.ml.vocab import refresh_station_index
+
+logger = structlog.get_logger()
+settings = get_settings()
+
+
+async def train_models(
+    model_types: Sequence[str],
+    warm_start: Optional[bool] = None,
+) -> Dict[str, Optional[Dict]]:
+    """Train and activate the given model types; raises if any run failed."""
+    from app.ml.train import ModelTrainer
+
+    trainer = ModelTrainer()
+
+    # One snapshot of the training window is shared by every model type
+    async with AnalyticsSessionLocal() as db:
+        await refresh_station_index(db)
+        results = await trainer.train_models(model_types, db, warm_start=warm_start)
+
+    failed: List[str] = [t for t in model_types if t not in results]
+    if failed:
+        raise RuntimeError(f"Training failed for: {', '.join(failed)}")
+
+    return results
+
+
+async def run_forever(model_types: Sequence[str], warm_start: Optional[bool] = None):
+    """Retrain every day at settings.model_retrain_hour (UTC)."""
+    while True:
+        await asyncio.sleep(seconds_until_hour(settings.model_retrain_hour))
+        try:
+            await train_models(model_types, warm_start)
+        except Exception as e:
+            logger.error(f"Scheduled training failed: {e}")
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="NYC Subway Monitor training worker")
+    parser.add_argument("--once", action="store_true", help="Train once and exit")
+    parser.add_argument(
+        "--model-type",
+        action="append",
+        choices=MODEL_TYPES,
+        help="Model type to train (repeatable, default: all)",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Refit from scratch instead of warm-starting from the active models",
+    )
+    args = parser.parse_args(argv)
+
+    configure_runtime("training")
+    model_types = args.model_type or list(MODEL_TYPES)
+    warm_start = False if args.full else None
+
+    if not args.once:
+        asyncio.run(run_forever(model_types, warm_start))
+        return 0
+
+    try:
+        results = asyncio.run(train_models(model_types, warm_start))
+    except Exception as e:
+        logger.error(f"Training worker failed: {e}")
+        return 1
+
+    logger.info("Training worker finished", results=results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,16 +2,18 @@
 Fixed anomaly detection endpoints with proper error handling.
 """
 
+import base64
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
 import structlog
 from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import get_settings
+from app.core.cache import ANOMALIES, cache_key, get_cache
 from app.db import crud
-from app.db.database import get_db
-from app.ml.predict import AnomalyDetector
+from app.db.database import get_db, get_read_db
 from app.routers.websocket import broadcast_anomaly
 from app.schemas.anomaly import (
     AnomalyListResponse,
@@ -19,13 +21,33 @@ from app.schemas.anomaly import (
     AnomalyStats,
 )
 
+if TYPE_CHECKING:
+    from app.ml.predict import AnomalyDetector
+
 logger = structlog.get_logger()
+settings = get_settings()
 router = APIRouter()
 
 
+def encode_cursor(detected_at: datetime, anomaly_id: int) -> str:
+    """Opaque cursor for the row a page ended on."""
+    raw = f"{detected_at.isoformat()}|{anomaly_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor; raises 400 on malformed input."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        detected_at, anomaly_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(detected_at), int(anomaly_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
 @router.get("/", response_model=AnomalyListResponse)
 async def list_anomalies(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     page: int = Query(1, ge=1),
     page_size: int = Query(50, ge=1, le=100),
     line: Optional[str] = None,
@@ -33,8 +55,30 @@ async def list_anomalies(
     resolved: Optional[bool] = None,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    count: str = Query("exact", pattern="^(exact|estimated|none)$"),
 ) -> AnomalyListResponse:
-    """Get paginated list of anomalies with filters."""
+    """Get paginated list of anomalies with filters.
+    
+    ``page`` uses OFFSET paging; ``cursor`` continues after the last row of
+    the previous page, which stays fast however deep the client pages.
+    """
+    
+    position = decode_cursor(cursor) if cursor else None
+    
+    # Keyed on the request as given, so the default window is shared
+    key = cache_key(
+        "anomalies",
+        page=page,
+        page_size=page_size,
+        line=line,
+        station_id=station_id,
+        resolved=resolved,
+        start_date=start_date,
+        end_date=end_date,
+        cursor=cursor,
+        count=count,
+    )
     
     # Default date range if not specified
     if not start_date:
@@ -42,7 +86,7 @@ async def list_anomalies(
     if not end_date:
         end_date = datetime.utcnow()
     
-    try:
+    async def load() -> dict:
         anomalies, total = await crud.get_anomalies(
             db,
             page=page,
@@ -52,14 +96,29 @@ async def list_anomalies(
             resolved=resolved,
             start_date=start_date,
             end_date=end_date,
+            cursor=position,
+            count_mode=count,
         )
         
+        next_cursor = None
+        if len(anomalies) == page_size:
+            last = anomalies[-1]
+            next_cursor = encode_cursor(last.detected_at, last.id)
+        
         return AnomalyListResponse(
             anomalies=[AnomalyResponse.from_orm(a) for a in anomalies],
             total=total,
-            page=page,
+            total_is_estimate=count == "estimated",
+            page=None if position else page,
             page_size=page_size,
+            next_cursor=next_cursor,
+        ).model_dump(mode="json")
+    
+    try:
+        data = await get_cache().get_or_set(
+            key, load, ttl=settings.cache_list_ttl_seconds, tags=[ANOMALIES]
         )
+        return AnomalyListResponse.model_validate(data)
         
     except Exception as e:
         logger.error(f"Failed to list anomalies: {e}")
@@ -71,7 +130,7 @@ async def list_anomalies(
 
 @router.get("/stats", response_model=AnomalyStats)
 async def get_anomaly_stats(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     hours: int = Query(24, ge=1, le=168),
 ) -> AnomalyStats:
     """Get anomaly statistics for dashboard."""
@@ -79,7 +138,7 @@ async def get_anomaly_stats(
     end_time = datetime.utcnow()
     start_time = end_time - timedelta(hours=hours)
     
-    try:
+    async def load() -> dict:
         stats = await crud.get_anomaly_stats(db, start_time, end_time)
         trend = await crud.get_anomaly_trend(db, start_time, end_time)
         
@@ -90,7 +149,17 @@ async def get_anomaly_stats(
             by_line=stats["by_line"],
             severity_distribution=stats["severity_distribution"],
             trend_24h=trend,
+        ).model_dump(mode="json")
+    
+    try:
+        # Every dashboard polls this; concurrent misses share one computation
+        data = await get_cache().get_or_set(
+            cache_key("anomaly_stats", hours=hours),
+            load,
+            ttl=settings.cache_ttl_seconds,
+            tags=[ANOMALIES],
         )
+        return AnomalyStats.model_validate(data)
         
     except Exception as e:
         logger.error(f"Failed to get anomaly stats: {e}")
@@ -108,7 +177,7 @@ async def get_anomaly_stats(
 @router.get("/{anomaly_id}", response_model=AnomalyResponse)
 async def get_anomaly(
     anomaly_id: int,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ) -> AnomalyResponse:
     """Get single anomaly details."""
     anomaly = await crud.get_anomaly_by_id(db, anomaly_id)
@@ -149,7 +218,7 @@ async def run_detection(
             detail="Anomaly detector not initialized"
         )
     
-    detector: AnomalyDetector = request.app.state.detector
+    detector: "AnomalyDetector" = request.app.state.detector
     
     start_time = datetime.utcnow() - timedelta(minutes=lookback_minutes)
     
@@ -201,7 +270,7 @@ async def run_detection(
 @router.get("/models/status")
 async def get_model_status(
     request: Request,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ) -> dict:
     """Get status of deployed ML models."""
     
@@ -210,9 +279,15 @@ async def get_model_status(
     # Check if detector is available
     detector_stats = {}
     if hasattr(request.app.state, 'detector'):
-        detector: AnomalyDetector = request.app.state.detector
+        detector: "AnomalyDetector" = request.app.state.detector
         detector_stats = detector.get_model_stats()
     
+    training_status = {}
+    loaded_versions = {}
+    if hasattr(request.app.state, 'scheduler'):
+        training_status = request.app.state.scheduler.get_status()
+        loaded_versions = training_status["loaded_versions"]
+    
     return {
         "models": [
             {
@@ -220,9 +295,13 @@ async def get_model_status(
                 "version": model.version,
                 "trained_at": model.trained_at,
                 "metrics": model.metrics,
-                "is_loaded": detector_stats.get("loaded_models", {}).get(model.model_type, False),
+                "parent_version": model.parent_version,
+                "data_start": model.data_start,
+                "data_end": model.data_end,
+                "is_loaded": loaded_versions.get(model.model_type) == model.version,
             }
             for model in models
         ],
         "detector_stats": detector_stats,
+        "training": training_status,
     }
\ No newline at end of file
@@ -4,21 +4,24 @@ GTFS-RT feed ingestion with fixed JSONB handling.
 """
 
 import asyncio
-import csv
 import json
-from datetime import datetime
-from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 
 import structlog
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 
 from app.config import get_settings
+from app.core.live_state import get_live_state, snapshot_response
+from app.core.runtime import create_role_executor
 from app.db import crud
-from app.db.database import get_db, AsyncSessionLocal
+from app.db.database import get_db, get_read_db, AsyncSessionLocal, ReadSessionLocal
 from app.ml.features import FeatureExtractor
+from app.ml.vocab import load_stations_from_gtfs
 from app.schemas.feed import FeedUpdateResponse, TrainPositionResponse
 from app.utils.json import sanitize_for_jsonb
 
@@ -48,50 +51,33 @@ FEED_ENDPOINTS = {
 station_creation_lock = asyncio.Lock()
 feed_processing_lock = asyncio.Lock()
 
+# Protobuf parsing runs in worker processes under the ingestion thread budget
+_parse_pool: Optional[ProcessPoolExecutor] = None
 
-def load_stations_from_gtfs() -> Dict[str, Dict]:
-    """Load station data from GTFS stops.txt file."""
-    stations = {}
-    
-    # Search paths
-    search_paths = [
-        Path("/app/data/stops.txt"),
-        Path("data/stops.txt"),
-        Path("backend/data/stops.txt"),
-    ]
-    
-    stops_file = None
-    for path in search_paths:
-        if path.exists():
-            stops_file = path
-            logger.info(f"Found stops file at: {path}")
-            break
-    
-    if not stops_file:
-        logger.warning("No stops.txt file found")
-        return stations
-    
-    try:
-        with open(stops_file, 'r', encoding='utf-8-sig') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                stop_id = row.get('stop_id', '')
-                if stop_id:
-                    stations[stop_id] = {
-                        "id": stop_id,
-                        "name": row.get('stop_name', f'Station {stop_id}'),
-                        "lat": float(row.get('stop_lat', 40.7484)),
-                        "lon": float(row.get('stop_lon', -73.9857)),
-                        "parent_station": row.get('parent_station', ''),
-                        "location_type": row.get('location_type', '0'),
-                    }
-        
-        logger.info(f"Loaded {len(stations)} stations from GTFS")
-        
-    except Exception as e:
-        logger.error(f"Failed to load stations: {e}")
+
+def get_parse_pool() -> Optional[ProcessPoolExecutor]:
+    """Feed parsing pool, or None to parse in the event loop (INGESTION_PROCESSES=0)."""
+    global _parse_pool
+    if _parse_pool is None and settings.ingestion_processes > 0:
+        _parse_pool = create_role_executor("ingestion", settings.ingestion_processes)
+    return _parse_pool
+
+
+def shutdown_parse_pool() -> None:
+    """Stop the parsing processes; the next parse starts a new pool."""
+    global _parse_pool
+    if _parse_pool is not None:
+        _parse_pool.shutdown(wait=False, cancel_futures=True)
+        _parse_pool = None
+
+
+def parse_feed_content(content: bytes, feed_code: str) -> Dict:
+    """Parse a GTFS-RT payload into trips and alerts."""
+    from google.transit import gtfs_realtime_pb2
     
-    return stations
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.ParseFromString(content)
+    return FeedIngester._parse_gtfs_feed(feed, feed_code)
 
 
 class FeedIngester:
@@ -105,7 +91,6 @@ class FeedIngester:
     async def fetch_feed(self, feed_code: str) -> Dict:
         """Fetch and parse feed with retry logic."""
         import httpx
-        from google.transit import gtfs_realtime_pb2
         
         url = FEED_ENDPOINTS.get(feed_code)
         if not url:
@@ -117,13 +102,17 @@ class FeedIngester:
                 async with httpx.AsyncClient(timeout=settings.feed_timeout) as client:
                     response = await client.get(url)
                     response.raise_for_status()
-                    
-                    feed = gtfs_realtime_pb2.FeedMessage()
-                    feed.ParseFromString(response.content)
-                    
-                    return self._parse_gtfs_feed(feed, feed_code)
+                
+                pool = get_parse_pool()
+                if pool is None:
+                    return parse_feed_content(response.content, feed_code)
+                return await asyncio.get_running_loop().run_in_executor(
+                    pool, parse_feed_content, response.content, feed_code
+                )
                     
             except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    shutdown_parse_pool()
                 retries += 1
                 logger.warning(f"Feed fetch failed (attempt {retries}): {e}")
                 if retries < settings.max_retries:
@@ -131,7 +120,8 @@ class FeedIngester:
                 else:
                     raise
     
-    def _parse_gtfs_feed(self, feed, feed_code: str) -> Dict:
+    @staticmethod
+    def _parse_gtfs_feed(feed, feed_code: str) -> Dict:
         """Parse GTFS protobuf to our format."""
         trips = []
         alerts = []
@@ -273,9 +263,10 @@ class FeedIngester:
             if positions:
                 await self.ensure_stations_exist(positions, db)
                 await crud.bulk_create_train_positions(db, positions)
+                await crud.upsert_current_train_positions(db, positions)
 
+            proc_ms = (datetime.utcnow() - start_time).total_seconds() * 1000
             if feed_update and feed_update.id:
-                proc_ms = (datetime.utcnow() - start_time).total_seconds() * 1000
                 await db.execute(
                     text(
                         """
@@ -294,6 +285,18 @@ class FeedIngester:
             await db.commit()
             logger.info(f"Processed feed {feed_code}: {len(positions)} positions")
 
+            # Only committed updates reach the snapshot read endpoints serve
+            get_live_state().apply_feed_update(
+                feed_code,
+                positions,
+                {
+                    "timestamp": feed_update.timestamp,
+                    "num_trips": feed_update.num_trips,
+                    "num_alerts": feed_update.num_alerts,
+                    "processing_time_ms": proc_ms,
+                },
+            )
+
         except Exception as e:
             await db.rollback()
             logger.error(f"Failed to process feed {feed_code}: {e}")
@@ -331,9 +334,30 @@ async def start_feed_ingestion():
 
 
 @router.get("/status")
-async def get_feed_status(db: AsyncSession = Depends(get_db)) -> Dict:
-    """Get feed ingestion status."""
-    recent_updates = await crud.get_recent_feed_updates(db, limit=20)
+async def get_feed_status(request: Request) -> Dict:
+    """Get feed ingestion status.
+    
+    Served from the live snapshot once this process has ingested a feed,
+    with an ETag; a read session is only opened before that.
+    """
+    state = get_live_state()
+    if state.ready:
+        return snapshot_response(request, state, "status", lambda: {
+            "active_feeds": list(FEED_ENDPOINTS.keys()),
+            "update_interval": settings.feed_update_interval,
+            "recent_updates": [
+                FeedUpdateResponse.model_validate(update).model_dump(mode="json")
+                for update in state.recent_updates()
+            ],
+            "feeds": {
+                feed_id: update["timestamp"] for feed_id, update in state.feeds().items()
+            },
+            "loaded_stations": len(ingester.station_cache),
+            "status": "operational",
+        })
+    
+    async with ReadSessionLocal() as db:
+        recent_updates = await crud.get_recent_feed_updates(db, limit=20)
     
     return {
         "active_feeds": list(FEED_ENDPOINTS.keys()),
@@ -349,11 +373,61 @@ async def get_feed_status(db: AsyncSession = Depends(get_db)) -> Dict:
 @router.get("/positions/{line}")
 async def get_train_positions(
     line: str,
-    db: AsyncSession = Depends(get_db)
+    request: Request,
 ) -> List[TrainPositionResponse]:
-    """Get current train positions for a line."""
-    positions = await crud.get_train_positions_by_line(db, line.upper(), limit=50)
-    return [TrainPositionResponse.from_orm(pos) for pos in positions]
+    """Get the current position of every active train on a line.
+    
+    Served from the live snapshot (ids are per process) once this process
+    has ingested a feed, otherwise from current_train_positions.
+    """
+    line = line.upper()
+    state = get_live_state()
+    if state.ready:
+        return snapshot_response(request, state, f"positions:{line}", lambda: [
+            TrainPositionResponse.model_validate(pos).model_dump(mode="json")
+            for pos in state.line_positions(line)
+        ])
+    
+    async with ReadSessionLocal() as db:
+        positions = await crud.get_current_train_positions(db, line)
+        return [TrainPositionResponse.from_orm(pos) for pos in positions]
+
+
+@router.get("/arrivals")
+async def get_station_arrivals(
+    request: Request,
+    station_id: Optional[str] = None,
+) -> List[Dict]:
+    """Last arrival per station and direction from the live snapshot."""
+    state = get_live_state()
+    return snapshot_response(
+        request, state, f"arrivals:{station_id}",
+        lambda: state.station_arrivals(station_id),
+    )
+
+
+@router.get("/lines/health")
+async def get_line_health(
+    db: AsyncSession = Depends(get_read_db),
+    hours: int = Query(24, ge=1, le=168),
+    resolution: str = Query("1h", pattern="^(5m|1h)$"),
+    line: Optional[str] = None,
+) -> Dict:
+    """Headway, delay, dwell and anomaly summary per line from the rollups."""
+    end_time = datetime.utcnow()
+    start_time = end_time - timedelta(hours=hours)
+    
+    lines = await crud.get_line_health(
+        db, start_time, end_time, resolution=resolution,
+        line=line.upper() if line else None,
+    )
+    
+    return {
+        "start_time": start_time,
+        "end_time": end_time,
+        "resolution": resolution,
+        "lines": lines,
+    }
 
 
 @router.post("/refresh/{feed_code}")
@@ -5,11 +5,12 @@ Health check endpoints for monitoring and orchestration.
 from datetime import datetime
 
 import structlog
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request, Response
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import get_settings
+from app.core.runtime import get_runtime_info
 from app.db.database import get_db
 
 logger = structlog.get_logger()
@@ -18,8 +19,16 @@ router = APIRouter()
 
 
 @router.get("/health/live")
-async def liveness_check():
-    """Basic liveness check - is the process running?"""
+async def liveness_check(request: Request, response: Response):
+    """Basic liveness check - is the process running and not stuck in warm-up?"""
+    if getattr(request.app.state, "warmup_failed", False):
+        # Warm-up gave up; let the orchestrator restart the pod
+        response.status_code = 503
+        return {
+            "status": "unhealthy",
+            "timestamp": datetime.utcnow(),
+            "startup_error": getattr(request.app.state, "startup_error", None),
+        }
     return {
         "status": "healthy",
         "timestamp": datetime.utcnow(),
@@ -29,11 +38,15 @@ async def liveness_check():
 
 
 @router.get("/health/ready")
-async def readiness_check(db: AsyncSession = Depends(get_db)):
+async def readiness_check(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+):
     """Readiness check - can we serve traffic?"""
     checks = {
         "database": False,
-        "models_loaded": False,
+        "warmed_up": False,
     }
     
     # Check database connection
@@ -43,17 +56,26 @@ async def readiness_check(db: AsyncSession = Depends(get_db)):
     except Exception as e:
         logger.error(f"Database health check failed: {e}")
     
-    # Check if ML models are loaded
-    # This would check the global model state
-    checks["models_loaded"] = True  # Placeholder
+    # Warm-up has finished, whether or not any model is trained yet
+    detector = getattr(request.app.state, "detector", None)
+    checks["warmed_up"] = bool(detector and detector.ready)
+    
+    scheduler = getattr(request.app.state, "scheduler", None)
+    loaded_versions = dict(scheduler.loaded_versions) if scheduler else {}
     
     # Overall status
     all_healthy = all(checks.values())
+    if not all_healthy:
+        # Keep the pod out of rotation until warm-up has finished
+        response.status_code = 503
     
     return {
         "status": "healthy" if all_healthy else "unhealthy",
         "timestamp": datetime.utcnow(),
         "checks": checks,
+        "models_loaded": bool(loaded_versions),
+        "loaded_versions": loaded_versions,
+        "startup_error": getattr(request.app.state, "startup_error", None),
     }
 
 
@@ -69,4 +91,5 @@ async def startup_check():
             "update_interval": settings.feed_update_interval,
             "ml_models": ["isolation_forest", "lstm_autoencoder"],
         },
+        "runtime": get_runtime_info(),
     }
\ No newline at end of file
@@ -43,9 +43,13 @@ class AnomalyListResponse(BaseModel):
     """Paginated anomaly list."""
     
     anomalies: List[AnomalyResponse]
-    total: int
-    page: int
+    total: Optional[int] = None  # None when count=none
+    total_is_estimate: bool = False
+    page: Optional[int] = None  # None for cursor requests
     page_size: int
+    next_cursor: Optional[str] = Field(
+        default=None, description="Pass as cursor to fetch the following page"
+    )
     
 
 class AnomalyStats(BaseModel):
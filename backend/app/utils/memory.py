@@ -0,0 +1,46 @@
+"""Process memory measurement for training runs."""
+import resource
+import sys
+from pathlib import Path
+from typing import Dict
+
+_PROC_STATUS = Path("/proc/self/status")
+_PROC_CLEAR_REFS = Path("/proc/self/clear_refs")
+
+
+def _maxrss_mb(who: int) -> float:
+    """ru_maxrss in MiB (reported in KiB on Linux, bytes on macOS)."""
+    maxrss = resource.getrusage(who).ru_maxrss
+    return maxrss / (1024 * 1024) if sys.platform == "darwin" else maxrss / 1024
+
+
+def reset_peak_rss() -> bool:
+    """Reset the kernel's peak RSS mark so the next reading covers one run (Linux only)."""
+    try:
+        _PROC_CLEAR_REFS.write_text("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MiB.
+
+    Uses VmHWM, which honours reset_peak_rss(), and falls back to getrusage
+    (lifetime peak) where /proc is unavailable.
+    """
+    try:
+        for line in _PROC_STATUS.read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return _maxrss_mb(resource.RUSAGE_SELF)
+
+
+def memory_metrics() -> Dict[str, float]:
+    """Peak RSS of this process and of its largest finished child (pool workers)."""
+    return {
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "children_peak_rss_mb": round(_maxrss_mb(resource.RUSAGE_CHILDREN), 1),
+    }
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Benchmark index sets against the application's real queries.
+
+For each index set the time-series tables are rebuilt in a scratch schema,
+filled with synthetic rows through the ingestion write path (timed, so index
+maintenance shows up in insert throughput), vacuumed and analyzed, and then
+the crud read queries are timed.
+
+Index sets:
+    none    primary keys only
+    legacy  the indexes created before app.db.indexes
+    plan    app.db.indexes.INDEX_PLAN
+
+Usage (from backend/, against DATABASE_URL):
+    python scripts/benchmark_indexes.py --positions 200000 --repeat 50
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import insert, text  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.config import get_settings  # noqa: E402
+from app.db import crud  # noqa: E402
+from app.db.indexes import INDEX_PLAN  # noqa: E402
+from app.db.models import Anomaly, FeedUpdate, Station, TrainPosition  # noqa: E402
+from app.ml.vocab import KNOWN_LINES  # noqa: E402
+
+SCHEMA = "index_bench"
+
+TABLES = [Station.__table__, TrainPosition.__table__, FeedUpdate.__table__, Anomaly.__table__]
+
+LEGACY_INDEXES = [
+    "CREATE INDEX idx_feed_timestamp ON feed_updates (feed_id, timestamp)",
+    "CREATE INDEX idx_train_line_time ON train_positions (line, timestamp)",
+    "CREATE INDEX idx_train_station ON train_positions (current_station, timestamp)",
+    "CREATE INDEX idx_anomaly_active ON anomalies (resolved, detected_at)",
+    "CREATE INDEX idx_anomaly_station_time ON anomalies (station_id, detected_at)",
+    "CREATE INDEX idx_train_positions_current_station ON train_positions (current_station)",
+    "CREATE INDEX idx_train_positions_next_station ON train_positions (next_station)",
+    "CREATE INDEX idx_anomalies_station_time ON anomalies (station_id, detected_at DESC)",
+    "CREATE INDEX idx_train_positions_line_time ON train_positions (line, timestamp DESC)",
+    "CREATE INDEX idx_feed_updates_feed_time ON feed_updates (feed_id, timestamp DESC)",
+]
+
+INDEX_SETS: Dict[str, List[str]] = {
+    "none": [],
+    "legacy": LEGACY_INDEXES,
+    "plan": [spec.create_sql for spec in INDEX_PLAN],
+}
+
+STATIONS = [f"B{i:03d}" for i in range(200)]
+FEEDS = ["ace", "bdfm", "g", "jz", "nqrw", "l", "si", "123456"]
+
+Query = Callable[[AsyncSession], Awaitable[object]]
+
+
+def build_queries(now: datetime) -> Dict[str, Query]:
+    """The crud reads behind the dashboard, detection and training."""
+    return {
+        "positions_since_15m": lambda db: crud.get_train_positions_since(
+            db, now - timedelta(minutes=15)
+        ),
+        "positions_since_line": lambda db: crud.get_train_positions_since(
+            db, now - timedelta(minutes=15), line="A"
+        ),
+        "training_count_6h": lambda db: crud.count_train_positions_for_training(
+            db, now - timedelta(hours=6), now
+        ),
+        "recent_feed_updates": lambda db: crud.get_recent_feed_updates(db, limit=20),
+        "anomalies_page": lambda db: crud.get_anomalies(db, count_mode="none"),
+        "anomalies_unresolved": lambda db: crud.get_anomalies(
+            db, resolved=False, count_mode="none"
+        ),
+        "anomalies_station": lambda db: crud.get_anomalies(
+            db, station_id=STATIONS[0], count_mode="none"
+        ),
+        "anomaly_stats_24h": lambda db: crud.get_anomaly_stats(
+            db, now - timedelta(hours=24), now
+        ),
+    }
+
+
+def synthetic_positions(count: int, start: datetime, end: datetime, rng: random.Random) -> List[Dict]:
+    """Positions in arrival (time) order, as the ingester writes them."""
+    step = (end - start) / max(count, 1)
+    positions = []
+    for i in range(count):
+        line = rng.choice(KNOWN_LINES)
+        positions.append({
+            "timestamp": start + step * i,
+            "trip_id": f"{line}_{i // 40:06d}",
+            "route_id": line,
+            "line": line,
+            "direction": rng.randint(0, 1),
+            "current_station": rng.choice(STATIONS),
+            "next_station": rng.choice(STATIONS),
+            "delay_seconds": rng.randint(-60, 600),
+            "headway_seconds": rng.randint(60, 900),
+            "dwell_time_seconds": rng.randint(10, 120),
+            "schedule_adherence": rng.gauss(0, 1),
+        })
+    return positions
+
+
+async def populate(
+    session_factory: sessionmaker,
+    args: argparse.Namespace,
+    start: datetime,
+    end: datetime,
+) -> float:
+    """Load the scratch tables; returns train_positions insert rows per second."""
+    rng = random.Random(args.seed)
+
+    async with session_factory() as db:
+        await db.execute(
+            insert(Station),
+            [{"id": s, "name": s, "lat": 40.7, "lon": -73.9, "lines": []} for s in STATIONS],
+        )
+        await db.commit()
+
+    positions = synthetic_positions(args.positions, start, end, rng)
+    began = time.perf_counter()
+    for offset in range(0, len(positions), args.batch_size):
+        async with session_factory() as db:
+            await crud.bulk_create_train_positions(db, positions[offset:offset + args.batch_size])
+            await db.commit()
+    elapsed = time.perf_counter() - began
+
+    step = (end - start) / max(args.anomalies, 1)
+    anomalies = [
+        {
+            "detected_at": start + step * i,
+            "station_id": rng.choice(STATIONS),
+            "line": rng.choice(KNOWN_LINES),
+            "anomaly_type": rng.choice(["headway", "dwell", "delay", "combined"]),
+            "severity": rng.random(),
+            "model_name": "isolation_forest",
+            "resolved": rng.random() > 0.05,
+        }
+        for i in range(args.anomalies)
+    ]
+    step = (end - start) / max(args.feed_updates, 1)
+    feed_updates = [
+        {"timestamp": start + step * i, "feed_id": FEEDS[i % len(FEEDS)], "num_trips": 0, "num_alerts": 0}
+        for i in range(args.feed_updates)
+    ]
+    async with session_factory() as db:
+        if anomalies:
+            await db.execute(insert(Anomaly), anomalies)
+        if feed_updates:
+            await db.execute(insert(FeedUpdate), feed_updates)
+        await db.commit()
+
+    return len(positions) / elapsed if elapsed else 0.0
+
+
+async def time_queries(
+    session_factory: sessionmaker,
+    queries: Dict[str, Query],
+    repeat: int,
+) -> Dict[str, Dict[str, float]]:
+    """Median and p95 latency (ms) per query after one warm-up run."""
+    latencies = {}
+    async with session_factory() as db:
+        for name, query in queries.items():
+            await query(db)
+            samples = []
+            for _ in range(repeat):
+                began = time.perf_counter()
+                await query(db)
+                samples.append((time.perf_counter() - began) * 1000)
+                db.expunge_all()
+            samples.sort()
+            latencies[name] = {
+                "median_ms": round(statistics.median(samples), 3),
+                "p95_ms": round(samples[max(0, int(len(samples) * 0.95) - 1)], 3),
+            }
+    return latencies
+
+
+async def benchmark_set(engine, name: str, indexes: Sequence[str], args: argparse.Namespace) -> Dict:
+    """Rebuild the scratch schema with one index set and measure it."""
+    async with engine.begin() as conn:
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        await conn.run_sync(lambda sync_conn: TrainPosition.metadata.create_all(sync_conn, tables=TABLES))
+        for statement in indexes:
+            await conn.execute(text(statement))
+
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    end = datetime.utcnow()
+    start = end - timedelta(days=args.days)
+
+    insert_rate = await populate(session_factory, args, start, end)
+
+    autocommit = engine.execution_options(isolation_level="AUTOCOMMIT")
+    async with autocommit.connect() as conn:
+        # Sets the visibility map so covering indexes can skip the heap
+        for table in TABLES:
+            await conn.execute(text(f"VACUUM ANALYZE {table.name}"))
+
+    async with engine.connect() as conn:
+        result = await conn.execute(text("""
+            SELECT relname, pg_indexes_size(oid)
+            FROM pg_class
+            WHERE relnamespace = CAST(:schema AS regnamespace) AND relkind = 'r'
+        """), {"schema": SCHEMA})
+        index_bytes = {table: size for table, size in result}
+
+    return {
+        "index_set": name,
+        "indexes": len(indexes),
+        "insert_rows_per_s": round(insert_rate),
+        "index_mb": {table: round(size / 1024 / 1024, 2) for table, size in sorted(index_bytes.items())},
+        "queries": await time_queries(session_factory, build_queries(end), args.repeat),
+    }
+
+
+def print_report(results: List[Dict]) -> None:
+    """Side-by-side table of insert throughput, index size and query latency."""
+    names = [r["index_set"] for r in results]
+    width = max(len(q) for q in results[0]["queries"]) + 2
+
+    print(f"{'':{width}}" + "".join(f"{n:>16}" for n in names))
+    print(f"{'insert rows/s':{width}}" + "".join(f"{r['insert_rows_per_s']:>16}" for r in results))
+    print(f"{'index MB (total)':{width}}" + "".join(
+        f"{sum(r['index_mb'].values()):>16.2f}" for r in results
+    ))
+    print("median / p95 ms")
+    for query in results[0]["queries"]:
+        cells = [r["queries"][query] for r in results]
+        print(f"{query:{width}}" + "".join(
+            f"{c['median_ms']:>8.2f}/{c['p95_ms']:<7.2f}" for c in cells
+        ))
+
+
+async def run(args: argparse.Namespace) -> List[Dict]:
+    engine = create_async_engine(
+        str(get_settings().database_url),
+        connect_args={"server_settings": {"search_path": SCHEMA, "jit": "off"}},
+    )
+    results = []
+    try:
+        for name in args.sets:
+            print(f"Benchmarking index set '{name}'...", file=sys.stderr)
+            results.append(await benchmark_set(engine, name, INDEX_SETS[name], args))
+    finally:
+        if not args.keep:
+            async with engine.begin() as conn:
+                await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await engine.dispose()
+    return results
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark index sets against the crud queries")
+    parser.add_argument("--sets", nargs="+", choices=list(INDEX_SETS), default=list(INDEX_SETS))
+    parser.add_argument("--positions", type=int, default=200_000)
+    parser.add_argument("--anomalies", type=int, default=20_000)
+    parser.add_argument("--feed-updates", type=int, default=5_000)
+    parser.add_argument("--days", type=float, default=2.0)
+    parser.add_argument("--batch-size", type=int, default=1_000)
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help=f"Keep the {SCHEMA} schema afterwards")
+    parser.add_argument("--json", action="store_true", help="Print raw results as JSON")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run(args))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_report(results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""Shared helpers for the unit tests."""
+
+from datetime import timezone
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.db import crud
+
+
+@pytest.fixture
+def make_positions():
+    """Factory for synthetic positions frames with the columns the models train on."""
+
+    def make(n: int, seed: int, delay_mean: float = 0.0) -> pd.DataFrame:
+        rng = np.random.default_rng(seed)
+        return pd.DataFrame({
+            "timestamp": pd.date_range("2025-01-06", periods=n, freq="30s", tz="UTC"),
+            "headway_seconds": rng.normal(300, 60, n),
+            "dwell_time_seconds": rng.normal(30, 5, n),
+            "delay_seconds": rng.normal(delay_mean, 30, n),
+            "hour": rng.integers(0, 24, n),
+            "is_rush_hour": rng.integers(0, 2, n),
+            "current_station": rng.choice(["630N", "631N"], n),
+        })
+
+    return make
+
+
+@pytest.fixture
+def training_rows():
+    """Projected rows in TRAINING_COLUMNS order served by fake_db; modules override this."""
+    return []
+
+
+@pytest.fixture
+def fake_db(monkeypatch, training_rows):
+    """Serve training_rows through the crud streaming interface.
+
+    Returns the (start_time, end_time) of every streamed read.
+    """
+    reads = []
+
+    def window(start_time, end_time):
+        start = start_time.replace(tzinfo=timezone.utc)
+        end = end_time.replace(tzinfo=timezone.utc)
+        return [r for r in training_rows if start <= r[0] < end]
+
+    async def count(db, start_time, end_time):
+        return len(window(start_time, end_time))
+
+    async def stream(db, start_time, end_time, columns, chunk_size=10000):
+        reads.append((start_time, end_time))
+        selected = window(start_time, end_time)
+        for i in range(0, len(selected), chunk_size):
+            yield selected[i:i + chunk_size]
+
+    monkeypatch.setattr(crud, "count_train_positions_for_training", count)
+    monkeypatch.setattr(crud, "stream_train_positions_for_training", stream)
+    return reads
@@ -0,0 +1,71 @@
+"""Test keyset pagination of the anomaly listing."""
+
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.dialects import postgresql
+
+from app.db import crud
+from app.routers.anomaly import decode_cursor, encode_cursor
+
+
+class FakeResult:
+    def scalars(self):
+        return self
+
+    def all(self):
+        return []
+
+
+class FakeSession:
+    """Records executed statements instead of running them."""
+
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, statement):
+        self.statements.append(
+            str(statement.compile(dialect=postgresql.dialect()))
+        )
+        return FakeResult()
+
+    async def scalar(self, statement):
+        self.statements.append("count")
+        return 0
+
+
+def test_cursor_round_trip():
+    detected_at = datetime(2025, 1, 6, 8, 30, 15, 123456)
+    assert decode_cursor(encode_cursor(detected_at, 42)) == (detected_at, 42)
+
+    with pytest.raises(HTTPException):
+        decode_cursor("not-a-cursor")
+
+
+@pytest.mark.asyncio
+async def test_cursor_page_uses_keyset_without_count():
+    db = FakeSession()
+
+    _, total = await crud.get_anomalies(
+        db, page_size=20, line="6",
+        cursor=(datetime(2025, 1, 6), 42), count_mode="none",
+    )
+
+    assert total is None
+    assert len(db.statements) == 1
+    sql = db.statements[0]
+    assert "(anomalies.detected_at, anomalies.id) <" in sql
+    assert "OFFSET" not in sql
+    assert "ORDER BY anomalies.detected_at DESC, anomalies.id DESC" in sql
+
+
+@pytest.mark.asyncio
+async def test_page_mode_keeps_offset_and_exact_count():
+    db = FakeSession()
+
+    _, total = await crud.get_anomalies(db, page=3, page_size=20)
+
+    assert total == 0
+    assert db.statements[0] == "count"
+    assert "OFFSET" in db.statements[1]
@@ -0,0 +1,48 @@
+"""Test folding of the grouping-sets stats query."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.db import crud
+
+
+class FakeSession:
+    """Returns canned grouping-sets rows and records the query parameters."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = []
+
+    async def execute(self, query, params):
+        self.calls.append((str(query), params))
+        return iter(self.rows)
+
+
+@pytest.mark.asyncio
+async def test_stats_from_single_query():
+    rows = [
+        # grouping_id, type, line, bucket, window, today, active
+        (0b111, None, None, None, 5, 4, 2),
+        (0b011, "headway", None, None, 3, 3, 1),
+        (0b011, "delay", None, None, 2, 1, 1),
+        (0b011, "dwell", None, None, 0, 0, 1),
+        (0b101, None, "6", None, 4, 3, 2),
+        (0b101, None, None, None, 1, 1, 0),
+        (0b110, None, None, 0, 1, 1, 0),
+        (0b110, None, None, 2, 4, 3, 2),
+    ]
+    db = FakeSession(rows)
+    end = datetime.utcnow()
+
+    stats = await crud.get_anomaly_stats(db, end - timedelta(hours=24), end)
+
+    assert len(db.calls) == 1
+    assert "GROUPING SETS" in db.calls[0][0]
+    assert stats == {
+        "total_today": 4,
+        "total_active": 2,
+        "by_type": {"headway": 3, "delay": 2},
+        "by_line": {"6": 4},
+        "severity_distribution": {"low": 1, "medium": 0, "high": 4},
+    }
@@ -0,0 +1,91 @@
+"""Tests for the response cache."""
+import asyncio
+
+import pytest
+from sqlalchemy.orm import Session
+
+from app.core.cache import (
+    ANOMALIES,
+    Cache,
+    MemoryBackend,
+    RedisBackend,
+    cache_key,
+    set_cache,
+)
+
+
+def test_cache_key_ignores_order_and_unset_params():
+    assert cache_key("anomalies", page=1, line=None, resolved=False) == cache_key(
+        "anomalies", resolved=False, page=1
+    )
+
+
+@pytest.mark.asyncio
+async def test_single_flight_coalesces_concurrent_misses():
+    cache = Cache(MemoryBackend())
+    calls = 0
+
+    async def load():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"total": 3}
+
+    results = await asyncio.gather(
+        *(cache.get_or_set("stats", load, ttl=10) for _ in range(5))
+    )
+
+    assert calls == 1
+    assert results == [{"total": 3}] * 5
+    assert await cache.get_or_set("stats", load, ttl=10) == {"total": 3}
+    assert calls == 1
+
+
+@pytest.mark.asyncio
+async def test_load_invalidated_midway_is_not_stored():
+    cache = Cache(MemoryBackend())
+
+    async def load():
+        await cache.invalidate(ANOMALIES)
+        return "stale"
+
+    assert await cache.get_or_set("stats", load, ttl=10, tags=[ANOMALIES]) == "stale"
+    assert await cache.get_or_set("stats", lambda: _value("fresh"), ttl=10, tags=[ANOMALIES]) == "fresh"
+
+
+@pytest.mark.asyncio
+async def test_commit_invalidates_tagged_entries():
+    cache = Cache(MemoryBackend())
+    set_cache(cache)
+    try:
+        await cache.get_or_set("stats", lambda: _value(1), ttl=10, tags=[ANOMALIES])
+
+        session = Session()
+        session.info["cache_invalidations"] = {ANOMALIES}
+        session.rollback()
+        await asyncio.sleep(0)
+        assert await cache.get_or_set("stats", lambda: _value(2), ttl=10) == 1
+
+        session.begin()
+        session.info["cache_invalidations"] = {ANOMALIES}
+        session.commit()
+        await asyncio.sleep(0)
+        assert await cache.get_or_set("stats", lambda: _value(3), ttl=10) == 3
+    finally:
+        set_cache(None)
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_round_trip_and_invalidation():
+    fakeredis = pytest.importorskip("fakeredis")
+    cache = Cache(RedisBackend(fakeredis.FakeAsyncRedis()))
+
+    assert await cache.get_or_set("a", lambda: _value({"n": 1}), ttl=10, tags=[ANOMALIES]) == {"n": 1}
+    assert await cache.get_or_set("a", lambda: _value({"n": 2}), ttl=10) == {"n": 1}
+
+    await cache.invalidate(ANOMALIES)
+    assert await cache.get_or_set("a", lambda: _value({"n": 2}), ttl=10) == {"n": 2}
+
+
+async def _value(value):
+    return value
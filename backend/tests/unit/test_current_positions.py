@@ -0,0 +1,20 @@
+"""Test the per-trip current position derived from a feed update."""
+
+from app.db.crud import current_positions_by_trip
+
+
+def test_first_stop_update_is_current_and_second_is_next():
+    positions = [
+        {"trip_id": "A1", "current_station": "A27"},
+        {"trip_id": "B1", "current_station": "D14"},
+        {"trip_id": "A1", "current_station": "A28"},
+        {"trip_id": "A1", "current_station": "A30"},
+    ]
+
+    current = {pos["trip_id"]: pos for pos in current_positions_by_trip(positions)}
+
+    assert len(current) == 2
+    assert (current["A1"]["current_station"], current["A1"]["next_station"]) == ("A27", "A28")
+    assert current["B1"]["next_station"] is None
+    # Input rows are not modified
+    assert "next_station" not in positions[0]
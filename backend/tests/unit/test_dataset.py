@@ -0,0 +1,51 @@
+"""Tests for in-place training data preparation."""
+import numpy as np
+import pandas as pd
+
+from app.ml.training.dataset import SubwayDataset, create_anomaly_labels
+from app.utils.memory import memory_metrics
+
+
+def _frame(n=500):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "timestamp": pd.date_range("2024-01-01", periods=n, freq="min", tz="UTC")[::-1],
+        "line": rng.choice(["A", "C", "E"], size=n),
+        "headway_seconds": rng.normal(300, 60, n),
+        "dwell_time_seconds": rng.normal(30, 5, n),
+        "delay_seconds": rng.normal(0, 30, n),
+        "hour": np.arange(n) % 24,
+    })
+
+
+def test_prepares_shared_frame_in_place():
+    df = _frame()
+    df.loc[3, "headway_seconds"] = np.nan
+
+    dataset = SubwayDataset(df)
+
+    assert dataset.data is df
+    assert df["timestamp"].is_monotonic_increasing
+    assert df["headway_seconds"].dtype == np.float32
+    assert df["hour"].dtype == np.int8
+    assert isinstance(df["line"].dtype, pd.CategoricalDtype)
+    assert not df["headway_seconds"].hasnans
+
+    train, val = dataset.split(test_size=0.2)
+    assert len(train) + len(val) == len(df)
+
+
+def test_copy_leaves_input_untouched():
+    df = _frame()
+    SubwayDataset(df, copy=True)
+    assert df["headway_seconds"].dtype == np.float64
+
+
+def test_labels_and_memory_metrics():
+    labels = create_anomaly_labels(SubwayDataset(_frame()).data)
+    assert labels.dtype == np.int8
+    assert set(labels.unique()) <= {0, 1}
+
+    metrics = memory_metrics()
+    assert metrics["peak_rss_mb"] > 0
+    assert "children_peak_rss_mb" in metrics
@@ -0,0 +1,43 @@
+"""Test dense per-row scores and vectorized evaluation."""
+
+import numpy as np
+import pandas as pd
+
+from app.ml.models.isolation_forest import IsolationForestDetector
+from app.ml.models.lstm_autoencoder import LSTMDetector
+from app.ml.training.trainer import ModelTrainerConfig, ModelTrainerPipeline
+
+
+def test_lstm_row_errors_cover_every_window(make_positions):
+    """Each row gets the max error of all windows that contain it."""
+    detector = LSTMDetector(sequence_length=4, hidden_size=16)
+    detector.train(make_positions(100, seed=1), epochs=1)
+    data = make_positions(30, seed=2)
+
+    window_errors = detector._window_errors(detector.transform(data))
+    expected = np.zeros(len(data), dtype=np.float32)
+    for i, errors in enumerate(window_errors):
+        for j, error in enumerate(errors):
+            expected[i + j] = max(expected[i + j], error)
+
+    np.testing.assert_allclose(detector.row_errors(data), expected)
+    assert detector.predict_labels(data).sum() == (expected > detector.threshold).sum()
+
+
+def test_evaluate_model_aligns_labels_per_row(make_positions):
+    """Evaluation compares the detector's per-row labels with ground truth."""
+    train_df = make_positions(1000, seed=3)
+    test_df = make_positions(400, seed=4)
+    test_df.loc[:19, "delay_seconds"] = 2000.0
+
+    detector = IsolationForestDetector(contamination=0.05)
+    detector.train(train_df)
+    labels = pd.Series(np.r_[np.ones(20), np.zeros(380)].astype(int))
+
+    pipeline = ModelTrainerPipeline(ModelTrainerConfig("isolation_forest"))
+    metrics = pipeline.evaluate_model(detector, test_df, labels)
+
+    X = detector.scaler.transform(detector.prepare_features(test_df))
+    assert metrics["n_anomalies_detected"] == (detector.model.predict(X) == -1).sum()
+    assert metrics["recall"] >= 0.75
+    assert 0 < metrics["severity_stats"]["max"] <= 1.0
@@ -0,0 +1,96 @@
+"""Test Parquet feature store."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from app.ml.feature_store import FeatureStore
+
+START = datetime(2025, 1, 6, 0, 0)
+
+
+@pytest.fixture
+def training_rows():
+    """6 hours of positions, one every 5 minutes."""
+    return [
+        (
+            (START + timedelta(minutes=5 * i)).replace(tzinfo=timezone.utc),
+            f"trip_{i % 4}",
+            "6",
+            "6",
+            f"63{i % 2}N",
+            i % 2,
+            float(300 + i),
+            30.0,
+            float(i % 60),
+        )
+        for i in range(72)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_materialize_incremental(fake_db, tmp_path):
+    """Only hours missing from the store are computed."""
+    store = FeatureStore(str(tmp_path))
+
+    written = await store.materialize(None, START, START + timedelta(hours=4, minutes=30))
+    assert written == 48
+    assert len(store.materialized_hours()) == 4
+    assert (tmp_path / "date=2025-01-06" / "part-03.parquet").exists()
+
+    fake_db.clear()
+    written = await store.materialize(None, START, START + timedelta(hours=6))
+    assert written == 24
+    assert len(fake_db) == 1
+    # The new hours are read with their rolling context
+    assert fake_db[0] == (START + timedelta(hours=4) - timedelta(hours=24), START + timedelta(hours=6))
+
+
+@pytest.mark.asyncio
+async def test_old_empty_hours_are_marked_and_not_reread(fake_db, tmp_path):
+    """Empty hours past the grace period are recorded; recent ones are retried."""
+    store = FeatureStore(str(tmp_path))
+    end = START + timedelta(hours=16)
+
+    written = await store.materialize(None, START + timedelta(hours=5), end)
+    assert written == 12
+    assert (tmp_path / "date=2025-01-06" / "part-09.empty").exists()
+    assert not (tmp_path / "date=2025-01-06" / "part-10.empty").exists()
+    assert len(store.materialized_hours()) == 5
+
+    fake_db.clear()
+    assert await store.materialize(None, START + timedelta(hours=5), end) == 0
+    assert fake_db == [(START + timedelta(hours=10) - timedelta(hours=24), end)]
+
+
+@pytest.mark.asyncio
+async def test_materialize_keeps_every_row(fake_db, tmp_path, monkeypatch):
+    """Partitions are never down-sampled by the training row cap."""
+    from app.ml.training import reader
+
+    monkeypatch.setattr(reader.settings, "training_max_rows", 10)
+    store = FeatureStore(str(tmp_path))
+
+    assert await store.materialize(None, START, START + timedelta(hours=6)) == 72
+
+
+@pytest.mark.asyncio
+async def test_read_projects_and_filters(fake_db, tmp_path):
+    """Reads return only the requested columns and time range."""
+    store = FeatureStore(str(tmp_path))
+    await store.materialize(None, START, START + timedelta(hours=6))
+
+    df = store.read(
+        START + timedelta(hours=1),
+        START + timedelta(hours=2, minutes=30),
+        columns=["timestamp", "current_station", "headway_seconds_zscore", "is_rush_hour"],
+    )
+
+    assert list(df.columns) == [
+        "timestamp", "current_station", "headway_seconds_zscore", "is_rush_hour"
+    ]
+    assert len(df) == 18
+    assert df["timestamp"].is_monotonic_increasing
+    assert df["current_station"].dtype == "category"
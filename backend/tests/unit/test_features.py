@@ -78,4 +78,23 @@ class TestFeatureExtractor:
         
         assert features["day_of_week"] == 5  # Saturday
         assert features["is_weekend"] is True
-        assert features["is_rush_hour"] is False
\ No newline at end of file
+        assert features["is_rush_hour"] is False
+    
+    def test_station_features_use_shared_index(self, extractor):
+        """Station one-hot columns follow StationIndex codes."""
+        from app.ml.vocab import StationIndex
+        
+        index = StationIndex(["101", "635N", "A27"])
+        
+        dense = extractor.create_station_features("635N", index)
+        assert dense.tolist() == [0, 1, 0]
+        assert not extractor.create_station_features("unknown", index).any()
+        
+        matrix = extractor.create_station_matrix(["A27", "unknown", "101"], index)
+        assert matrix.shape == (3, 3)
+        assert matrix.nnz == 2
+        assert matrix.toarray().tolist() == [[0, 0, 1], [0, 0, 0], [1, 0, 0]]
+        
+        # A model trained before A27 was coded keeps its two columns
+        narrow = extractor.create_station_matrix(["A27", "635N"], index, n_columns=2)
+        assert narrow.toarray().tolist() == [[0, 0], [0, 1]]
@@ -0,0 +1,73 @@
+"""Test parallel hyperparameter search in the training pipeline."""
+
+from app.ml.training.trainer import ModelTrainerConfig, ModelTrainerPipeline
+
+
+def test_isolation_forest_trials_run_in_parallel(make_positions):
+    """Every grid point is tried on the pool and recorded as it completes."""
+    config = ModelTrainerConfig(
+        "isolation_forest",
+        hyperparameters={
+            "contamination": [0.05, 0.1],
+            "n_estimators": [20, 40],
+            "max_samples": ["auto"],
+        },
+        n_jobs=2,
+    )
+    pipeline = ModelTrainerPipeline(config)
+
+    model, results = pipeline.train_isolation_forest(
+        make_positions(600, seed=1), make_positions(200, seed=2)
+    )
+
+    assert len(pipeline.training_history) == 4
+    assert results["best_params"] in [h["params"] for h in pipeline.training_history]
+    assert model.model.n_estimators == results["best_params"]["n_estimators"]
+
+
+def test_lstm_successive_halving(make_positions):
+    """Only the best configurations are promoted to longer epoch budgets."""
+    config = ModelTrainerConfig(
+        "lstm",
+        hyperparameters={
+            "hidden_size": [16],
+            "num_layers": [1],
+            "learning_rate": [0.01, 0.001, 0.0001, 0.00001],
+            "batch_size": [32],
+        },
+        n_jobs=1,
+        max_epochs=4,
+        halving_factor=2,
+    )
+    pipeline = ModelTrainerPipeline(config)
+
+    model, results = pipeline.train_lstm(
+        make_positions(300, seed=3), make_positions(100, seed=4), final_epochs=5
+    )
+
+    rungs = [h["rung"] for h in pipeline.training_history]
+    assert rungs.count(0) == 4
+    assert rungs.count(1) == 2
+    assert rungs.count(2) == 1
+    assert [h["metrics"]["epochs"] for h in pipeline.training_history if h["rung"] == 2] == [4]
+    assert model.epochs_trained == 5
+    assert results["best_score"] == min(
+        h["metrics"]["val_loss"] for h in pipeline.training_history if h["rung"] == 2
+    )
+
+
+def test_cross_validate_rolling_origin(make_positions):
+    """Folds train on everything before their test window and run on the pool."""
+    config = ModelTrainerConfig("isolation_forest", cv_folds=3, n_jobs=2)
+    pipeline = ModelTrainerPipeline(config)
+    data = make_positions(800, seed=5)
+
+    results = pipeline.cross_validate(
+        data, "isolation_forest", {"contamination": 0.05, "n_estimators": 20}
+    )
+
+    folds = results["folds"]
+    assert [f["fold"] for f in folds] == [0, 1, 2]
+    assert [f["train_size"] for f in folds] == [200, 400, 600]
+    assert all(f["test_size"] == 200 for f in folds)
+    assert 0 <= results["summary"]["f1_mean"] <= 1
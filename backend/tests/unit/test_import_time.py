@@ -0,0 +1,62 @@
+"""Import-time budget for API worker processes."""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+
+# ML stacks that must only be imported on first model use
+HEAVY_PACKAGES = ("torch", "sklearn", "scipy", "pandas")
+
+# Cumulative import time budget for app.main (override for slow CI runners)
+IMPORT_BUDGET_MS = int(os.environ.get("IMPORT_TIME_BUDGET_MS", "3000"))
+
+
+def import_profile(module: str) -> Dict[str, int]:
+    """Import a module in a fresh interpreter; cumulative microseconds per module."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    profile = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        profile[name.strip()] = int(cumulative)
+
+    return profile
+
+
+@pytest.fixture(scope="module")
+def api_profile() -> Dict[str, int]:
+    """Import profile of the API entry point."""
+    return import_profile("app.main")
+
+
+class TestImportTime:
+    """Guard cold-start cost of API workers."""
+
+    def test_api_does_not_import_ml_stacks(self, api_profile):
+        """Heavy ML libraries stay out of the API import graph."""
+        loaded = sorted(
+            name for name in api_profile
+            if name.split(".")[0] in HEAVY_PACKAGES
+        )
+        assert loaded == []
+
+    def test_api_import_within_budget(self, api_profile):
+        """Importing app.main stays within the cold-start budget."""
+        elapsed_ms = api_profile["app.main"] / 1000
+        assert elapsed_ms <= IMPORT_BUDGET_MS, (
+            f"import app.main took {elapsed_ms:.0f} ms (budget {IMPORT_BUDGET_MS} ms)"
+        )
@@ -0,0 +1,38 @@
+"""Test the secondary index plan."""
+
+import re
+
+import pytest
+
+from app.db import models
+from app.db.indexes import INDEX_PLAN, OBSOLETE_INDEXES
+
+SQL_KEYWORDS = {"AND", "OR", "NOT", "IS", "NULL", "TRUE", "FALSE"}
+
+
+def referenced_columns(definition: str):
+    """Key, INCLUDE and WHERE columns of an index definition."""
+    keys = re.search(r"\(([^)]*)\)", definition).group(1)
+    columns = [part.split()[0] for part in keys.split(",")]
+
+    include = re.search(r"INCLUDE \(([^)]*)\)", definition)
+    if include:
+        columns += [part.strip() for part in include.group(1).split(",")]
+
+    where = re.search(r"WHERE (.*)", definition)
+    if where:
+        columns += [
+            word for word in re.findall(r"[A-Za-z_]+", where.group(1))
+            if word.upper() not in SQL_KEYWORDS
+        ]
+    return columns
+
+
+def test_plan_does_not_drop_its_own_indexes():
+    assert not {spec.name for spec in INDEX_PLAN} & set(OBSOLETE_INDEXES)
+
+
+@pytest.mark.parametrize("spec", INDEX_PLAN, ids=lambda spec: spec.name)
+def test_planned_indexes_name_existing_columns(spec):
+    table = models.Base.metadata.tables[spec.table]
+    assert set(referenced_columns(spec.definition)) <= set(table.columns.keys())
@@ -0,0 +1,74 @@
+"""Test the in-process live network snapshot."""
+
+from datetime import datetime, timedelta
+
+from app.core.live_state import LiveNetworkState, etag_matches
+
+NOW = datetime(2024, 3, 9, 8, 0)
+
+
+def position(trip_id, station, line="A", arrival=None, timestamp=NOW):
+    return {
+        "trip_id": trip_id,
+        "route_id": line,
+        "line": line,
+        "direction": 0,
+        "current_station": station,
+        "arrival_time": arrival,
+        "timestamp": timestamp,
+    }
+
+
+def update():
+    return {"timestamp": NOW, "num_trips": 1, "num_alerts": 0, "processing_time_ms": 5.0}
+
+
+def test_feed_update_replaces_that_feeds_trips():
+    state = LiveNetworkState()
+    state.apply_feed_update("A", [position("A1", "A27"), position("A2", "A30")], update(), now=NOW)
+    state.apply_feed_update("G", [position("G1", "G22", line="G")], update(), now=NOW)
+    version = state.apply_feed_update("A", [position("A2", "A31")], update(), now=NOW)
+
+    assert version == 3
+    assert [(p["trip_id"], p["current_station"]) for p in state.line_positions("A")] == [("A2", "A31")]
+    assert len(state.line_positions("G")) == 1
+
+
+def test_stale_trips_expire_and_arrivals_keep_latest_past_time():
+    state = LiveNetworkState(ttl_seconds=60)
+    old = NOW - timedelta(minutes=5)
+    state.apply_feed_update("G", [position("G1", "G22", line="G", timestamp=old)], update(), now=NOW)
+    state.apply_feed_update("A", [
+        position("A1", "A27", arrival=NOW - timedelta(minutes=2)),
+        position("A2", "A27", arrival=NOW - timedelta(minutes=1)),
+        position("A3", "A27", arrival=NOW + timedelta(minutes=3)),
+    ], update(), now=NOW)
+
+    assert state.line_positions("G") == []
+    assert state.station_arrivals("A27") == [
+        {"station_id": "A27", "direction": 0, "arrival_time": NOW - timedelta(minutes=1)}
+    ]
+
+
+def test_views_render_once_per_version():
+    state = LiveNetworkState()
+    calls = []
+
+    def build():
+        calls.append(1)
+        return {"version": state.version}
+
+    state.render("view", build)
+    state.render("view", build)
+    state.apply_feed_update("A", [], update(), now=NOW)
+    state.render("view", build)
+
+    assert len(calls) == 2
+
+
+def test_etag_matching():
+    assert etag_matches('"abc-3"', '"abc-3"')
+    assert etag_matches('W/"abc-3", "abc-2"', '"abc-3"')
+    assert etag_matches("*", '"abc-3"')
+    assert not etag_matches('"abc-2"', '"abc-3"')
+    assert not etag_matches(None, '"abc-3"')
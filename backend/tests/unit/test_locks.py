@@ -0,0 +1,12 @@
+"""Test advisory lock keys."""
+
+from app.db import locks
+
+
+def test_lock_keys_are_distinct_bigints():
+    keys = [value for name, value in vars(locks).items() if name.endswith("_LOCK_ID")]
+
+    assert len(keys) == 4
+    assert len(set(keys)) == len(keys)
+    assert all(-2**63 <= key < 2**63 for key in keys)
+    assert locks.advisory_lock_key("training") == locks.TRAINING_LOCK_ID
@@ -0,0 +1,52 @@
+"""Test LSTM normalization is fitted once and reused at inference."""
+
+import numpy as np
+import pytest
+
+from app.ml.models.lstm_autoencoder import LSTMDetector
+
+
+class TestLSTMScaler:
+    """Test scaler fit/transform separation."""
+
+    def test_transform_uses_training_params(self, make_positions):
+        """Inference batches are normalized with the frozen training stats."""
+        train_df = make_positions(500, seed=1)
+        detector = LSTMDetector(sequence_length=4, hidden_size=16)
+        X_train, _ = detector.prepare_sequences(train_df, fit=True)
+
+        assert X_train.shape == (500, len(detector.FEATURE_COLUMNS))
+
+        # A shifted batch must not be re-centered on its own mean
+        live_df = make_positions(50, seed=2, delay_mean=600.0)
+        X_live, _ = detector.prepare_sequences(live_df)
+
+        mean = train_df["delay_seconds"].mean()
+        std = train_df["delay_seconds"].std(ddof=0) + 1e-7
+        expected = (live_df["delay_seconds"] - mean) / std
+        col = detector.feature_columns.index("delay_seconds")
+
+        np.testing.assert_allclose(X_live[:, col], expected, rtol=1e-4)
+        assert detector.scaler_params["delay_seconds"]["mean"] == pytest.approx(mean)
+
+    def test_transform_requires_fit(self, make_positions):
+        """Transforming before fitting is an error."""
+        detector = LSTMDetector(sequence_length=4, hidden_size=16)
+
+        with pytest.raises(ValueError):
+            detector.transform(make_positions(10, seed=3))
+
+    def test_scaler_round_trip(self, tmp_path, make_positions):
+        """Saved artifacts restore the same normalization."""
+        train_df = make_positions(120, seed=4)
+        detector = LSTMDetector(sequence_length=4, hidden_size=16)
+        detector.train(train_df, epochs=1)
+        detector.save(tmp_path)
+
+        restored = LSTMDetector()
+        restored.load(tmp_path)
+
+        batch = make_positions(30, seed=5)
+        np.testing.assert_allclose(
+            restored.transform(batch), detector.transform(batch), rtol=1e-6
+        )
@@ -0,0 +1,35 @@
+"""Test rollup definitions and bucket alignment."""
+
+from datetime import datetime, timezone
+
+import pytest
+
+from app.db.rollups import ROLLUPS, _floor_bucket, _parent_select, rollup_table
+
+
+def test_parents_refresh_first_and_share_columns():
+    seen = {}
+    for spec in ROLLUPS:
+        if spec.parent:
+            assert spec.parent in seen
+            assert seen[spec.parent].columns == spec.columns
+        seen[spec.name] = spec
+
+
+def test_hourly_rollup_reaggregates_measures():
+    sql = _parent_select(ROLLUPS[1])
+    assert "FROM anomaly_rollup_5m" in sql
+    assert "SUM(anomaly_count) AS anomaly_count" in sql
+    assert "MAX(severity_max) AS severity_max" in sql
+
+
+def test_floor_bucket():
+    ts = datetime(2025, 3, 4, 10, 17, 33, tzinfo=timezone.utc)
+    assert _floor_bucket(ts, "5 minutes") == datetime(2025, 3, 4, 10, 15)
+    assert _floor_bucket(ts, "1 hour") == datetime(2025, 3, 4, 10, 0)
+
+
+def test_rollup_table_rejects_unknown_resolution():
+    assert rollup_table("position", "5m") == "position_rollup_5m"
+    with pytest.raises(ValueError):
+        rollup_table("position", "1d")
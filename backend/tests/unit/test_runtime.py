@@ -0,0 +1,13 @@
+"""Test per-role runtime profiles."""
+
+import os
+
+from app.core import runtime
+
+
+def test_ingestion_profile_applies_in_its_worker_processes(monkeypatch):
+    # Spawned workers read their settings from the environment
+    monkeypatch.setenv("INGESTION_BLAS_THREADS", "3")
+
+    with runtime.create_role_executor("ingestion", 1) as pool:
+        assert pool.submit(os.getenv, "OMP_NUM_THREADS").result(timeout=60) == "3"
@@ -0,0 +1,35 @@
+"""Test training schedule and hot model swapping."""
+
+from datetime import datetime
+
+from app.ml.predict import AnomalyDetector
+from app.ml.scheduler import seconds_until_hour
+
+
+class TestTrainingSchedule:
+    """Test schedule computation."""
+
+    def test_seconds_until_later_today(self):
+        """Next run is later the same day."""
+        now = datetime(2025, 1, 6, 1, 30, 0)
+        assert seconds_until_hour(3, now) == 90 * 60
+
+    def test_seconds_until_tomorrow(self):
+        """Next run rolls over to the following day."""
+        now = datetime(2025, 1, 6, 3, 0, 0)
+        assert seconds_until_hour(3, now) == 24 * 3600
+
+
+class TestModelSwap:
+    """Test atomic model replacement."""
+
+    def test_swap_keeps_previous_snapshot(self):
+        """A swap replaces the model set without mutating the old one."""
+        detector = AnomalyDetector()
+        detector.register_model("isolation_forest", "old")
+        snapshot = detector.models
+
+        detector.swap_models({"isolation_forest": "new"})
+
+        assert snapshot == {"isolation_forest": "old"}
+        assert detector.models == {"isolation_forest": "new"}
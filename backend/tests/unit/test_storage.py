@@ -0,0 +1,33 @@
+"""Test storage lifecycle configuration."""
+
+import pytest
+
+from app.db.storage import TIME_SERIES_TABLES, TablePolicy, delete_expired_rows
+
+
+def test_every_table_has_retention_setting():
+    for policy in TIME_SERIES_TABLES:
+        assert policy.retention_days >= 0
+
+
+@pytest.mark.asyncio
+async def test_zero_retention_keeps_everything(monkeypatch):
+    from app.db import storage
+
+    monkeypatch.setattr(storage.settings, "anomalies_retention_days", 0)
+
+    # Returns before touching the database
+    assert await delete_expired_rows(TablePolicy("anomalies", "detected_at", "line")) == 0
+
+
+def test_partition_names_round_trip():
+    from datetime import date
+
+    from app.db.storage import _partition_day, partition_name
+
+    name = partition_name("train_positions", date(2024, 3, 9))
+
+    assert name == "train_positions_p20240309"
+    assert _partition_day("train_positions", name) == date(2024, 3, 9)
+    assert _partition_day("train_positions", "train_positions_default") is None
+    assert _partition_day("feed_updates", name) is None
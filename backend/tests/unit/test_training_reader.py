@@ -0,0 +1,90 @@
+"""Test streaming training-data reader."""
+
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from app.ml.training.reader import TrainingDataReader
+
+
+def make_rows(n: int):
+    """Projected rows in TRAINING_COLUMNS order."""
+    start = datetime(2025, 1, 6, 8, 0, tzinfo=timezone.utc)
+    return [
+        (
+            start + timedelta(seconds=30 * i),
+            f"trip_{i % 7}",
+            "6",
+            "6",
+            f"63{i % 3}N",
+            i % 2,
+            float(300 + i),
+            None if i % 5 == 0 else 30.0,
+            float(i),
+        )
+        for i in range(n)
+    ]
+
+
+@pytest.fixture
+def training_rows():
+    return make_rows(1000)
+
+
+@pytest.mark.asyncio
+class TestTrainingDataReader:
+    """Test chunked reading into preallocated arrays."""
+
+    async def test_read_frame(self, fake_db):
+        """All rows are read into compact dtypes."""
+        reader = TrainingDataReader(
+            None, datetime.min, datetime.max, chunk_size=128, max_rows=10_000
+        )
+        df = await reader.read_frame()
+
+        assert len(df) == 1000
+        assert df["headway_seconds"].dtype == np.float32
+        assert df["direction"].dtype == np.int8
+        assert df["trip_id"].dtype == "category"
+        assert str(df["timestamp"].dt.tz) == "UTC"
+        assert df["dwell_time_seconds"].isna().sum() == 200
+        assert list(df["current_station"][:3]) == ["630N", "631N", "632N"]
+
+    async def test_read_frame_bounded(self, fake_db):
+        """Windows larger than max_rows are down-sampled while streaming."""
+        reader = TrainingDataReader(
+            None, datetime.min, datetime.max, chunk_size=64, max_rows=250
+        )
+        df = await reader.read_frame()
+
+        assert len(df) == 250
+        np.testing.assert_array_equal(df["delay_seconds"][:3], [0.0, 4.0, 8.0])
+
+
+@pytest.mark.asyncio
+async def test_snapshot_shared_across_model_types(fake_db, monkeypatch, tmp_path):
+    """A training run streams its window once for all model types."""
+    from app.ml import train
+
+    monkeypatch.setattr(train.settings, "models_dir", str(tmp_path))
+    monkeypatch.setattr(
+        train, "training_window", lambda: (datetime(2025, 1, 6), datetime(2025, 1, 7))
+    )
+
+    trainer = train.ModelTrainer()
+    frames = []
+
+    async def train_model(model_type, db, snapshot=None, parent=None):
+        frames.append(snapshot.frame)
+        return {"n_samples": len(snapshot)}
+
+    monkeypatch.setattr(trainer, "train_model", train_model)
+
+    results = await trainer.train_models(train.MODEL_TYPES, None)
+
+    assert len(fake_db) == 1
+    assert set(results) == set(train.MODEL_TYPES)
+    assert frames[0] is frames[1]
+    assert "is_rush_hour" in frames[0].columns
+    assert trainer._snapshot is None
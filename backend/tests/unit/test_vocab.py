@@ -0,0 +1,77 @@
+"""Tests for the shared identifier vocabularies."""
+import pandas as pd
+import pytest
+
+from app.ml.vocab import StationIndex, Vocabulary, _new_tokens
+
+
+def test_codes_are_independent_of_input_order():
+    a = StationIndex(["R16", "127", "A27"])
+    b = StationIndex(["A27", "R16", "127", "127"])
+
+    assert a.stations.tokens == b.stations.tokens
+    assert a.stations.code("127") == b.stations.code("127") == 0
+    assert a.stations.code("missing") == -1
+    assert a.stations.encode(["A27", "missing"]).tolist() == [1, -1]
+
+
+def test_encode_frame_shares_codes_and_keeps_unknown_values():
+    index = StationIndex(["101", "127", "A27"])
+    df = pd.DataFrame({
+        "current_station": ["A27", "101", "NEW1"],
+        "line": pd.Categorical(["A", "1", "A"]),
+        "route_id": ["A", "1", "A"],
+        "trip_id": ["t1", "t2", "t3"],
+    })
+
+    index.encode_frame(df)
+
+    assert df["current_station"].cat.codes.tolist() == [2, 0, 3]
+    assert df["current_station"].tolist() == ["A27", "101", "NEW1"]
+    assert df["line"].cat.codes.tolist() == [index.lines.code("A"), index.lines.code("1"), index.lines.code("A")]
+    assert df["route_id"].dtype == index.routes.dtype
+    assert df["trip_id"].dtype == object
+
+
+def test_persisted_codes_keep_their_order_when_stations_are_appended():
+    persisted = ["R16", "127", "A27"]
+    appended = persisted + _new_tokens(["101", "A27", "127"], persisted)
+    index = StationIndex(Vocabulary(appended, sort=False))
+
+    assert appended == ["R16", "127", "A27", "101"]
+    assert [index.stations.code(s) for s in persisted] == [0, 1, 2]
+    assert index.stations.code("101") == 3
+
+
+class FakeResult(list):
+    def fetchall(self):
+        return list(self)
+
+
+@pytest.mark.asyncio
+async def test_seed_keeps_gtfs_stops_as_prefix(monkeypatch):
+    """Stations only in the database are coded after every GTFS stop."""
+    from app.ml import vocab
+
+    inserted = []
+
+    class FakeSession:
+        async def execute(self, statement, params=None):
+            sql = str(statement)
+            if "FROM stations" in sql:
+                return FakeResult([("A01", ["a"]), ("B02", None)])
+            if sql.lstrip().startswith("INSERT"):
+                inserted.extend(params)
+            return FakeResult([])
+
+        async def commit(self):
+            pass
+
+    monkeypatch.setattr(vocab, "load_stations_from_gtfs", lambda: {"D04": {}, "B02": {}})
+
+    index = await StationIndex.from_database(FakeSession())
+
+    assert index.stations.tokens == ("B02", "D04", "A01")
+    assert index.stations.tokens[:2] == StationIndex(["D04", "B02"]).stations.tokens
+    assert index.routes.code("A") >= 0
+    assert {row["vocabulary"] for row in inserted} == {"stations", "lines", "routes"}
@@ -0,0 +1,59 @@
+"""Test warm-start updates of trained detectors."""
+
+import numpy as np
+import pytest
+
+from app.ml.models.isolation_forest import IsolationForestDetector
+from app.ml.models.lstm_autoencoder import LSTMDetector
+
+
+class TestIsolationForestWarmStart:
+    """Test replacing the oldest trees with trees grown on new data."""
+
+    def test_replaces_oldest_trees(self, tmp_path, make_positions):
+        """Old trees are dropped from the front, new trees appended, scores stay valid."""
+        detector = IsolationForestDetector()
+        detector.train(make_positions(2000, seed=1))
+        forest = detector.model
+        kept = forest.estimators_[25:]
+
+        new_data = make_positions(1000, seed=2, delay_mean=120.0)
+        metrics = detector.warm_start(new_data, replace_fraction=0.25)
+
+        assert metrics["trees_replaced"] == 25
+        assert len(forest.estimators_) == 100
+        assert forest.estimators_[:75] == kept
+        assert len(forest.estimators_features_) == 100
+
+        # Offset is re-estimated on the new data at the contamination rate
+        X = detector.scaler.transform(detector.prepare_features(new_data))
+        assert (forest.predict(X) == -1).mean() == pytest.approx(
+            detector.contamination, abs=0.01
+        )
+
+        detector.save(tmp_path)
+        restored = IsolationForestDetector()
+        restored.load(tmp_path)
+        np.testing.assert_allclose(restored.model.score_samples(X), forest.score_samples(X))
+
+    def test_requires_enough_new_data(self, make_positions):
+        """New trees must be grown on as many samples as the originals."""
+        detector = IsolationForestDetector()
+        detector.train(make_positions(2000, seed=3))
+
+        with pytest.raises(ValueError):
+            detector.warm_start(make_positions(100, seed=4))
+
+
+def test_lstm_fine_tune_keeps_scaler(make_positions):
+    """Fine-tuning continues from current weights with frozen normalization."""
+    detector = LSTMDetector(sequence_length=4, hidden_size=16)
+    detector.train(make_positions(200, seed=5), epochs=1)
+    scaler_params = dict(detector.scaler_params)
+    encoder_weights = detector.model.encoder.weight_ih_l0.detach().clone()
+
+    metrics = detector.fine_tune(make_positions(80, seed=6, delay_mean=300.0), epochs=2)
+
+    assert metrics["fine_tune_epochs"] == 2
+    assert detector.scaler_params == scaler_params
+    assert not bool((detector.model.encoder.weight_ih_l0 == encoder_weights).all())
@@ -0,0 +1,62 @@
+"""Test background warm-up retries and liveness."""
+
+from types import SimpleNamespace
+
+import pytest
+
+from app import main
+from app.routers import health
+
+
+@pytest.mark.asyncio
+async def test_warm_up_gives_up_and_fails_liveness(monkeypatch):
+    """Bounded failed attempts mark the pod failed instead of leaving it unready."""
+    attempts = []
+    sleeps = []
+
+    async def prepare(app):
+        attempts.append(1)
+        raise RuntimeError("database unavailable")
+
+    async def sleep(seconds):
+        sleeps.append(seconds)
+
+    monkeypatch.setattr(main, "prepare", prepare)
+    monkeypatch.setattr(main.asyncio, "sleep", sleep)
+    monkeypatch.setattr(main.settings, "warmup_max_attempts", 4)
+    monkeypatch.setattr(main.settings, "warmup_max_backoff", 5)
+
+    app = SimpleNamespace(state=SimpleNamespace(startup_error=None, warmup_failed=False))
+    await main.warm_up(app)
+
+    assert len(attempts) == 4
+    assert sleeps == [2, 4, 5]
+    assert app.state.warmup_failed
+    assert not hasattr(app.state, "feed_task")
+
+    response = SimpleNamespace(status_code=200)
+    body = await health.liveness_check(SimpleNamespace(app=app), response)
+    assert response.status_code == 503
+    assert body["startup_error"] == "database unavailable"
+
+
+@pytest.mark.asyncio
+async def test_readiness_reports_models_separately_from_warm_up():
+    """A warmed-up pod is ready even before any model has been trained."""
+
+    class FakeDB:
+        async def execute(self, statement):
+            return SimpleNamespace(scalar=lambda: 1)
+
+    state = SimpleNamespace(
+        detector=SimpleNamespace(ready=True),
+        scheduler=SimpleNamespace(loaded_versions={}),
+        startup_error=None,
+    )
+    response = SimpleNamespace(status_code=200)
+
+    body = await health.readiness_check(SimpleNamespace(app=SimpleNamespace(state=state)), response, FakeDB())
+
+    assert response.status_code == 200
+    assert body["checks"] == {"database": True, "warmed_up": True}
+    assert body["models_loaded"] is False
@@ -20,9 +20,11 @@ export interface Anomaly {
 
 export interface AnomalyListResponse {
   anomalies: Anomaly[]
-  total: number
-  page: number
+  total: number | null
+  total_is_estimate: boolean
+  page: number | null
   page_size: number
+  next_cursor: string | null
 }
 
 export interface AnomalyStats {